@@ -1,10 +1,331 @@
-def match_student(**kwargs):
+import hashlib
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+from collections.abc import Mapping
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+from catalog_matching import SchoolCatalogIndex, UniversityCatalogIndex
+from instrumentation import get_row_logger, metrics
+from match_rules import DEFAULT_RULES, compile_rules, load_rules
+
+try:
+    import numpy as np
+except ImportError:  # numpy 仅用于批量匹配
+    np = None
+
+logger = logging.getLogger(__name__)
+row_logger = get_row_logger(__name__)
+
+DEFAULT_MATCH_CACHE_SIZE = 65536  # 匹配结果缓存最多保存的不同输入数
+
+# 匹配规则，可通过环境变量 MATCH_RULES_FILE 指定 JSON 规则文件，每个招生季调整阈值无需改代码
+_active_rules = compile_rules(load_rules(os.environ["MATCH_RULES_FILE"]) if os.environ.get("MATCH_RULES_FILE")
+                              else DEFAULT_RULES)
+
+
+def set_match_rules(rules):
+    """替换当前使用的匹配规则 (规则字典、MatchRules 或 CompiledRules)"""
+    global _active_rules
+    _active_rules = compile_rules(rules)
+    return _active_rules
+
+
+def get_match_rules():
+    """返回当前使用的已编译匹配规则"""
+    return _active_rules
+
+
+@lru_cache(maxsize=4096)
+def _parse_number_text(text):
+    """解析常见的数字字符串 ("85%"、"6.5"、"105")，无法解析时返回None；结果按字符串缓存"""
+    try:
+        return float(text.replace('%', ''))
+    except ValueError:
+        return None
+
+
+def _parse_number(raw, label):
+    """将原始值转换为浮点数，缺失或无法转换时返回None"""
+    if raw is None:
+        return None
+    if isinstance(raw, (int, float)):
+        return float(raw)
+    if isinstance(raw, str):
+        value = _parse_number_text(raw)
+    else:
+        try:
+            value = float(raw)
+        except (ValueError, TypeError):
+            value = None
+    if value is None:
+        metrics.inc("parse_failures_total", field=label)
+        row_logger.debug("无法转换%s %r 为数字，设为None", label, raw)
+    return value
+
+
+def _parse_percentage(raw):
+    """将学术成绩转换为数字 (处理百分比)，缺失或无法转换时返回0"""
+    value = _parse_number(raw, "学术成绩")
+    return 0 if value is None else value
+
+
+def _parse_budget(raw):
+    """将年度预算转换为数字，未填写时返回None (不计为解析失败)"""
+    if raw is None or raw == "":
+        return None
+    return _parse_number(raw, "年度预算")
+
+
+def _parse_int(raw, label):
+    """将分数转换为整数 (截断小数)，缺失或无法转换时返回None"""
+    value = _parse_number(raw, label)
+    if value is None or value != value or value in (float('inf'), float('-inf')):
+        return None
+    return int(value)
+
+
+@dataclass(frozen=True)
+class NormalizedApplicant:
+    """归一化后的学生匹配输入，每个学生只在 normalize_applicant 中解析一次"""
+    application_choice: Optional[str] = None
+    academic_percentage: float = 0
+    gaokao_score: Optional[int] = None
+    ielts_score: Optional[float] = None
+    toefl_score: Optional[int] = None
+    det_score: Optional[int] = None
+    language_pass: bool = False
+    has_high_school_cert: bool = False
+    has_international_school_experience: bool = False
+    budget_per_year: Optional[float] = None  # None 表示未填写，与预算为0区分
+
+
+def normalize_applicant(**kwargs):
+    """
+    将学生的原始匹配参数转换为 NormalizedApplicant。
+    
+    参数与 match_student 相同，其余键 (如学生ID、院校数据) 会被忽略。
+    """
+    return NormalizedApplicant(
+        application_choice=kwargs.get('application_choice'),
+        academic_percentage=_parse_percentage(kwargs.get('academic_percentage', 0)),
+        gaokao_score=_parse_int(kwargs.get('gaokao_score'), "高考成绩"),
+        ielts_score=_parse_number(kwargs.get('ielts_score'), "雅思成绩"),
+        toefl_score=_parse_int(kwargs.get('toefl_score'), "托福成绩"),
+        det_score=_parse_int(kwargs.get('det_score'), "DET成绩"),
+        language_pass=bool(kwargs.get('language_pass', False)),
+        has_high_school_cert=bool(kwargs.get('has_high_school_cert', False)),
+        has_international_school_experience=bool(kwargs.get('has_international_school_experience', False)),
+        budget_per_year=_parse_budget(kwargs.get('budget_per_year')),
+    )
+
+
+def _json_default(value):
+    """院校记录 (records.Record 等映射) 按字典序列化，其他值转为字符串"""
+    return dict(value) if isinstance(value, Mapping) else str(value)
+
+
+@dataclass(frozen=True)
+class MatchContext:
+    """
+    院校目录，每次同步只构建一次，按引用传给 match_applicant。
+    
+    按申请类型预先组合好大学视图 (本科/硕博/不明确)，匹配时不再为每个学生拼接列表；
+    每个视图同时建立 UniversityCatalogIndex，用于按入学要求和学费匹配目录中的大学；
+    国际学校建立 SchoolCatalogIndex。
+    """
+    private_universities: Tuple[dict, ...] = ()
+    public_undergrad: Tuple[dict, ...] = ()
+    public_graduate: Tuple[dict, ...] = ()
+    international_schools: Tuple[dict, ...] = ()
+    version: str = ""  # 目录内容的哈希，目录变化时随之变化
+    university_views: Dict[str, Dict[str, Tuple[dict, ...]]] = field(init=False, repr=False, compare=False)
+    university_indexes: Dict[str, UniversityCatalogIndex] = field(init=False, repr=False, compare=False)
+    school_index: SchoolCatalogIndex = field(init=False, repr=False, compare=False)
+    
+    def __post_init__(self):
+        object.__setattr__(self, "university_views", {
+            "undergrad": {"private": self.private_universities, "public": self.public_undergrad},
+            "graduate": {"private": self.private_universities, "public": self.public_graduate},
+            "all": {"private": self.private_universities, "public": self.public_undergrad + self.public_graduate},
+        })
+        object.__setattr__(self, "university_indexes", {
+            name: UniversityCatalogIndex(view["private"] + view["public"])
+            for name, view in self.university_views.items()
+        })
+        object.__setattr__(self, "school_index", SchoolCatalogIndex(self.international_schools))
+    
+    @classmethod
+    def from_catalog(cls, university_data=None, international_schools=None):
+        """由 get_university_data / get_international_school_data 的结果构建"""
+        university_data = university_data or {}
+        catalog = {
+            "private_universities": tuple(university_data.get("private", ())),
+            "public_undergrad": tuple(university_data.get("public_undergrad", ())),
+            "public_graduate": tuple(university_data.get("public_graduate", ())),
+            "international_schools": tuple(international_schools or ()),
+        }
+        payload = json.dumps(catalog, sort_keys=True, ensure_ascii=False, default=_json_default)
+        return cls(version=hashlib.sha1(payload.encode("utf-8")).hexdigest(), **catalog)
+    
+    @staticmethod
+    def _view_name(application_choice):
+        application_type = (application_choice or '').lower()
+        # 学生表中的申请类型为中文 (如 "申请私立大学本科")，同时兼容英文写法
+        if any(word in application_type for word in ('本科', 'undergraduate', 'bachelor')):
+            return "undergrad"
+        if any(word in application_type for word in ('硕士', '博士', '硕博', '研究生',
+                                                     'graduate', 'master', 'doctoral', 'phd')):
+            return "graduate"
+        # 如果申请类型不明确，使用所有大学数据
+        return "all"
+    
+    def university_view(self, application_choice):
+        """根据申请类型选择大学数据集 {"private": [...], "public": [...]}"""
+        return self.university_views[self._view_name(application_choice)]
+    
+    def university_index(self, application_choice):
+        """根据申请类型选择大学目录索引"""
+        return self.university_indexes[self._view_name(application_choice)]
+
+
+def match_applicant(applicant: NormalizedApplicant, context: Optional[MatchContext] = None) -> Dict[str, List[str]]:
+    """
+    对已归一化的学生执行匹配。
+    
+    参数:
+    applicant: normalize_applicant 的结果
+    context: 院校目录 (MatchContext)，所有学生共用同一个对象
+    
+    返回:
+    - 包含匹配结果的字典；提供非空的院校目录时，"catalog_universities" 为按目录入学要求和预算匹配的大学，
+      "catalog_international_schools" 为学费在预算内、满足学术要求的国际学校 (按匹配程度排序)
+    """
+    result, tiers = _match_applicant(applicant, context)
+    _count_tiers(tiers)
+    return result
+
+
+def _match_applicant(applicant, context):
+    """match_applicant 的实现，返回 (匹配结果, 档位标签)；档位标签为 students_matched_total 的 (kind, tier)"""
+    result = {}
+    tiers = ()
+    
+    application_choice = applicant.application_choice
+    
+    if application_choice == "申请私立大学本科":
+        university_result, tier = _match_universities(applicant)
+        tiers = (("university", tier),)
+        result.update(university_result)
+        if context is not None:
+            index = context.university_index(application_choice)
+            if len(index):
+                result["catalog_universities"] = index.query(applicant)
+    
+    elif application_choice == "国际学校":
+        matched_schools, tier = _match_international_schools(applicant)
+        tiers = (("international_school", tier),)
+        result["matched_international_schools"] = matched_schools
+        if context is not None and len(context.school_index):
+            result["catalog_international_schools"] = context.school_index.query(applicant)
+    
+    return result, tiers
+
+
+def _count_tiers(tiers):
+    for kind, tier in tiers:
+        metrics.inc("students_matched_total", kind=kind, tier=tier)
+
+
+class MatchResultCache:
+    """
+    匹配结果的LRU缓存 (线程安全)，键为 (NormalizedApplicant, 院校目录版本)。
+    
+    匹配是纯函数，成绩、语言、预算等归一化输入完全相同的学生结果相同；
+    当前匹配规则被替换后缓存自动清空，院校目录版本是键的一部分。
+    命中时返回结果的副本，调用方修改结果不会影响缓存。
+    
+    缓存条目同时保存匹配到的档位，命中时同样计入 students_matched_total；命中和未命中另计入 match_cache_total。
+    """
+    
+    def __init__(self, maxsize=DEFAULT_MATCH_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._rules = None
+        self._lock = threading.Lock()
+    
+    def __len__(self):
+        return len(self._entries)
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+    
+    def _lookup(self, key):
+        with self._lock:
+            if self._rules is not _active_rules:
+                self._entries.clear()
+                self._rules = _active_rules
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+            else:
+                self._entries.move_to_end(key)
+                self.hits += 1
+            return self._rules, entry
+    
+    def match(self, applicant, context=None):
+        """与 match_applicant 相同，结果相同的输入只计算一次"""
+        key = (applicant, context.version if context is not None else None)
+        rules, entry = self._lookup(key)
+        if entry is not None:
+            result, tiers = entry
+            metrics.inc("match_cache_total", result="hit")
+            _count_tiers(tiers)
+            return _copy_match_result(result)
+        
+        metrics.inc("match_cache_total", result="miss")
+        result, tiers = _match_applicant(applicant, context)
+        _count_tiers(tiers)
+        with self._lock:
+            # 计算期间规则被替换时不写入，避免旧规则的结果进入新缓存
+            if rules is self._rules and self.maxsize > 0:
+                self._entries[key] = (_copy_match_result(result), tiers)
+                if len(self._entries) > self.maxsize:
+                    self._entries.popitem(last=False)
+        return result
+    
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._entries)}
+
+
+def _copy_match_result(result):
+    return {key: list(value) if isinstance(value, list) else value for key, value in result.items()}
+
+
+# 进程内共用的匹配结果缓存，每个匹配进程各有一份
+match_result_cache = MatchResultCache()
+
+
+def match_applicant_cached(applicant: NormalizedApplicant, context: Optional[MatchContext] = None) -> Dict[str, List[str]]:
+    """通过 match_result_cache 执行 match_applicant，可直接传给 parallel_map"""
+    return match_result_cache.match(applicant, context)
+
+
+def match_student(applicant=None, **kwargs):
     """
     根据学生的数据匹配大学或国际学校。
     
     参数:
+    applicant: 已归一化的 NormalizedApplicant；为None时由关键字参数构造
     **kwargs: 关键字参数
-        - application_choice: "大学" 或 "国际学校"
+        - application_choice: "申请私立大学本科" 或 "国际学校"
         - academic_percentage: 学术成绩百分比
         - gaokao_score: 高考成绩 (如果没有则为None)
         - ielts_score: 雅思成绩 (如果没有则为None)
@@ -17,193 +338,71 @@ def match_student(**kwargs):
     
     返回:
     - 包含匹配结果的字典
-    """
-    result = {}
     
-    application_choice = kwargs.get('application_choice')
-    
-    if application_choice == "申请私立大学本科":
-        university_result = match_universities(**kwargs)
-        result.update(university_result)
-    
-    elif application_choice == "国际学校":
-        matched_schools = match_international_schools(**kwargs)
-        result["matched_international_schools"] = matched_schools
-    
-    return result
+    新代码请使用 match_applicant，院校目录通过 MatchContext 传入。
+    """
+    if applicant is None:
+        applicant = normalize_applicant(**kwargs)
+    return match_applicant(applicant)
 
 
-def match_universities(**kwargs):
+def match_universities(applicant=None, **kwargs):
     """根据学生的学术成绩和语言能力匹配大学。"""
+    if applicant is None:
+        applicant = normalize_applicant(**kwargs)
+    result, tier = _match_universities(applicant)
+    metrics.inc("students_matched_total", kind="university", tier=tier)
+    return result
+
+
+def _match_universities(applicant):
+    """match_universities 的实现，返回 (匹配结果, 档位名称)"""
     result = {}
     
-    # 获取参数并转换类型
-    academic_percentage_raw = kwargs.get('academic_percentage', 0)
-    gaokao_score_raw = kwargs.get('gaokao_score')
-    ielts_score_raw = kwargs.get('ielts_score')
-    toefl_score_raw = kwargs.get('toefl_score')
-    det_score_raw = kwargs.get('det_score')
-    language_pass = kwargs.get('language_pass', False)
-    has_high_school_cert = kwargs.get('has_high_school_cert', False)
-    
-    # 转换学术成绩为数字 (处理百分比)
-    try:
-        if isinstance(academic_percentage_raw, str):
-            # 去除可能的百分号
-            academic_percentage_str = academic_percentage_raw.replace('%', '')
-            academic_percentage = float(academic_percentage_str)
-        else:
-            academic_percentage = float(academic_percentage_raw) if academic_percentage_raw is not None else 0
-    except (ValueError, TypeError):
-        print(f"警告: 无法转换学术成绩 '{academic_percentage_raw}' 为数字，默认为0")
-        academic_percentage = 0
-    
-    # 转换高考分数为数字
-    try:
-        gaokao_score = int(gaokao_score_raw) if gaokao_score_raw is not None else None
-    except (ValueError, TypeError):
-        print(f"警告: 无法转换高考成绩 '{gaokao_score_raw}' 为数字，设为None")
-        gaokao_score = None
-    
-    # 转换雅思分数为数字
-    try:
-        ielts_score = float(ielts_score_raw) if ielts_score_raw is not None else None
-    except (ValueError, TypeError):
-        print(f"警告: 无法转换雅思成绩 '{ielts_score_raw}' 为数字，设为None")
-        ielts_score = None
+    row_logger.debug("转换后的值: %s", applicant)
     
-    # 转换托福分数为数字
-    try:
-        toefl_score = int(toefl_score_raw) if toefl_score_raw is not None else None
-    except (ValueError, TypeError):
-        print(f"警告: 无法转换托福成绩 '{toefl_score_raw}' 为数字，设为None")
-        toefl_score = None
+    # 按规则表查找级别
+    rules = _active_rules
+    tier_index = rules.match_tier(applicant.academic_percentage, applicant.gaokao_score,
+                                  applicant.ielts_score, applicant.toefl_score, applicant.det_score)
     
-    # 转换DET分数为数字
-    try:
-        det_score = int(det_score_raw) if det_score_raw is not None else None
-    except (ValueError, TypeError):
-        print(f"警告: 无法转换DET成绩 '{det_score_raw}' 为数字，设为None")
-        det_score = None
-    
-    # 输出转换后的值，便于调试
-    print(f"转换后的值: academic_percentage={academic_percentage}, gaokao_score={gaokao_score}")
-    print(f"转换后的值: ielts_score={ielts_score}, toefl_score={toefl_score}, det_score={det_score}")
-    
-    # 检查第一个条件：顶尖公立大学
-    if academic_percentage > 80 or (gaokao_score is not None and gaokao_score > 600):
-        if ((ielts_score is not None and 6.5 <= ielts_score <= 9.0) or 
-            (toefl_score is not None and 79 <= toefl_score <= 120) or 
-            (det_score is not None and det_score >= 105)):
-            result["matched_universities"] = ["新加坡国立大学", "新加坡南洋理工大学"]
-            return result
-    
-    # 检查第二个条件：其他公立大学
-    if 75 <= academic_percentage <= 80 or (gaokao_score is not None and 520 <= gaokao_score <= 600):
-        if ((ielts_score is not None and 6.0 <= ielts_score <= 9.0) or 
-            (toefl_score is not None and 60 <= toefl_score <= 120) or 
-            (det_score is not None and det_score >= 95)):
-            result["matched_universities"] = ["新加坡管理大学", "新加坡科技设计大学"]
-            return result
-    
-    # 如果学生不符合公立大学要求，检查私立大学的匹配条件
-    # 第三级别私立大学
-    if 70 <= academic_percentage < 75 or (gaokao_score is not None and 450 <= gaokao_score < 520):
-        matched_universities = ["英国伯明翰大学", "澳大利亚皇家墨尔本理工大学", "爱尔兰都柏林大学"]
-        path_to_university = determine_path_for_private_university(**kwargs)
-        result["matched_universities"] = matched_universities
-        result["path_to_university"] = path_to_university
-        return result
+    # 如果没有匹配到任何大学
+    if tier_index < 0:
+        result["matched_universities"] = []
+        return result, "未匹配"
     
-    # 第四级别私立大学
-    if 65 <= academic_percentage < 70 or (gaokao_score is not None and 400 <= gaokao_score < 450):
-        matched_universities = ["澳大利亚伍伦贡大学", "澳洲纽卡斯尔大学", "澳大利亚科廷大学", "新西兰梅西大学", "乐卓博大学"]
-        path_to_university = determine_path_for_private_university(**kwargs)
-        result["matched_universities"] = matched_universities
-        result["path_to_university"] = path_to_university
-        return result
+    tier = rules.university_tiers[tier_index]
+    result["matched_universities"] = list(tier.universities)
     
-    # 第五级别私立大学
-    if 60 <= academic_percentage < 65 or (gaokao_score is not None and 350 <= gaokao_score < 400):
-        matched_universities = ["英国考文垂大学", "澳大利亚莫道克大学", "英国诺比森亚大学", "英国斯特灵大学"]
-        path_to_university = determine_path_for_private_university(**kwargs)
-        result["matched_universities"] = matched_universities
-        result["path_to_university"] = path_to_university
-        return result
+    # 私立大学还需要确定升学路径
+    if tier.requires_path:
+        result["path_to_university"] = determine_path_for_private_university(applicant)
     
-    # 如果没有匹配到任何大学
-    result["matched_universities"] = []
-    return result
+    return result, tier.name
 
 
-def determine_path_for_private_university(**kwargs):
+def determine_path_for_private_university(applicant=None, **kwargs):
     """
     根据语言能力和高中毕业情况确定申请私立大学的学生的路径。
     """
-    # 获取参数并转换类型
-    ielts_score_raw = kwargs.get('ielts_score')
-    toefl_score_raw = kwargs.get('toefl_score')
-    det_score_raw = kwargs.get('det_score')
-    language_pass = kwargs.get('language_pass', False)
-    has_high_school_cert = kwargs.get('has_high_school_cert', False)
-    
-    # 转换雅思分数为数字
-    try:
-        ielts_score = float(ielts_score_raw) if ielts_score_raw is not None else None
-    except (ValueError, TypeError):
-        print(f"警告: 无法转换雅思成绩 '{ielts_score_raw}' 为数字，设为None")
-        ielts_score = None
-    
-    # 转换托福分数为数字
-    try:
-        toefl_score = int(toefl_score_raw) if toefl_score_raw is not None else None
-    except (ValueError, TypeError):
-        print(f"警告: 无法转换托福成绩 '{toefl_score_raw}' 为数字，设为None")
-        toefl_score = None
-    
-    # 转换DET分数为数字
-    try:
-        det_score = int(det_score_raw) if det_score_raw is not None else None
-    except (ValueError, TypeError):
-        print(f"警告: 无法转换DET成绩 '{det_score_raw}' 为数字，设为None")
-        det_score = None
-    
-    # 条件1：语言不达标 + 无高中毕业证书
-    if ((ielts_score is not None and ielts_score < 5.5) or 
-        (toefl_score is not None and toefl_score < 59) or 
-        (det_score is not None and det_score < 100) or 
-        not language_pass) and not has_high_school_cert:
-        return "进入语言班随后升入预科班"
-    
-    # 条件2：语言不达标 + 有高中毕业证书
-    elif ((ielts_score is not None and ielts_score < 5.5) or 
-          (toefl_score is not None and toefl_score < 59) or 
-          (det_score is not None and det_score < 100) or 
-          not language_pass) and has_high_school_cert:
-        return "进入语言班随后升入国际大一"
-    
-    # 条件3：语言中等 + 无高中毕业证书
-    elif ((ielts_score is not None and ielts_score == 5.5) or 
-          (toefl_score is not None and 46 <= toefl_score < 59) or 
-          (det_score is not None and 85 <= det_score < 100) or 
-          language_pass) and not has_high_school_cert:
-        return "进入预科班"
-    
-    # 条件4：语言达标 + 有高中毕业证书
-    elif ((ielts_score is not None and 6.0 <= ielts_score <= 9.0) or 
-          (toefl_score is not None and 60 <= toefl_score <= 120) or 
-          (det_score is not None and det_score >= 95) or 
-          language_pass) and has_high_school_cert:
-        return "进入国际大一"
-    
-    return None
-
-
-def match_international_schools(**kwargs):
+    if applicant is None:
+        applicant = normalize_applicant(**kwargs)
+    
+    # 按顺序检查规则表中的路径条件 (语言不达标/中等/达标 × 是否有高中毕业证书)
+    rules = _active_rules
+    path_index = rules.match_path(applicant.ielts_score, applicant.toefl_score, applicant.det_score,
+                                  applicant.language_pass, applicant.has_high_school_cert)
+    if path_index < 0:
+        return None
+    return rules.private_paths[path_index].path
+
+
+def match_international_schools(applicant=None, **kwargs):
     """
     根据学生的学术成绩、国际学校经验和预算匹配国际学校。
     
     参数:
+    applicant: 已归一化的 NormalizedApplicant；为None时由关键字参数构造
     **kwargs: 关键字参数
         - academic_percentage: 学术成绩百分比
         - has_international_school_experience: 学生是否有国际学校学习经验
@@ -212,20 +411,167 @@ def match_international_schools(**kwargs):
     返回:
     - 匹配的国际学校列表
     """
-    academic_percentage = kwargs.get('academic_percentage', 0)
-    has_international_school_experience = kwargs.get('has_international_school_experience', False)
-    budget_per_year = kwargs.get('budget_per_year', 0)
+    if applicant is None:
+        applicant = normalize_applicant(**kwargs)
+    schools, tier = _match_international_schools(applicant)
+    metrics.inc("students_matched_total", kind="international_school", tier=tier)
+    return schools
+
+
+def _match_international_schools(applicant):
+    """match_international_schools 的实现，返回 (匹配的学校, 档位标签)"""
+    # 按预算区间定位档位，再检查学术成绩或国际学校经验；
+    # 规则表沿用历史行为，未填写预算按 0 处理 (院校目录的预算过滤仍区分 None 与 0)
+    rules = _active_rules
+    budget = applicant.budget_per_year
+    rule_index = rules.match_school_rule(applicant.academic_percentage,
+                                         applicant.has_international_school_experience,
+                                         0 if budget is None else budget)
+    if rule_index < 0:
+        return [], "未匹配"
+    return list(rules.school_rules[rule_index].schools), f"档位{rule_index + 1}"
+
+
+def _batch_length(columns):
+    """返回列式输入的行数，并检查各列长度一致"""
+    lengths = {len(values) for values in columns.values() if values is not None}
+    if len(lengths) > 1:
+        raise ValueError(f"批量匹配的各列长度不一致: {sorted(lengths)}")
+    return lengths.pop() if lengths else 0
+
+
+def _score_column(values, n, parse):
+    """将一列原始分数转换为浮点数组，缺失或无法转换的值记为NaN"""
+    if values is None:
+        return np.full(n, np.nan)
+    if isinstance(values, np.ndarray) and values.dtype.kind in "iuf":
+        return values.astype(float)
+    parsed = [parse(value) for value in values]
+    return np.array([np.nan if value is None else value for value in parsed], dtype=float)
+
+
+def _flag_column(values, n):
+    """将一列布尔标记转换为布尔数组"""
+    if values is None:
+        return np.zeros(n, dtype=bool)
+    return np.array([bool(value) for value in values], dtype=bool)
+
+
+def _interval_mask(values, interval):
+    """返回落在规则区间内的布尔数组，区间为None时全部为False"""
+    if interval is None:
+        return np.zeros(len(values), dtype=bool)
+    above = values >= interval.low if interval.low_inclusive else values > interval.low
+    below = values <= interval.high if interval.high_inclusive else values < interval.high
+    return above & below
+
+
+def _language_mask(language, ielts, toefl, det, language_pass):
+    """对整列求值语言条件"""
+    mask = _interval_mask(ielts, language.ielts) | _interval_mask(toefl, language.toefl) | _interval_mask(det, language.det)
+    if language.language_pass is not None:
+        mask |= language_pass == language.language_pass
+    return mask
+
+
+def score_universities_batch(columns, rules=None):
+    """
+    对列式输入批量计算大学级别和私立大学升学路径。
     
-    # 条件1：高学术成绩或有国际学校经验 + 高预算
-    if (academic_percentage > 70 or has_international_school_experience) and budget_per_year >= 100000:
-        return ["UWC", "东陵信托国际学校", "美国国际学校", "德威国际学校", "北伦敦伦敦国际学校"]
+    参数:
+    columns: 列名到等长序列(列表或NumPy数组)的字典，列名与 match_student 的参数相同
+    rules: 已编译的匹配规则，默认为当前规则
     
-    # 条件2：中等学术成绩 + 中等预算
-    elif academic_percentage > 50 and 50000 <= budget_per_year <= 90000:
-        return ["斯坦福美国国际学校", "加拿大国际学校", "NPS国际学校", "澳洲国际学校", "布莱顿国际学校", "多佛国际学校"]
+    返回:
+    - (tiers, paths): 两个整数数组，分别为 rules.university_tiers 和 rules.private_paths 的下标，
+      未匹配时为 -1
+    """
+    if np is None:
+        raise ImportError("批量匹配需要安装 numpy")
+    if rules is None:
+        rules = _active_rules
+    
+    n = _batch_length(columns)
+    
+    # 整数类分数与 match_universities 一致，按 int 截断
+    academic = _score_column(columns.get('academic_percentage'), n, _parse_percentage)
+    gaokao = np.trunc(_score_column(columns.get('gaokao_score'), n, lambda value: _parse_int(value, "高考成绩")))
+    ielts = _score_column(columns.get('ielts_score'), n, lambda value: _parse_number(value, "雅思成绩"))
+    toefl = np.trunc(_score_column(columns.get('toefl_score'), n, lambda value: _parse_int(value, "托福成绩")))
+    det = np.trunc(_score_column(columns.get('det_score'), n, lambda value: _parse_int(value, "DET成绩")))
+    language_pass = _flag_column(columns.get('language_pass'), n)
+    has_cert = _flag_column(columns.get('has_high_school_cert'), n)
+    
+    # NaN 参与的比较均为 False，等价于逐行算法中的 "is not None and ..."；
+    # np.select 取第一个成立的条件，与规则表按顺序匹配一致
+    tier_conditions = []
+    for tier in rules.university_tiers:
+        condition = _interval_mask(academic, tier.academic) | _interval_mask(gaokao, tier.gaokao)
+        if tier.language is not None:
+            condition &= _language_mask(tier.language, ielts, toefl, det, language_pass)
+        tier_conditions.append(condition)
+    tiers = np.select(tier_conditions, np.arange(len(tier_conditions)), default=-1) if tier_conditions \
+        else np.full(n, -1)
+    
+    path_conditions = [
+        _language_mask(rule.language, ielts, toefl, det, language_pass) & (has_cert == rule.has_high_school_cert)
+        for rule in rules.private_paths
+    ]
+    paths = np.select(path_conditions, np.arange(len(path_conditions)), default=-1) if path_conditions \
+        else np.full(n, -1)
+    
+    return tiers, paths
+
+
+def match_students_batch(columns):
+    """
+    批量匹配学生，结果与逐行调用 match_student 相同。
     
-    # 条件3：低学术成绩 + 低预算
-    elif academic_percentage < 50 and budget_per_year < 50000:
-        return ["伊顿国际学校", "米德尔顿国际学校", "茵维特国际学校", "海外家庭学校", "莱仕国际学校", "环印国际学校", "壹世界国际学校", "汉合国际学校"]
+    参数:
+    columns: 列名到等长序列(列表或NumPy数组)的字典，列名与 match_student 的参数相同；
+        缺少 application_choice 列时所有学生按 "申请私立大学本科" 处理
     
-    return []
+    返回:
+    - 每个学生一个匹配结果字典的列表
+    """
+    rules = _active_rules
+    tiers, paths = score_universities_batch(columns, rules)
+    n = len(tiers)
+    
+    choices = columns.get('application_choice')
+    if choices is None:
+        choices = ["申请私立大学本科"] * n
+    
+    school_columns = [name for name in ('academic_percentage', 'has_international_school_experience', 'budget_per_year')
+                      if columns.get(name) is not None]
+    
+    results = []
+    tier_counts = {}
+    for i in range(n):
+        result = {}
+        application_choice = choices[i]
+        
+        if application_choice == "申请私立大学本科":
+            tier_index = int(tiers[i])
+            tier_counts[tier_index] = tier_counts.get(tier_index, 0) + 1
+            if tier_index < 0:
+                result["matched_universities"] = []
+            else:
+                tier = rules.university_tiers[tier_index]
+                result["matched_universities"] = list(tier.universities)
+                if tier.requires_path:
+                    path_index = int(paths[i])
+                    result["path_to_university"] = rules.private_paths[path_index].path if path_index >= 0 else None
+        
+        elif application_choice == "国际学校":
+            # 国际学校每行只需一次预算区间查找，直接逐行匹配
+            row = {name: columns[name][i] for name in school_columns}
+            result["matched_international_schools"] = match_international_schools(**row)
+        
+        results.append(result)
+    
+    for tier_index, count in tier_counts.items():
+        tier_name = rules.university_tiers[tier_index].name if tier_index >= 0 else "未匹配"
+        metrics.inc("students_matched_total", count, kind="university", tier=tier_name)
+    
+    return results
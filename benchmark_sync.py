@@ -0,0 +1,195 @@
+"""
+同步流程的基准测试。
+
+生成 N 名合成学生 (高考、雅思/托福/DET、预算等按 fake_huobanyun.synthetic_student 的分布)，
+分别测量 match_student、map_student_fields 以及针对本地 FakeHuobanyun 的完整 match_all_students 的
+吞吐量和单条延迟分位数 (完整流程按请求计：每次写入和每页读取)，结果以 JSON 输出，便于在版本之间比较。
+
+用法:
+    python benchmark_sync.py --students 100000 --output bench.json
+"""
+import argparse
+import json
+import logging
+import platform
+import random
+import sys
+import time
+from collections import defaultdict
+from datetime import datetime
+
+from fake_huobanyun import FakeHuobanyun, install, synthetic_student
+from huobanyun_match_integration import (
+    STUDENT_FIELD_MAPPING_NAMES, STUDENT_TABLE_1_ID, HuobanyunAPI, _endpoint_name, map_student_fields,
+    match_all_students,
+)
+from instrumentation import set_row_logging
+from Match_Algo import get_match_rules, match_student, normalize_applicant
+from table_schema import TableSchema
+
+DEFAULT_STUDENTS = 10000
+DEFAULT_PIPELINE_STUDENTS = 2000  # 完整流程经过模拟的HTTP层，默认规模更小
+STAGES = ("map", "match", "pipeline")
+
+
+def percentiles(samples):
+    """延迟样本 (秒) 的分位数，单位:微秒"""
+    if not samples:
+        return {}
+    ordered = sorted(samples)
+    last = len(ordered) - 1
+    result = {f"p{p}": ordered[min(last, int(round(p / 100 * last)))] * 1e6 for p in (50, 90, 99)}
+    result["max"] = ordered[-1] * 1e6
+    result["mean"] = sum(ordered) / len(ordered) * 1e6
+    return {key: round(value, 3) for key, value in result.items()}
+
+
+def _timed(func, inputs):
+    """逐条调用 func 并记录每次耗时，返回 (结果列表, 统计)"""
+    outputs = []
+    latencies = []
+    clock = time.perf_counter
+    started = clock()
+    for value in inputs:
+        call_started = clock()
+        outputs.append(func(value))
+        latencies.append(clock() - call_started)
+    elapsed = clock() - started
+    return outputs, {
+        "count": len(latencies),
+        "seconds": round(elapsed, 6),
+        "per_second": round(len(latencies) / elapsed, 1) if elapsed else None,
+        "latency_us": percentiles(latencies),
+    }
+
+
+def student_schema():
+    """学生表的字段结构 (与 fixtures 中学生表一致)"""
+    server = FakeHuobanyun().load_fixtures()
+    return TableSchema(STUDENT_TABLE_1_ID, server.tables[STUDENT_TABLE_1_ID]["fields"])
+
+
+def generate_items(count, schema, seed=0):
+    """生成 count 条学生表原始记录 (item/list 返回的结构)"""
+    rng = random.Random(seed)
+    field_ids = schema.field_ids
+    return [
+        {"item_id": str(3000000000000 + index),
+         "fields": {field_ids[name]: value for name, value in synthetic_student(index, rng).items()}}
+        for index in range(count)
+    ]
+
+
+def bench_map(items, schema):
+    extract = schema.extractor(STUDENT_FIELD_MAPPING_NAMES, flatten=True)
+    return _timed(lambda item: map_student_fields(item, extract, table_type=1), items)
+
+
+def bench_match(students):
+    return _timed(lambda student: match_student(normalize_applicant(**student)), students)
+
+
+class _TimedAPI(HuobanyunAPI):
+    """记录每次 api_request 耗时 (包括重试和限流等待) 的客户端，按端点分组"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.latencies = defaultdict(list)
+
+    def api_request(self, method, url, payload=None, **kwargs):
+        started = time.perf_counter()
+        try:
+            return super().api_request(method, url, payload, **kwargs)
+        finally:
+            # list.append 是原子操作，写入线程可以并发记录
+            self.latencies[_endpoint_name(url)].append(time.perf_counter() - started)
+
+
+def bench_pipeline(count, seed=0, latency=0.0, fetch_concurrency=None, match_workers=1):
+    """
+    针对 FakeHuobanyun 运行完整的 match_all_students。
+    write_latency_us 为每次写入匹配结果 (创建或更新) 的延迟分位数，read_latency_us 为每页 item/list 的延迟分位数。
+    """
+    server = FakeHuobanyun(latency=latency).load_fixtures()
+    server.add_synthetic_students(count, seed=seed)
+    api = _TimedAPI("benchmark", rate_limit=None)
+    install(api, server)
+    kwargs = {"match_workers": match_workers, "summary_only": True}
+    if fetch_concurrency:
+        kwargs["fetch_concurrency"] = fetch_concurrency
+    try:
+        started = time.perf_counter()
+        summary = match_all_students(api, **kwargs)
+        elapsed = time.perf_counter() - started
+    finally:
+        api.close()
+    return {
+        "count": summary["matched"],
+        "seconds": round(elapsed, 6),
+        "per_second": round(summary["matched"] / elapsed, 1) if elapsed else None,
+        "write_latency_us": percentiles(api.latencies["item"] + api.latencies["item/{id}"]),
+        "read_latency_us": percentiles(api.latencies["item/list"]),
+        "api_requests": dict(server.requests),
+        "simulated_latency_s": latency,
+        "match_workers": match_workers,
+    }
+
+
+def run_benchmark(students=DEFAULT_STUDENTS, pipeline_students=DEFAULT_PIPELINE_STUDENTS, stages=STAGES,
+                  seed=0, latency=0.0, match_workers=1):
+    """运行所选阶段，返回可序列化为JSON的结果"""
+    report = {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "rules_version": get_match_rules().version,
+        "students": students,
+        "seed": seed,
+        "stages": {},
+    }
+    if {"map", "match"} & set(stages):
+        schema = student_schema()
+        items = generate_items(students, schema, seed)
+        mapped, map_stats = bench_map(items, schema)
+        if "map" in stages:
+            report["stages"]["map_student_fields"] = map_stats
+        if "match" in stages:
+            report["stages"]["match_student"] = bench_match(mapped)[1]
+    if "pipeline" in stages:
+        report["stages"]["match_all_students"] = bench_pipeline(
+            pipeline_students, seed, latency, match_workers=match_workers)
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="学生匹配同步流程基准测试")
+    parser.add_argument("--students", type=int, default=DEFAULT_STUDENTS, help="映射/匹配阶段的学生数")
+    parser.add_argument("--pipeline-students", type=int, default=DEFAULT_PIPELINE_STUDENTS,
+                        help="完整流程阶段的学生数")
+    parser.add_argument("--stages", default=",".join(STAGES), help=f"要运行的阶段，逗号分隔 ({','.join(STAGES)})")
+    parser.add_argument("--latency", type=float, default=0.0, help="模拟的每个API请求耗时，单位:秒")
+    parser.add_argument("--match-workers", type=int, default=1, help="完整流程中并行匹配的进程数")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="结果JSON文件，默认输出到标准输出")
+    args = parser.parse_args(argv)
+
+    stages = [stage.strip() for stage in args.stages.split(",") if stage.strip()]
+    unknown = set(stages) - set(STAGES)
+    if unknown:
+        parser.error(f"未知阶段: {', '.join(sorted(unknown))}")
+
+    # 基准测试只关心耗时，关闭逐条日志
+    logging.basicConfig(level=logging.WARNING)
+    set_row_logging(False)
+
+    report = run_benchmark(args.students, args.pipeline_students, stages, args.seed, args.latency, args.match_workers)
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        sys.stdout.write(text + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,197 @@
+"""
+基于院校目录 (伙伴云大学表) 的匹配。
+
+大学表中的 "入学要求" 是自由文本，parse_admission_requirements 从中解析出
+学术成绩百分比、高考、雅思/托福/DET 的最低要求，parse_tuition 解析学费。
+UniversityCatalogIndex 按最低学术要求、最低高考分数和学费建立有序数组：
+与规则表一致，学术成绩或高考任一达到要求即可，每个学生用 bisect 分别取出两者满足的前缀并合并，
+再用预先计算的学费名次做预算过滤，最后检查语言要求，目录有数百个项目时每个学生仍在亚毫秒级完成。
+SchoolCatalogIndex 把国际学校按匹配程度预先排好，并按最低学术要求分组、组内按学费排序，
+用 bisect 同时定位满足学术要求的组和组内学费在预算内的学校。
+预算为0时同样按预算过滤 (只剩学费未知的项目)，只有预算缺失或无法解析 (None) 时不过滤。
+"""
+import re
+from bisect import bisect_left, bisect_right
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Optional
+
+_NUMBER = r"(\d+(?:\.\d+)?)"
+_GAP = r"[^\d\n，,;；。]{0,8}?"  # 关键字和数字之间允许的说明文字，如 "总分"、"不低于"
+
+_PERCENTAGE_PATTERN = re.compile(_NUMBER + r"\s*%")
+_GAOKAO_PATTERN = re.compile(r"高考" + _GAP + r"(\d{3})")
+_IELTS_PATTERN = re.compile(r"(?:雅思|IELTS)" + _GAP + _NUMBER, re.IGNORECASE)
+_TOEFL_PATTERN = re.compile(r"(?:托福|TOEFL)" + _GAP + _NUMBER, re.IGNORECASE)
+_DET_PATTERN = re.compile(r"(?:多邻国|DET|Duolingo)" + _GAP + _NUMBER, re.IGNORECASE)
+_TUITION_PATTERN = re.compile(r"(\d[\d,]*(?:\.\d+)?)\s*(万)?")
+
+
+@dataclass(frozen=True)
+class AdmissionRequirements:
+    """入学要求中的最低分数，None 表示没有该项要求"""
+    min_percentage: Optional[float] = None
+    min_gaokao: Optional[float] = None
+    min_ielts: Optional[float] = None
+    min_toefl: Optional[float] = None
+    min_det: Optional[float] = None
+
+    @property
+    def has_language_requirement(self):
+        return any(value is not None for value in (self.min_ielts, self.min_toefl, self.min_det))
+
+
+def _first_number(pattern, text):
+    match = pattern.search(text)
+    return float(match.group(1)) if match else None
+
+
+@lru_cache(maxsize=4096)
+def parse_admission_requirements(text):
+    """从入学要求文本中解析最低分数"""
+    if not isinstance(text, str) or not text:
+        return AdmissionRequirements()
+    return AdmissionRequirements(
+        min_percentage=_first_number(_PERCENTAGE_PATTERN, text),
+        min_gaokao=_first_number(_GAOKAO_PATTERN, text),
+        min_ielts=_first_number(_IELTS_PATTERN, text),
+        min_toefl=_first_number(_TOEFL_PATTERN, text),
+        min_det=_first_number(_DET_PATTERN, text),
+    )
+
+
+def parse_tuition(raw):
+    """解析学费 (数字或 "SGD 45,000/年"、"4.5万" 这样的文本)，无法解析时返回None"""
+    if isinstance(raw, (int, float)) and not isinstance(raw, bool):
+        return float(raw)
+    if not isinstance(raw, str):
+        return None
+    match = _TUITION_PATTERN.search(raw)
+    if not match:
+        return None
+    value = float(match.group(1).replace(",", ""))
+    return value * 10000 if match.group(2) else value
+
+
+def _meets(score, minimum):
+    return minimum is None or (score is not None and score >= minimum)
+
+
+class UniversityCatalogIndex:
+    """大学目录的有序索引，query() 返回学生满足入学要求且学费在预算内的大学名称"""
+
+    def __init__(self, universities):
+        entries = []
+        for university in universities:
+            name = university.get("name")
+            if not name:
+                continue
+            requirements = parse_admission_requirements(university.get("admission_requirements"))
+            entries.append((requirements.min_percentage or 0.0, name, requirements,
+                            parse_tuition(university.get("tuition_fees"))))
+        # 按最低学术要求升序，学术要求相同时按名称，保证结果稳定
+        entries.sort(key=lambda entry: (entry[0], entry[1]))
+
+        self._names = [entry[1] for entry in entries]
+        self._requirements = [entry[2] for entry in entries]
+        # 学术成绩达标即可录取的项目：有学术要求，或既无学术要求也无高考要求
+        academic = [(entry[0], position) for position, entry in enumerate(entries)
+                    if entry[2].min_percentage is not None or entry[2].min_gaokao is None]
+        self._academic_keys = [key for key, _ in academic]
+        self._academic_positions = [position for _, position in academic]
+        # 高考达标即可录取的项目，按最低高考分数升序
+        gaokao = sorted((entry[2].min_gaokao, position) for position, entry in enumerate(entries)
+                        if entry[2].min_gaokao is not None)
+        self._gaokao_keys = [key for key, _ in gaokao]
+        self._gaokao_positions = [position for _, position in gaokao]
+        # 学费名次：学费未知的项目排在最后，且不参与预算过滤
+        tuitions = sorted(entry[3] for entry in entries if entry[3] is not None)
+        self._tuition_keys = tuitions
+        self._tuition_ranks = [bisect_right(tuitions, entry[3]) - 1 if entry[3] is not None else None
+                               for entry in entries]
+
+    def __len__(self):
+        return len(self._names)
+
+    def query(self, applicant):
+        """返回满足条件的大学名称，入学要求高的排在前面"""
+        # 学术成绩或高考任一达标
+        positions = set(self._academic_positions[:bisect_right(self._academic_keys,
+                                                               applicant.academic_percentage or 0)])
+        if applicant.gaokao_score is not None:
+            positions.update(self._gaokao_positions[:bisect_right(self._gaokao_keys, applicant.gaokao_score)])
+        budget = applicant.budget_per_year
+        affordable = bisect_right(self._tuition_keys, budget) if budget is not None else None
+
+        matched = []
+        seen = set()  # 同一所大学可能同时出现在本科和硕博表中
+        for position in sorted(positions, reverse=True):
+            tuition_rank = self._tuition_ranks[position]
+            if affordable is not None and tuition_rank is not None and tuition_rank >= affordable:
+                continue
+            requirements = self._requirements[position]
+            if requirements.has_language_requirement and not (
+                    (requirements.min_ielts is not None and _meets(applicant.ielts_score, requirements.min_ielts))
+                    or (requirements.min_toefl is not None and _meets(applicant.toefl_score, requirements.min_toefl))
+                    or (requirements.min_det is not None and _meets(applicant.det_score, requirements.min_det))):
+                continue
+            name = self._names[position]
+            if name not in seen:
+                seen.add(name)
+                matched.append(name)
+        return matched
+
+
+class SchoolCatalogIndex:
+    """
+    国际学校目录的索引，query() 返回学费在预算内、满足学术要求的学校名称，按匹配程度排序：
+    学术要求越接近学生成绩 (越有竞争力) 越靠前，其次学费越高越靠前，学费未知的排在最后。
+
+    学校在构建时按上述顺序排好，并按最低学术要求分组 (要求高的组在前)，每组内学费降序；
+    满足学术要求的组是组列表的一段后缀，组内学费在预算内的学校也是一段后缀，两者都用 bisect 定位，
+    查询只拼接这些后缀，不再逐个过滤或排序。
+    """
+
+    def __init__(self, schools):
+        priced = {}  # {最低学术要求: [(学费, 名称)]}
+        unpriced = []  # [(最低学术要求, 名称)]
+        for school in schools:
+            name = school.get("name")
+            if not name:
+                continue
+            requirements = parse_admission_requirements(school.get("admission_requirements"))
+            min_percentage = requirements.min_percentage or 0.0
+            tuition = parse_tuition(school.get("tuition_fees"))
+            if tuition is None:
+                unpriced.append((min_percentage, name))
+            else:
+                priced.setdefault(min_percentage, []).append((tuition, name))
+
+        # 学费已知的学校：组按最低学术要求降序，bisect 用取负后的升序键
+        self._group_keys = []  # -最低学术要求
+        self._group_tuitions = []  # 每组的 -学费 (升序，即学费降序)
+        self._group_names = []
+        for min_percentage in sorted(priced, reverse=True):
+            group = sorted(priced[min_percentage], key=lambda entry: (-entry[0], entry[1]))
+            self._group_keys.append(-min_percentage)
+            self._group_tuitions.append([-tuition for tuition, _ in group])
+            self._group_names.append([name for _, name in group])
+        # 学费未知的学校排在最后，同样按最低学术要求降序
+        unpriced.sort(key=lambda entry: (-entry[0], entry[1]))
+        self._unpriced_keys = [-min_percentage for min_percentage, _ in unpriced]
+        self._unpriced_names = [name for _, name in unpriced]
+        self._count = sum(len(names) for names in self._group_names) + len(unpriced)
+
+    def __len__(self):
+        return self._count
+
+    def query(self, applicant):
+        """返回匹配的学校名称"""
+        academic_key = -(applicant.academic_percentage or 0)
+        budget = applicant.budget_per_year
+        matched = []
+        for group in range(bisect_left(self._group_keys, academic_key), len(self._group_keys)):
+            start = bisect_left(self._group_tuitions[group], -budget) if budget is not None else 0
+            matched.extend(self._group_names[group][start:])
+        matched.extend(self._unpriced_names[bisect_left(self._unpriced_keys, academic_key):])
+        return matched
@@ -0,0 +1,268 @@
+"""
+伙伴云 OpenAPI 的进程内替身，用于离线测试和压测。
+
+FakeHuobanyun 保存表格、字段配置和记录，实现同步流程用到的接口：
+table/list、table/{id}、item/list (分页和过滤)、item/{id}、创建记录 (POST item) 和更新记录 (PUT item/{id})。
+FakeHuobanyunAdapter 是 requests 的传输适配器，install() 把它挂载到 HuobanyunAPI.session 上，
+之后发往 API_BASE_URL 的请求都在进程内处理，不访问网络。
+
+数据可以从 fixtures/huobanyun 下的 JSON 文件加载，也可以生成任意规模的合成学生；
+latency 模拟每个请求的耗时，error_rate / fail_next() 注入错误响应以测试重试。
+"""
+import glob
+import json
+import os
+import random
+import threading
+import time
+from collections import Counter, deque
+from datetime import datetime
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import BaseAdapter
+from requests.structures import CaseInsensitiveDict
+
+from huobanyun_match_integration import API_BASE_URL, STUDENT_TABLE_1_ID, _endpoint_name
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "huobanyun")
+DEFAULT_LIMIT = 20  # item/list 未指定 limit 时每页的记录数
+MAX_LIMIT = 500  # item/list 每页最多返回的记录数
+
+# 合成学生的申请类型
+SYNTHETIC_APPLICATION_CHOICES = ("申请私立大学本科", "国际学校")
+
+_COMPARATORS = {
+    "eq": lambda value, target: value == target,
+    "ne": lambda value, target: value != target,
+    "in": lambda value, target: value in target,
+    "gt": lambda value, target: value is not None and value > target,
+    "gte": lambda value, target: value is not None and value >= target,
+    "lt": lambda value, target: value is not None and value < target,
+    "lte": lambda value, target: value is not None and value <= target,
+}
+
+
+def synthetic_student(index, rng):
+    """
+    生成一名合成学生的 {字段名称: 值}。
+    分布有偏，接近真实学生：学术成绩集中在 70-85 (beta 分布，低至 30 的长尾覆盖 50 分以下的档位)，
+    年度预算为对数正态 (中位数约 10 万，覆盖 5 万以下到 50 万以上的各档位和目录学费)，少数学生未填预算；
+    语言和高考成绩集中在中段。
+    """
+    choice = rng.choice(SYNTHETIC_APPLICATION_CHOICES)
+    values = {
+        "学生姓名": f"合成学生{index:07d}",
+        "申请类型": {"id": SYNTHETIC_APPLICATION_CHOICES.index(choice) + 1, "text": choice},
+        "学术成绩": str(round(30 + 70 * rng.betavariate(5, 2))),
+        "拥有高中毕业证书": rng.random() < 0.7,
+        "通过语言测试": rng.random() < 0.3,
+        "有国际学校经验": rng.random() < 0.4,
+    }
+    if rng.random() < 0.95:
+        budget = min(max(rng.lognormvariate(11.5, 0.9), 10000), 800000)
+        values["年度预算"] = str(round(budget, -3))
+    if rng.random() < 0.6:
+        values["雅思成绩"] = str(rng.choices((5.0, 5.5, 6.0, 6.5, 7.0, 7.5), weights=(1, 3, 5, 4, 2, 1))[0])
+    if rng.random() < 0.3:
+        values["托福成绩"] = str(min(max(round(rng.gauss(85, 12)), 40), 120))
+    if rng.random() < 0.2:
+        values["DET成绩"] = str(min(max(round(rng.gauss(110, 12)), 60), 160))
+    if rng.random() < 0.5:
+        values["高考成绩"] = str(min(max(round(rng.gauss(540, 60)), 300), 720))
+    return values
+
+
+class FakeHuobanyun:
+    """内存中的伙伴云空间 (线程安全)"""
+
+    def __init__(self, space_id=None, latency=0.0, error_rate=0.0, error_status=503, seed=None):
+        self.space_id = space_id
+        self.latency = latency  # 每个请求的模拟耗时，单位:秒
+        self.error_rate = error_rate  # 随机返回 error_status 的概率
+        self.error_status = error_status
+        self.tables = {}  # {表格ID: {"table_id", "name", "fields"}}
+        self.items = {}  # {表格ID: [记录]}
+        self.requests = Counter()  # {端点: 请求次数}
+        self._items_by_id = {}
+        self._failures = deque()
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._next_item_id = 2400000000000
+
+    # ---- 数据准备 ----
+
+    def add_table(self, table_id, name, fields):
+        """添加表格，fields 为字段配置列表 [{"field_id", "name", "type"}]"""
+        self.tables[table_id] = {"table_id": table_id, "name": name, "fields": list(fields)}
+        self.items.setdefault(table_id, [])
+
+    def add_item(self, table_id, fields, item_id=None, updated_on=None):
+        """添加一条记录，fields 为 {字段ID: 值}"""
+        with self._lock:
+            return self._add_item(table_id, fields, item_id, updated_on)
+
+    def _add_item(self, table_id, fields, item_id=None, updated_on=None):
+        if item_id is None:
+            self._next_item_id += 1
+            item_id = str(self._next_item_id)
+        now = updated_on or _now()
+        item = {"item_id": item_id, "table_id": table_id, "created_on": now, "updated_on": now,
+                "fields": dict(fields)}
+        self.items[table_id].append(item)
+        self._items_by_id[str(item_id)] = item
+        return item
+
+    def load_fixtures(self, directory=FIXTURE_DIR):
+        """加载目录下所有 JSON 文件：{"space_id", "tables": [{"table_id", "name", "fields", "items"}]}"""
+        for path in sorted(glob.glob(os.path.join(directory, "*.json"))):
+            with open(path, encoding="utf-8") as f:
+                data = json.load(f)
+            self.space_id = self.space_id or data.get("space_id")
+            for table in data.get("tables", []):
+                self.add_table(table["table_id"], table.get("name", ""), table.get("fields", []))
+                for item in table.get("items", []):
+                    self.add_item(table["table_id"], item.get("fields", {}), item.get("item_id"),
+                                  item.get("updated_on"))
+        return self
+
+    def add_synthetic_items(self, table_id, count, row_factory, seed=0):
+        """按 row_factory(序号, random.Random) 返回的 {字段名称: 值} 生成 count 条记录"""
+        rng = random.Random(seed)
+        field_ids = {field["name"]: field["field_id"] for field in self.tables[table_id]["fields"]}
+        with self._lock:
+            for index in range(count):
+                values = row_factory(index, rng)
+                self._add_item(table_id, {field_ids[name]: value for name, value in values.items()
+                                          if name in field_ids})
+
+    def add_synthetic_students(self, count, table_id=STUDENT_TABLE_1_ID, seed=0):
+        """在学生表中生成 count 名合成学生 (表格的字段配置需已加载)"""
+        self.add_synthetic_items(table_id, count, synthetic_student, seed)
+
+    def fail_next(self, status=503, count=1, retry_after=None):
+        """让接下来的 count 个请求返回 status；status 为 200 时返回业务层限流错误"""
+        with self._lock:
+            self._failures.extend([(status, retry_after)] * count)
+
+    def throttle_next(self, count=1):
+        """让接下来的 count 个请求被业务层限流 (HTTP 200，业务错误 "请求过于频繁")"""
+        self.fail_next(200, count)
+
+    # ---- 请求处理 ----
+
+    def handle(self, method, path, payload):
+        """
+        处理一个请求，path 为去掉 API_BASE_URL 后的路径；返回 (状态码, JSON响应体, 响应头)。
+        响应体在锁内序列化，返回的是当时数据的快照。
+        """
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            status, body, headers = self._handle(method, path, payload)
+            return status, json.dumps(body, ensure_ascii=False), headers
+
+    def _handle(self, method, path, payload):
+        self.requests[_endpoint_name(path)] += 1
+        if self._failures:
+            status, retry_after = self._failures.popleft()
+            return _error(status, retry_after)
+        if self.error_rate and self._random.random() < self.error_rate:
+            return _error(self.error_status)
+        try:
+            data = self._dispatch(method.upper(), path.strip("/").split("/"), payload or {})
+        except KeyError as e:
+            return 200, {"code": 1002, "message": f"资源不存在: {e}"}, {}
+        if data is None:
+            return 404, {"code": 404, "message": f"未知接口: {method} {path}"}, {}
+        return 200, {"code": 0, "message": "success", "data": data}, {}
+
+    def _dispatch(self, method, parts, payload):
+        if parts == ["table", "list"] and method == "POST":
+            return {"tables": [{"table_id": t["table_id"], "name": t["name"]} for t in self.tables.values()]}
+        if len(parts) == 2 and parts[0] == "table" and method == "POST":
+            return {"table": self.tables[parts[1]]}
+        if parts == ["item", "list"] and method == "POST":
+            return self._list_items(payload)
+        if parts == ["item"] and method == "POST":
+            table_id = payload["table_id"]
+            self.tables[table_id]  # 表格不存在时抛出 KeyError
+            return {"item": self._add_item(table_id, payload.get("fields", {}))}
+        if len(parts) == 2 and parts[0] == "item":
+            item = self._items_by_id[parts[1]]
+            if method == "PUT":
+                item["fields"].update(payload.get("fields", {}))
+                item["updated_on"] = _now()
+                return {"item": item}
+            if method == "POST":
+                # 与 HuobanyunAPI.get_item_details 的使用方式一致，直接返回记录
+                return item
+        return None
+
+    def _list_items(self, payload):
+        items = self.items[payload["table_id"]]
+        if payload.get("filter"):
+            items = [item for item in items if _matches(item, payload["filter"])]
+        offset = payload.get("offset") or 0
+        limit = min(payload.get("limit") or DEFAULT_LIMIT, MAX_LIMIT)
+        page = items[offset:offset + limit]
+        return {"items": page, "total": len(items), "has_more": offset + len(page) < len(items)}
+
+
+def _now():
+    return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+
+def _error(status, retry_after=None):
+    headers = {"Retry-After": str(retry_after)} if retry_after is not None else {}
+    if status == 200:
+        return status, {"code": 429, "message": "请求过于频繁 (注入的限流响应)"}, headers
+    return status, {"code": status, "message": "注入的错误响应"}, headers
+
+
+def _matches(item, condition):
+    """判断记录是否满足过滤条件 {"and"/"or": [...]} 或 {"field", "query": {操作符: 值}}"""
+    if "and" in condition:
+        return all(_matches(item, sub) for sub in condition["and"])
+    if "or" in condition:
+        return any(_matches(item, sub) for sub in condition["or"])
+    field = condition["field"]
+    value = item.get(field) if field in ("item_id", "created_on", "updated_on") else item["fields"].get(field)
+    return all(_COMPARATORS[op](value, target) for op, target in condition.get("query", {}).items())
+
+
+class FakeHuobanyunAdapter(BaseAdapter):
+    """把 requests 请求交给 FakeHuobanyun 处理的传输适配器"""
+
+    def __init__(self, server):
+        super().__init__()
+        self.server = server
+        self._base_path = urlparse(API_BASE_URL).path
+
+    def send(self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None):
+        path = urlparse(request.url).path
+        if path.startswith(self._base_path):
+            path = path[len(self._base_path):]
+        body = request.body.decode("utf-8") if isinstance(request.body, bytes) else request.body
+        status, content, headers = self.server.handle(request.method, path, json.loads(body) if body else {})
+
+        response = requests.Response()
+        response.status_code = status
+        response.reason = "OK" if status == 200 else "Error"
+        response.headers = CaseInsensitiveDict({"Content-Type": "application/json", **headers})
+        response._content = content.encode("utf-8")
+        response.encoding = "utf-8"
+        response.url = request.url
+        response.request = request
+        return response
+
+    def close(self):
+        pass
+
+
+def install(huoban_api, server=None):
+    """把 FakeHuobanyun 挂载到 HuobanyunAPI 的会话上，返回该 FakeHuobanyun (未提供时加载默认数据)"""
+    if server is None:
+        server = FakeHuobanyun().load_fixtures()
+    huoban_api.session.mount(API_BASE_URL, FakeHuobanyunAdapter(server))
+    return server
@@ -0,0 +1,442 @@
+"""
+伙伴云API的 asyncio 版本。
+
+AsyncHuobanyunAPI 与 HuobanyunAPI 接口一致 (方法为协程)，基于 aiohttp；
+match_all_students_async 在读取学生表的同时进行匹配并并发写入匹配结果表，
+适合在已有事件循环的调度服务中同时驱动多个空间。
+"""
+import asyncio
+import json
+import logging
+from collections import Counter
+
+try:
+    import aiohttp
+except ImportError:  # aiohttp 仅异步客户端需要
+    aiohttp = None
+
+from huobanyun_match_integration import (
+    API_BASE_URL, SPACE_ID, DEFAULT_TIMEOUT, DEFAULT_POOL_SIZE, DEFAULT_PAGE_SIZE, DEFAULT_RATE_LIMIT,
+    DEFAULT_RATE_BURST, DEFAULT_WRITE_CONCURRENCY, STUDENT_LOCK_STRIPES, HuobanyunAPIError,
+    STUDENT_TABLE_1_ID, STUDENT_TABLE_2_ID, UNIVERSITY_TABLES, INTERNATIONAL_SCHOOL_TABLE_ID,
+    MATCH_RESULT_TABLE_ID, SYNC_TABLE_IDS, STUDENT_FIELD_MAPPING_NAMES,
+    _endpoint_name, has_next_page, get_field_extractor, map_student_fields, get_all_existing_matches,
+    get_university_data, get_international_school_data, match_student_entry, build_match_result_fields,
+    item_ids_filter, match_result_unchanged, WRITE_CREATED, WRITE_UPDATED, WRITE_SKIPPED, WRITE_FAILED,
+)
+from instrumentation import get_row_logger, metrics
+from Match_Algo import MatchContext
+from rate_limit import RetryPolicy, TokenBucket, parse_retry_after
+from schema_cache import build_field_name_index
+from table_schema import TableSchema
+
+logger = logging.getLogger(__name__)
+row_logger = get_row_logger(__name__)
+
+
+class _FieldConfigView:
+    """以同步接口暴露已缓存的字段配置，供 get_field_mappings 等同步映射函数复用"""
+
+    def __init__(self, field_configurations, schema_cache=None):
+        self.field_configurations = field_configurations
+        self.schema_cache = schema_cache
+        self.table_schemas = {}
+        self.refreshed_schema_tables = set()
+
+    def get_field_configurations(self, table_id):
+        return self.field_configurations.get(table_id, [])
+
+    def get_table_schema(self, table_id):
+        if table_id not in self.table_schemas:
+            self.table_schemas[table_id] = TableSchema(table_id, self.get_field_configurations(table_id))
+        return self.table_schemas[table_id]
+
+    def get_field_name_index(self, table_id):
+        return self.get_table_schema(table_id).field_ids
+
+    def refresh_field_configurations(self, table_id):
+        # 同步视图无法重新请求，只让持久化缓存失效，下次运行时重新获取
+        if self.schema_cache is not None:
+            self.schema_cache.invalidate(table_id)
+        return self.get_field_configurations(table_id)
+
+
+class AsyncHuobanyunAPI:
+    def __init__(self, app_secret, timeout=DEFAULT_TIMEOUT, pool_size=DEFAULT_POOL_SIZE,
+                 rate_limit=DEFAULT_RATE_LIMIT, rate_burst=DEFAULT_RATE_BURST, retry_policy=None, schema_cache=None,
+                 base_url=API_BASE_URL):
+        if aiohttp is None:
+            raise ImportError("AsyncHuobanyunAPI 需要安装 aiohttp")
+        self.app_secret = app_secret
+        self.base_url = base_url  # 测试时可指向本地服务
+        self.field_configurations = {}  # 缓存表格字段配置
+        self.schema_cache = schema_cache  # 可选的持久化字段配置缓存
+        self._field_view = None
+        self.timeout = timeout
+        self.pool_size = pool_size
+        self._session = None
+        # 同一客户端的所有请求共享一个令牌桶
+        self.rate_limiter = TokenBucket(rate_limit, rate_burst)
+        self.retry_policy = retry_policy or RetryPolicy()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    def get_headers(self):
+        """获取API请求头部"""
+        return {
+            "Open-Authorization": f"Bearer {self.app_secret}",
+            "Content-Type": "application/json"
+        }
+
+    def _client_timeout(self, timeout):
+        connect, read = timeout
+        return aiohttp.ClientTimeout(sock_connect=connect, sock_read=read)
+
+    def _get_session(self):
+        # aiohttp 会话必须在事件循环中创建，因此延迟到第一次请求
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                headers=self.get_headers(),
+                connector=aiohttp.TCPConnector(limit=self.pool_size),
+                timeout=self._client_timeout(self.timeout),
+            )
+        return self._session
+
+    async def close(self):
+        """关闭会话并释放连接"""
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def api_request(self, method, url, payload=None, debug=False, timeout=None, idempotent=True):
+        """发送API请求，返回值、异常、限流和重试行为与 HuobanyunAPI.api_request 相同"""
+        if payload is None:
+            payload = {}
+
+        request_logger, level = (logger, logging.INFO) if debug else (row_logger, logging.DEBUG)
+        endpoint = _endpoint_name(url, self.base_url)
+
+        attempt = 0
+        while True:
+            delay = self.rate_limiter.reserve()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            try:
+                return await self._send_request(method, url, payload, timeout, endpoint, request_logger, level)
+            except HuobanyunAPIError as e:
+                attempt += 1
+                if not e.retryable or attempt >= self.retry_policy.max_attempts:
+                    raise
+                if not idempotent and not self.retry_policy.can_resend(e.status_code, e.retry_after, e.code, str(e)):
+                    raise
+                delay = self.retry_policy.delay(attempt, e.retry_after)
+                if e.retry_after is not None:
+                    self.rate_limiter.pause(delay)
+                metrics.inc("api_retries_total", endpoint=endpoint)
+                logger.warning("%s，%.2f 秒后第 %d 次重试: %s %s", e, delay, attempt, method, url)
+                await asyncio.sleep(delay)
+
+    async def _send_request(self, method, url, payload, timeout, endpoint, request_logger, level):
+        """发送一次请求，失败时抛出 HuobanyunAPIError"""
+        metrics.inc("api_requests_total", method=method.upper(), endpoint=endpoint)
+
+        if request_logger.isEnabledFor(level):
+            request_logger.log(level, "请求: %s %s", method, url)
+            request_logger.log(level, "载荷: %s", json.dumps(payload))
+
+        if method.upper() == "GET":
+            kwargs = {"params": payload}
+        elif method.upper() in ("POST", "PUT"):
+            kwargs = {"json": payload}
+        else:
+            raise ValueError(f"不支持的请求方法: {method}")
+        if timeout is not None:
+            kwargs["timeout"] = self._client_timeout(timeout)
+
+        try:
+            async with self._get_session().request(method.upper(), url, **kwargs) as response:
+                status = response.status
+                retry_after = parse_retry_after(response.headers.get("Retry-After"))
+                text = await response.text()
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            metrics.inc("api_errors_total", endpoint=endpoint, reason="connection")
+            request_logger.log(level, "请求异常: %s", e)
+            raise HuobanyunAPIError(f"请求异常: {e}")
+
+        if request_logger.isEnabledFor(level):
+            request_logger.log(level, "状态码: %s", status)
+            request_logger.log(level, "响应: %s%s", text[:200], '...' if len(text) > 200 else '')
+
+        if status == 200:
+            data = json.loads(text)
+            if data.get("code") == 0:  # 确保业务逻辑成功
+                return data.get("data", {})  # 直接返回 data 部分
+            message = data.get('message', 'Unknown error')
+            error = HuobanyunAPIError(
+                f"API业务逻辑错误: {message}", status_code=200, code=data.get("code"), retry_after=retry_after,
+                retryable=self.retry_policy.is_retryable(business_code=data.get("code"), message=message))
+            metrics.inc("api_errors_total", endpoint=endpoint, reason="business")
+        else:
+            error = HuobanyunAPIError(
+                f"API请求失败: {status} - {text}", status_code=status, retry_after=retry_after,
+                retryable=self.retry_policy.is_retryable(status_code=status))
+            metrics.inc("api_errors_total", endpoint=endpoint, reason=str(status))
+        request_logger.log(level, "错误: %s", error)
+        raise error
+
+    async def get_table_list(self):
+        """获取表格列表"""
+        return await self.api_request("POST", f"{self.base_url}/table/list", {"space_id": SPACE_ID})
+
+    async def get_table_details(self, table_id):
+        """获取表格详细信息"""
+        return await self.api_request("POST", f"{self.base_url}/table/{table_id}", {})
+
+    async def get_field_configurations(self, table_id):
+        """获取并缓存表格字段配置"""
+        try:
+            if table_id not in self.field_configurations and self.schema_cache is not None:
+                cached_fields = self.schema_cache.get(table_id)
+                if cached_fields is not None:
+                    self.field_configurations[table_id] = cached_fields
+            if table_id not in self.field_configurations:
+                table_details = await self.get_table_details(table_id)
+                # 字段应该在 table.fields 路径下
+                fields = table_details.get("table", {}).get("fields")
+                if fields is None:
+                    logger.warning("未在API响应中找到字段配置,返回路径: %s", list(table_details.keys()))
+                    fields = []
+                elif self.schema_cache is not None:
+                    self.schema_cache.put(table_id, fields)
+                self.field_configurations[table_id] = fields
+            return self.field_configurations[table_id]
+        except Exception as e:
+            logger.exception("获取字段配置时发生错误 (表格ID: %s): %s", table_id, e)
+            return []
+
+    def field_config_view(self):
+        """返回已缓存字段配置的同步视图 (同一客户端共用一个视图，字段结构只构建一次)"""
+        if self._field_view is None:
+            self._field_view = _FieldConfigView(self.field_configurations, self.schema_cache)
+        return self._field_view
+
+    async def get_table_items(self, table_id, limit=None, filter_conditions=None, offset=None):
+        """获取表格中的项目 (单页)"""
+        payload = {"table_id": table_id}
+        if limit is not None:
+            payload["limit"] = limit
+        if offset is not None:
+            payload["offset"] = offset
+        if filter_conditions is not None:
+            payload["filter"] = filter_conditions
+        return await self.api_request("POST", f"{self.base_url}/item/list", payload)
+
+    async def iter_table_items(self, table_id, page_size=DEFAULT_PAGE_SIZE, filter_conditions=None, offset=0):
+        """从 offset 开始逐页读取表格直到读完，按需逐条返回项目"""
+        while True:
+            page = await self.get_table_items(table_id, limit=page_size, filter_conditions=filter_conditions,
+                                              offset=offset)
+            items = page.get("items", [])
+            for item in items:
+                yield item
+
+            offset += len(items)
+            if not has_next_page(page, offset, page_size):
+                return
+
+    async def fetch_table_items(self, table_id, page_size=DEFAULT_PAGE_SIZE, filter_conditions=None):
+        """读取整个表格；第一页给出 total 时其余各页以第一页的实际记录数为步长并发读取"""
+        first = await self.get_table_items(table_id, limit=page_size, filter_conditions=filter_conditions, offset=0)
+        items = list(first.get("items", []))
+        total = first.get("total")
+        if not has_next_page(first, len(items), page_size):
+            return items
+        if total is None:
+            # 总数未知，从第二页开始顺序翻页
+            async for item in self.iter_table_items(table_id, page_size, filter_conditions, offset=len(items)):
+                items.append(item)
+            return items
+
+        pages = await asyncio.gather(*(
+            self.get_table_items(table_id, limit=page_size, filter_conditions=filter_conditions, offset=offset)
+            for offset in range(len(items), total, len(items))
+        ))
+        for page in pages:
+            items.extend(page.get("items", []))
+        return items
+
+    async def get_item_details(self, item_id):
+        """获取单个项目详情"""
+        return await self.api_request("POST", f"{self.base_url}/item/{item_id}", {})
+
+    async def create_item(self, table_id, fields):
+        """创建新的表格项目"""
+        result = await self.api_request("POST", f"{self.base_url}/item", {"table_id": table_id, "fields": fields},
+                                        idempotent=False)
+        if result and "item" in result and "item_id" in result["item"]:
+            row_logger.debug("创建成功, 记录ID: %s", result['item']['item_id'])
+            return result["item"]
+        logger.warning("创建记录返回异常结构: %s", result)
+        return None
+
+    async def update_item(self, item_id, fields):
+        """更新已有的表格项目"""
+        result = await self.api_request("PUT", f"{self.base_url}/item/{item_id}", {"fields": fields})
+        if result and "item" in result:
+            row_logger.debug("更新成功, 记录ID: %s", item_id)
+            return result["item"]
+        logger.warning("更新记录返回异常结构: %s", result)
+        return None
+
+
+async def get_student_names_async(huoban_api, table_id, student_ids, batch_size=DEFAULT_PAGE_SIZE):
+    """按记录ID批量获取学生姓名 (get_student_names 的异步版本)，返回 {学生ID: 姓名}"""
+    names = {}
+    fields = await huoban_api.get_field_configurations(table_id)
+    name_field_id = build_field_name_index(fields).get("学生姓名")
+    if not name_field_id:
+        logger.warning("表格 %s 中没有找到学生姓名字段", table_id)
+        return names
+    student_ids = list(student_ids)
+    try:
+        for start in range(0, len(student_ids), batch_size):
+            async for item in huoban_api.iter_table_items(
+                    table_id, page_size=batch_size,
+                    filter_conditions=item_ids_filter(student_ids[start:start + batch_size])):
+                student_name = item.get("fields", {}).get(name_field_id)
+                if student_name:
+                    names[item["item_id"]] = student_name
+    except Exception as e:
+        logger.exception("批量获取学生姓名时出错 (表格ID: %s): %s", table_id, e)
+    return names
+
+
+async def update_match_result_async(huoban_api, result_entry, existing_matches):
+    """update_match_result 的异步版本：已存在该学生的记录则更新 (内容未变化时跳过)，否则创建；返回写入状态"""
+    student_id = result_entry["student_id"]
+    student_name = result_entry.get("student_name") or f"学生ID: {student_id}"
+    fields = build_match_result_fields(huoban_api.field_config_view(), student_name, result_entry["match_result"])
+
+    existing_match = existing_matches.get(student_name)
+    if existing_match and match_result_unchanged(existing_match, fields):
+        return WRITE_SKIPPED
+    try:
+        if existing_match:
+            if not await huoban_api.update_item(existing_match["item_id"], fields):
+                return WRITE_FAILED
+            existing_match["fields"] = {**existing_match.get("fields", {}), **fields}
+            return WRITE_UPDATED
+        result = await huoban_api.create_item(MATCH_RESULT_TABLE_ID, fields)
+        if not result:
+            return WRITE_FAILED
+        if "item_id" in result:
+            existing_matches[student_name] = {"item_id": result["item_id"], "fields": dict(fields)}
+        return WRITE_CREATED
+    except Exception as e:
+        logger.exception("更新或创建匹配结果时发生错误: %s", e)
+        return WRITE_FAILED
+
+
+async def match_all_students_async(huoban_api, write_concurrency=DEFAULT_WRITE_CONCURRENCY, summary_only=False):
+    """
+    为所有学生执行匹配 (match_all_students 的异步版本)。
+
+    先并发读取字段配置、院校数据和现有匹配结果；随后两个学生表逐页读取，
+    每条记录读到后立即匹配，并在最多 write_concurrency 个并发请求内写入结果表。
+    未完成的写入最多 write_concurrency * DEFAULT_PAGE_SIZE 个，超过时读取等待写入完成。
+
+    summary_only 为True时不保留逐个学生的结果，只返回汇总
+    {"students": 匹配的学生数, "matched": 匹配数, "skipped": 0, "writes": {状态: 数量}, "failed": [...]}，
+    内存占用与学生数无关。
+    """
+    catalog_tables = [*UNIVERSITY_TABLES.values(), INTERNATIONAL_SCHOOL_TABLE_ID, MATCH_RESULT_TABLE_ID]
+    await asyncio.gather(*(huoban_api.get_field_configurations(table_id) for table_id in SYNC_TABLE_IDS))
+    catalog_items = await asyncio.gather(*(huoban_api.fetch_table_items(table_id) for table_id in catalog_tables))
+    prefetched = dict(zip(catalog_tables, catalog_items))
+
+    field_view = huoban_api.field_config_view()
+    existing_matches = get_all_existing_matches(field_view, prefetched)
+    # 院校目录只构建一次，所有学生共用
+    context = MatchContext.from_catalog(get_university_data(field_view, prefetched),
+                                        get_international_school_data(field_view, prefetched))
+
+    semaphore = asyncio.Semaphore(write_concurrency)
+    # 未完成写入的上限，读取速度超过写入时在 submit 处等待
+    capacity = asyncio.Semaphore(write_concurrency * DEFAULT_PAGE_SIZE)
+    # 同一学生的写入串行执行，避免并发创建重复记录；锁按姓名哈希分组，数量固定
+    student_locks = [asyncio.Lock() for _ in range(STUDENT_LOCK_STRIPES)]
+    results = None if summary_only else []
+    pending = set()
+    failed = []
+    write_counts = Counter()
+    matched = 0
+
+    async def write(result_entry):
+        try:
+            async with student_locks[hash(result_entry["student_name"]) % STUDENT_LOCK_STRIPES], semaphore:
+                status = await update_match_result_async(huoban_api, result_entry, existing_matches)
+        finally:
+            capacity.release()
+        write_counts[status] += 1
+        metrics.inc("match_results_total", status=status)
+        if status == WRITE_FAILED:
+            failed.append({"student_id": result_entry["student_id"],
+                           "student_table_id": result_entry["student_table_id"],
+                           "student_name": result_entry.get("student_name")})
+
+    async def submit(student):
+        nonlocal matched
+        result_entry = match_student_entry(student, context)
+        matched += 1
+        if results is not None:
+            results.append(result_entry)
+        await capacity.acquire()
+        task = asyncio.create_task(write(result_entry))
+        pending.add(task)
+        task.add_done_callback(pending.discard)
+
+    async def fill_names(table_id, unnamed):
+        names = await get_student_names_async(huoban_api, table_id, [s["student_id"] for s in unnamed])
+        for student in unnamed:
+            student["student_name"] = names.get(student["student_id"]) or f"学生ID: {student['student_id']}"
+            await submit(student)
+
+    async def process_table(table_id, table_type):
+        field_mappings = get_field_extractor(field_view, table_id, STUDENT_FIELD_MAPPING_NAMES, flatten=True)
+        unnamed = []
+        async for item in huoban_api.iter_table_items(table_id):
+            student = map_student_fields(item, field_mappings, table_type)
+            if not student:
+                continue
+            if student.get("student_name"):
+                await submit(student)
+                continue
+            # 列表数据中没有姓名的学生攒满一批后批量补全
+            unnamed.append(student)
+            if len(unnamed) >= DEFAULT_PAGE_SIZE:
+                await fill_names(table_id, unnamed)
+                unnamed = []
+        if unnamed:
+            await fill_names(table_id, unnamed)
+
+    await asyncio.gather(process_table(STUDENT_TABLE_1_ID, 1), process_table(STUDENT_TABLE_2_ID, 2))
+    while pending:
+        await asyncio.gather(*list(pending))
+    for item in failed:
+        logger.warning("学生 %s (ID: %s) 的匹配结果写入失败", item["student_name"], item["student_id"])
+    logger.info("已完成 %d 名学生的匹配 (新建 %d, 更新 %d, 未变化跳过 %d, 失败 %d)", matched,
+                write_counts[WRITE_CREATED], write_counts[WRITE_UPDATED],
+                write_counts[WRITE_SKIPPED], write_counts[WRITE_FAILED])
+    if summary_only:
+        return {
+            "students": matched,
+            "matched": matched,
+            "skipped": 0,
+            "writes": dict(write_counts),
+            "failed": failed,
+        }
+    return results
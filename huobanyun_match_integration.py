@@ -1,7 +1,28 @@
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import hashlib
 import json
+import logging
+import re
+import threading
 import time
-from Match_Algo import match_student
+from collections import Counter, defaultdict, deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from itertools import islice, tee
+from Match_Algo import (
+    MatchContext, get_match_rules, match_applicant, match_applicant_cached, match_result_cache, normalize_applicant,
+)
+from instrumentation import get_row_logger, metrics
+from rate_limit import RetryPolicy, TokenBucket, parse_retry_after
+from schema_cache import SchemaCache
+from sync_state import SyncState, matching_input_hash
+from table_schema import FieldExtractor, TableSchema
+from parallel_matching import parallel_map
+from records import InternationalSchool, Student, University
+
+logger = logging.getLogger(__name__)
+row_logger = get_row_logger(__name__)
 
 #API Configuration
 API_BASE_URL = "https://api.huoban.com/openapi/v1"
@@ -22,10 +43,103 @@ UNIVERSITY_TABLES = {
 INTERNATIONAL_SCHOOL_TABLE_ID = "2100000066695624"  # 国际学校表ID
 MATCH_RESULT_TABLE_ID = "2100000066645204"  # 存放匹配结果的表ID
 
+# 学生表字段名称映射 - 这些是实际的字段名称，将用于查询字段ID
+STUDENT_FIELD_MAPPING_NAMES = {
+    "student_name": "学生姓名",  # 添加学生姓名字段
+    "application_choice": "申请类型",
+    "academic_percentage": "学术成绩",
+    "gaokao_score": "高考成绩",
+    "ielts_score": "雅思成绩",
+    "toefl_score": "托福成绩",
+    "det_score": "DET成绩",
+    "language_pass": "通过语言测试",
+    "has_high_school_cert": "拥有高中毕业证书",
+    "has_international_school_experience": "有国际学校经验",
+    "budget_per_year": "年度预算"
+}
+
+# 匹配流程启动时需要读取的全部表格
+SYNC_TABLE_IDS = [
+    STUDENT_TABLE_1_ID,
+    STUDENT_TABLE_2_ID,
+    *UNIVERSITY_TABLES.values(),
+    INTERNATIONAL_SCHOOL_TABLE_ID,
+    MATCH_RESULT_TABLE_ID,
+]
+
+# HTTP连接配置
+DEFAULT_TIMEOUT = (5, 30)  # (连接超时, 读取超时)，单位:秒
+DEFAULT_POOL_SIZE = 10  # 连接池大小
+DEFAULT_CONNECT_RETRIES = 3  # 建立连接失败时的重试次数
+DEFAULT_PAGE_SIZE = 100  # 分页读取表格时每页的记录数
+DEFAULT_FETCH_CONCURRENCY = 4  # 并发读取表格时的最大线程数
+DEFAULT_RATE_LIMIT = 10  # 每个客户端每秒最多请求数 (令牌桶平均速率)
+DEFAULT_RATE_BURST = 10  # 令牌桶容量，允许的突发请求数
+DEFAULT_WRITE_CONCURRENCY = 8  # 并发写入匹配结果的最大请求数
+DEFAULT_WRITE_BATCH_SIZE = 50  # 写入缓冲区积累多少名学生后提交一批
+STUDENT_LOCK_STRIPES = 64  # 按学生姓名哈希分组的写入锁数量
+
+class HuobanyunAPIError(Exception):
+    """API请求失败，附带HTTP状态码、业务错误码、Retry-After 以及是否可重试"""
+
+    def __init__(self, message, status_code=None, code=None, retry_after=None, retryable=False):
+        super().__init__(message)
+        self.status_code = status_code
+        self.code = code
+        self.retry_after = retry_after
+        self.retryable = retryable
+
+def has_next_page(page, next_offset, page_size):
+    """
+    item/list 的一页之后是否还有下一页：响应中有 has_more 或 total 时以其为准
+    (服务端可能把 limit 限制得比 page_size 小，不满一页不代表读完)，二者都没有时不满一页即为最后一页。
+    """
+    items = page.get("items", [])
+    if not items:
+        return False
+    if page.get("has_more") is not None:
+        return bool(page["has_more"])
+    if page.get("total") is not None:
+        return next_offset < page["total"]
+    return len(items) >= page_size
+
+def _endpoint_name(url, base_url=API_BASE_URL):
+    """将请求URL归一化为端点名称 (去掉基础URL，ID替换为 {id})，用于指标标签"""
+    path = url[len(base_url):] if url.startswith(base_url) else url
+    return re.sub(r"/\d+", "/{id}", path).lstrip("/")
+
 class HuobanyunAPI:
-    def __init__(self, app_secret):
+    def __init__(self, app_secret, timeout=DEFAULT_TIMEOUT, pool_size=DEFAULT_POOL_SIZE,
+                 connect_retries=DEFAULT_CONNECT_RETRIES, rate_limit=DEFAULT_RATE_LIMIT,
+                 rate_burst=DEFAULT_RATE_BURST, retry_policy=None, schema_cache=None):
         self.app_secret = app_secret
         self.field_configurations = {}  # 缓存表格字段配置
+        self.table_schemas = {}  # 缓存 {表格ID: TableSchema}
+        # 可选的持久化字段配置缓存 (SchemaCache)，为None时每次运行都重新获取
+        self.schema_cache = schema_cache
+        # 本次运行中因字段未命中而重新获取过字段配置的表格，match_all_students 开始时清空
+        self.refreshed_schema_tables = set()
+        self.timeout = timeout
+        self.session = self.create_session(pool_size, connect_retries)
+        # 同一客户端的所有请求 (包括多线程) 共享一个令牌桶
+        self.rate_limiter = TokenBucket(rate_limit, rate_burst)
+        self.retry_policy = retry_policy or RetryPolicy()
+
+    def create_session(self, pool_size, connect_retries):
+        """创建复用连接的会话，所有表格、记录和字段配置请求共用同一个连接池"""
+        session = requests.Session()
+        # 只在建立连接失败时自动重试，已发出的请求不重复提交
+        retry = Retry(total=None, connect=connect_retries, read=0, status=0, other=0,
+                      backoff_factor=0.3, allowed_methods=None, raise_on_status=False)
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        session.headers.update(self.get_headers())
+        return session
+
+    def close(self):
+        """关闭会话并释放连接"""
+        self.session.close()
 
     def get_headers(self):
         """获取API请求头部"""
@@ -34,49 +148,85 @@ class HuobanyunAPI:
             "Content-Type": "application/json"
         }
 
-    def api_request(self, method, url, payload=None, debug=False):
-        """发送API请求"""
-        headers = self.get_headers()
+    def api_request(self, method, url, payload=None, debug=False, timeout=None, idempotent=True):
+        """
+        发送API请求，debug=True 时以 INFO 级别记录请求和响应，否则为逐条 DEBUG 日志。
+        timeout 为本次请求的 (连接超时, 读取超时)，默认使用客户端配置。
         
+        每次请求先从令牌桶取令牌；遇到限流、服务端暂时错误等可重试的失败时，
+        按 retry_policy 指数退避 (带抖动，优先遵循 Retry-After) 后重试。
+        idempotent 为False (创建记录) 时只在 retry_policy.can_resend 允许的响应上重试，避免重复创建。
+        """
         if payload is None:
             payload = {}
+        if timeout is None:
+            timeout = self.timeout
         
-        if debug:
-            print(f"请求: {method} {url}")
-            print(f"载荷: {json.dumps(payload)}")
+        request_logger, level = (logger, logging.INFO) if debug else (row_logger, logging.DEBUG)
+        endpoint = _endpoint_name(url)
+        
+        attempt = 0
+        while True:
+            self.rate_limiter.acquire()
+            try:
+                return self._send_request(method, url, payload, timeout, endpoint, request_logger, level)
+            except HuobanyunAPIError as e:
+                attempt += 1
+                if not e.retryable or attempt >= self.retry_policy.max_attempts:
+                    raise
+                if not idempotent and not self.retry_policy.can_resend(e.status_code, e.retry_after, e.code, str(e)):
+                    raise
+                delay = self.retry_policy.delay(attempt, e.retry_after)
+                if e.retry_after is not None:
+                    self.rate_limiter.pause(delay)
+                metrics.inc("api_retries_total", endpoint=endpoint)
+                logger.warning("%s，%.2f 秒后第 %d 次重试: %s %s", e, delay, attempt, method, url)
+                time.sleep(delay)
+
+    def _send_request(self, method, url, payload, timeout, endpoint, request_logger, level):
+        """发送一次请求，失败时抛出 HuobanyunAPIError"""
+        headers = self.get_headers()
+        metrics.inc("api_requests_total", method=method.upper(), endpoint=endpoint)
+        
+        if request_logger.isEnabledFor(level):
+            request_logger.log(level, "请求: %s %s", method, url)
+            request_logger.log(level, "载荷: %s", json.dumps(payload))
         
         try:
             if method.upper() == "GET":
-                response = requests.get(url, headers=headers, params=payload)
+                response = self.session.get(url, headers=headers, params=payload, timeout=timeout)
             elif method.upper() == "POST":
-                response = requests.post(url, headers=headers, json=payload)
+                response = self.session.post(url, headers=headers, json=payload, timeout=timeout)
             elif method.upper() == "PUT":
-                response = requests.put(url, headers=headers, json=payload)
+                response = self.session.put(url, headers=headers, json=payload, timeout=timeout)
             else:
                 raise ValueError(f"不支持的请求方法: {method}")
-            
-            if debug:
-                print(f"状态码: {response.status_code}")
-                print(f"响应: {response.text[:200]}{'...' if len(response.text) > 200 else ''}")
-            
-            if response.status_code == 200:
-                data = response.json()
-                if data.get("code") == 0:  # 确保业务逻辑成功
-                    return data.get("data", {})  # 直接返回 data 部分
-                else:
-                    error_msg = f"API业务逻辑错误: {data.get('message', 'Unknown error')}"
-                    if debug:
-                        print(f"错误: {error_msg}")
-                    raise Exception(error_msg)
-            else:
-                error_msg = f"API请求失败: {response.status_code} - {response.text}"
-                if debug:
-                    print(f"错误: {error_msg}")
-                raise Exception(error_msg)
         except requests.exceptions.RequestException as e:
-            if debug:
-                print(f"请求异常: {e}")
-            raise Exception(f"请求异常: {e}")
+            metrics.inc("api_errors_total", endpoint=endpoint, reason="connection")
+            request_logger.log(level, "请求异常: %s", e)
+            raise HuobanyunAPIError(f"请求异常: {e}")
+        
+        if request_logger.isEnabledFor(level):
+            request_logger.log(level, "状态码: %s", response.status_code)
+            request_logger.log(level, "响应: %s%s", response.text[:200], '...' if len(response.text) > 200 else '')
+        
+        retry_after = parse_retry_after(response.headers.get("Retry-After"))
+        if response.status_code == 200:
+            data = response.json()
+            if data.get("code") == 0:  # 确保业务逻辑成功
+                return data.get("data", {})  # 直接返回 data 部分
+            message = data.get('message', 'Unknown error')
+            error = HuobanyunAPIError(
+                f"API业务逻辑错误: {message}", status_code=200, code=data.get("code"), retry_after=retry_after,
+                retryable=self.retry_policy.is_retryable(business_code=data.get("code"), message=message))
+            metrics.inc("api_errors_total", endpoint=endpoint, reason="business")
+        else:
+            error = HuobanyunAPIError(
+                f"API请求失败: {response.status_code} - {response.text}", status_code=response.status_code,
+                retry_after=retry_after, retryable=self.retry_policy.is_retryable(status_code=response.status_code))
+            metrics.inc("api_errors_total", endpoint=endpoint, reason=str(response.status_code))
+        request_logger.log(level, "错误: %s", error)
+        raise error
     
     def get_table_list(self):
         """获取表格列表"""
@@ -94,30 +244,57 @@ class HuobanyunAPI:
     
     def get_field_configurations(self, table_id):
         try:
+            if table_id not in self.field_configurations and self.schema_cache is not None:
+                cached_fields = self.schema_cache.get(table_id)
+                if cached_fields is not None:
+                    logger.debug("表格 %s 使用缓存的字段配置", table_id)
+                    metrics.inc("schema_cache_total", result="hit")
+                    self.field_configurations[table_id] = cached_fields
+                else:
+                    metrics.inc("schema_cache_total", result="miss")
             if table_id not in self.field_configurations:
                 table_details = self.get_table_details(table_id)
-                # 打印完整结构以便调试
-                print(f"表格 {table_id} 详情结构:")
-                print(json.dumps(table_details, indent=2, ensure_ascii=False)[:500] + "...")
+                # 输出完整结构以便调试
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug("表格 %s 详情结构: %s...", table_id,
+                                 json.dumps(table_details, indent=2, ensure_ascii=False)[:500])
                 
                 # 字段应该在 table.fields 路径下
                 if "table" in table_details and "fields" in table_details["table"]:
                     self.field_configurations[table_id] = table_details["table"]["fields"]
-                    print(f"成功获取 {len(self.field_configurations[table_id])} 个字段")
+                    logger.info("表格 %s 成功获取 %d 个字段", table_id, len(self.field_configurations[table_id]))
+                    if self.schema_cache is not None:
+                        self.schema_cache.put(table_id, self.field_configurations[table_id])
                 else:
-                    print(f"警告:未在API响应中找到字段配置,返回路径: {list(table_details.keys())}")
+                    logger.warning("未在API响应中找到字段配置,返回路径: %s", list(table_details.keys()))
                     if "table" in table_details:
-                        print(f"table键包含: {list(table_details['table'].keys())}")
+                        logger.warning("table键包含: %s", list(table_details['table'].keys()))
                     self.field_configurations[table_id] = []
             return self.field_configurations[table_id]
         except Exception as e:
-            print(f"获取字段配置时发生错误 (表格ID: {table_id}): {e}")
-            import traceback
-            traceback.print_exc()
+            logger.exception("获取字段配置时发生错误 (表格ID: %s): %s", table_id, e)
             return []
+
+    def get_table_schema(self, table_id):
+        """获取表格的字段结构 (TableSchema)，每个表格只构建一次"""
+        if table_id not in self.table_schemas:
+            self.table_schemas[table_id] = TableSchema(table_id, self.get_field_configurations(table_id))
+        return self.table_schemas[table_id]
+
+    def get_field_name_index(self, table_id):
+        """获取表格的 {字段名称: 字段ID}"""
+        return self.get_table_schema(table_id).field_ids
+
+    def refresh_field_configurations(self, table_id):
+        """丢弃内存和持久化缓存中的字段配置并重新获取，用于字段查找未命中 (表格结构可能已修改) 的情况"""
+        self.field_configurations.pop(table_id, None)
+        self.table_schemas.pop(table_id, None)
+        if self.schema_cache is not None:
+            self.schema_cache.invalidate(table_id)
+        return self.get_field_configurations(table_id)
     
-    def get_table_items(self, table_id, limit=None, filter_conditions=None):
-        """获取表格中的项目"""
+    def get_table_items(self, table_id, limit=None, filter_conditions=None, offset=None):
+        """获取表格中的项目 (单页)"""
         url = f"{API_BASE_URL}/item/list"
         payload = {
             "table_id": table_id
@@ -126,6 +303,8 @@ class HuobanyunAPI:
         # 添加分页限制
         if limit is not None:
             payload["limit"] = limit
+        if offset is not None:
+            payload["offset"] = offset
         
         # 添加过滤条件
         if filter_conditions is not None:
@@ -133,6 +312,22 @@ class HuobanyunAPI:
         
         return self.api_request("POST", url, payload)
 
+    def iter_table_items(self, table_id, page_size=DEFAULT_PAGE_SIZE, filter_conditions=None):
+        """
+        逐页读取表格直到读完，按需逐条返回项目，不会一次性把所有页加载到内存。
+        
+        以 offset 翻页；响应中有 has_more 或 total 时据此判断结束，否则读到不满一页为止 (见 has_next_page)。
+        """
+        offset = 0
+        while True:
+            page = self.get_table_items(table_id, limit=page_size, filter_conditions=filter_conditions, offset=offset)
+            items = page.get("items", [])
+            yield from items
+            
+            offset += len(items)
+            if not has_next_page(page, offset, page_size):
+                return
+
     def get_item_details(self, item_id):
         """获取单个项目详情"""
         url = f"{API_BASE_URL}/item/{item_id}"
@@ -145,14 +340,13 @@ class HuobanyunAPI:
             "table_id": table_id,
             "fields": fields
         }
-        # 启用调试输出来查看请求和响应细节
-        result = self.api_request("POST", url, payload, debug=True)
+        result = self.api_request("POST", url, payload, idempotent=False)
         # 检查返回结果是否成功
         if result and "item" in result and "item_id" in result["item"]:
-            print(f"创建成功, 记录ID: {result['item']['item_id']}")
+            row_logger.debug("创建成功, 记录ID: %s", result['item']['item_id'])
             return result["item"]
         else:
-            print(f"创建记录返回异常结构: {result}")
+            logger.warning("创建记录返回异常结构: %s", result)
             return None
 
     def update_item(self, item_id, fields):
@@ -161,143 +355,186 @@ class HuobanyunAPI:
         payload = {
             "fields": fields
         }
-        # 启用调试输出来查看请求和响应细节
-        result = self.api_request("PUT", url, payload, debug=True)
+        result = self.api_request("PUT", url, payload)
         if result and "item" in result:
-            print(f"更新成功, 记录ID: {item_id}")
+            row_logger.debug("更新成功, 记录ID: %s", item_id)
             return result["item"]
         else:
-            print(f"更新记录返回异常结构: {result}")
+            logger.warning("更新记录返回异常结构: %s", result)
             return None
 
+class TableFetchScheduler:
+    """
+    通过有界线程池并发读取多个互不依赖的表格。
+    
+    每个表格先读第一页；响应给出 total 时其余各页按 offset 同时提交 (步长为第一页实际返回的记录数，
+    服务端限制了每页数量时也不会漏读)，否则只能逐页顺序提交。所有任务都由调用线程调度，线程池内不会互相等待。
+    """
+
+    def __init__(self, huoban_api, max_workers=DEFAULT_FETCH_CONCURRENCY, page_size=DEFAULT_PAGE_SIZE):
+        self.huoban_api = huoban_api
+        self.max_workers = max_workers
+        self.page_size = page_size
+
+    def fetch(self, table_ids, with_field_configurations=True):
+        """并发读取表格，返回 {table_id: 按原顺序排列的项目列表}"""
+        pages = {table_id: {} for table_id in table_ids}
+        pending = {}
+        
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            def submit_page(table_id, offset):
+                future = executor.submit(self.huoban_api.get_table_items, table_id,
+                                         limit=self.page_size, offset=offset)
+                pending[future] = (table_id, offset)
+            
+            # 字段配置同样按表读取，顺带预热缓存
+            config_futures = []
+            if with_field_configurations:
+                config_futures = [executor.submit(self.huoban_api.get_field_configurations, table_id)
+                                  for table_id in table_ids]
+            
+            for table_id in table_ids:
+                submit_page(table_id, 0)
+            
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    table_id, offset = pending.pop(future)
+                    page = future.result()
+                    items = page.get("items", [])
+                    pages[table_id][offset] = items
+                    
+                    total = page.get("total")
+                    if total is None:
+                        # 总数未知，只能顺序翻页
+                        if has_next_page(page, offset + len(items), self.page_size):
+                            submit_page(table_id, offset + len(items))
+                    elif offset == 0 and items:
+                        for next_offset in range(len(items), total, len(items)):
+                            submit_page(table_id, next_offset)
+            
+            for future in config_futures:
+                future.result()
+        
+        return {
+            table_id: [item for offset in sorted(table_pages) for item in table_pages[offset]]
+            for table_id, table_pages in pages.items()
+        }
+
+
+def updated_since_filter(updated_on):
+    """item/list 的过滤条件：只返回 updated_on 不早于给定时间的记录"""
+    return {"and": [{"field": "updated_on", "query": {"gte": updated_on}}]}
+
+def _table_items(huoban_api, table_id, prefetched=None):
+    """优先使用已预读的表格数据，否则逐页读取"""
+    if prefetched is not None and table_id in prefetched:
+        return prefetched[table_id]
+    return huoban_api.iter_table_items(table_id)
+
+def load_table_schema(huoban_api, table_id, field_mapping_names=None):
+    """
+    获取表格的字段结构；field_mapping_names 中有表格里找不到的字段时，
+    缓存的字段配置可能已过时，每个表格每次运行最多重新获取一次 (记录在 huoban_api.refreshed_schema_tables)。
+    """
+    schema = huoban_api.get_table_schema(table_id)
+    missing = schema.missing(field_mapping_names) if field_mapping_names else []
+    if missing and table_id not in huoban_api.refreshed_schema_tables:
+        logger.info("表格 %s 未找到字段 %s，重新获取字段配置", table_id, missing)
+        huoban_api.refreshed_schema_tables.add(table_id)
+        huoban_api.refresh_field_configurations(table_id)
+        schema = huoban_api.get_table_schema(table_id)
+    return schema
+
 def get_field_mappings(huoban_api, table_id, field_mapping_names):
     """根据字段名称获取对应的字段ID"""
     try:
-        field_configs = huoban_api.get_field_configurations(table_id)
-        field_mappings = {}
-        
-        # 遍历所有字段配置
-        for field in field_configs:
-            field_name = field.get("name", "")
-            field_id = field.get("field_id", "")
-            
-            # 如果这个字段名在我们需要映射的列表中
-            if field_name in field_mapping_names.values():
-                # 找到对应的key
-                for key, value in field_mapping_names.items():
-                    if value == field_name:
-                        field_mappings[key] = field_id
-                        break
-        
-        return field_mappings
+        return load_table_schema(huoban_api, table_id, field_mapping_names).mappings(field_mapping_names)
     except Exception as e:
-        print(f"获取字段映射时发生错误 (表格ID: {table_id}): {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("获取字段映射时发生错误 (表格ID: %s): %s", table_id, e)
         return {}
 
-def get_all_students(huoban_api):
-    """从两个学生表中获取所有学生数据"""
-    students = []
+def get_field_extractor(huoban_api, table_id, field_mapping_names, flatten=False):
+    """为表格编译字段提取器 (FieldExtractor)，获取字段结构失败时返回空提取器"""
+    try:
+        return load_table_schema(huoban_api, table_id, field_mapping_names).extractor(field_mapping_names, flatten)
+    except Exception as e:
+        logger.exception("获取字段映射时发生错误 (表格ID: %s): %s", table_id, e)
+        return FieldExtractor({})
+
+def get_all_students(huoban_api, prefetched=None):
+    """从两个学生表中获取所有学生数据，prefetched 为 TableFetchScheduler 预读的表格数据"""
+    table_items = {table_id: _table_items(huoban_api, table_id, prefetched)
+                   for table_id in (STUDENT_TABLE_1_ID, STUDENT_TABLE_2_ID)}
+    return list(iter_students(huoban_api, table_items, name_batch_size=None))
+
+def iter_students(huoban_api, table_items, name_batch_size=DEFAULT_PAGE_SIZE):
+    """
+    逐个返回两个学生表中的学生 (map_student_fields 的结果)。
     
+    table_items 为 {表格ID: 记录的可迭代对象}，可以是按页读取的生成器；
+    列表数据中没有姓名的学生每 name_batch_size 名批量补全一次，为None时全部读完后补全。
+    """
     # 字段名称映射 - 这些是实际的字段名称，将用于查询字段ID
-    field_mapping_names = {
-        "student_name": "学生姓名",  # 添加学生姓名字段
-        "application_choice": "申请类型",
-        "academic_percentage": "学术成绩",
-        "gaokao_score": "高考成绩",
-        "ielts_score": "雅思成绩",
-        "toefl_score": "托福成绩",
-        "det_score": "DET成绩",
-        "language_pass": "通过语言测试",
-        "has_high_school_cert": "拥有高中毕业证书",
-        "has_international_school_experience": "有国际学校经验",
-        "budget_per_year": "年度预算"
-    }
-    
-    # 获取第一个表的字段ID映射
-    field_mappings_table1 = get_field_mappings(huoban_api, STUDENT_TABLE_1_ID, field_mapping_names)
-    
-    # 获取第二个表的字段ID映射
-    field_mappings_table2 = get_field_mappings(huoban_api, STUDENT_TABLE_2_ID, field_mapping_names)
+    field_mapping_names = STUDENT_FIELD_MAPPING_NAMES
     
-    # 从第一个学生表获取数据
-    table1_response = huoban_api.get_table_items(STUDENT_TABLE_1_ID)
-    table1_items = table1_response.get("items", [])
-    for item in table1_items:
-        student = map_student_fields(item, field_mappings_table1, table_type=1)
-        if student:  # 确保所有必需字段都已提供
-            students.append(student)
+    def mapped_students():
+        for table_type, table_id in enumerate((STUDENT_TABLE_1_ID, STUDENT_TABLE_2_ID), start=1):
+            field_extractor = get_field_extractor(huoban_api, table_id, field_mapping_names, flatten=True)
+            for item in table_items.get(table_id, ()):
+                student = map_student_fields(item, field_extractor, table_type=table_type)
+                if student:  # 确保所有必需字段都已提供
+                    yield student
     
-    # 从第二个学生表获取数据
-    table2_response = huoban_api.get_table_items(STUDENT_TABLE_2_ID)
-    table2_items = table2_response.get("items", [])
-    for item in table2_items:
-        student = map_student_fields(item, field_mappings_table2, table_type=2)
-        if student:  # 确保所有必需字段都已提供
-            students.append(student)
-    
-    return students
+    # 姓名通常已在列表数据中，缺失的批量补全
+    students = mapped_students()
+    while True:
+        batch = list(islice(students, name_batch_size))
+        if not batch:
+            return
+        yield from fill_missing_student_names(huoban_api, batch)
 
 def map_student_fields(item, field_mappings, table_type):
-    """从原始数据项映射学生字段"""
-    data = {}
+    """从原始数据项映射学生字段，返回 Student；field_mappings 为 FieldExtractor 或 {键: 字段ID}"""
     fields = item.get("fields", {})
+    if not isinstance(field_mappings, FieldExtractor):
+        field_mappings = FieldExtractor(field_mappings, flatten=True)
     
     try:
-        print(f"处理学生记录: {item.get('item_id')}")
-        print(f"字段映射: {field_mappings}")
-        print(f"可用字段: {list(fields.keys())}")
+        row_logger.debug("处理学生记录: %s", item.get('item_id'))
+        row_logger.debug("字段映射: %s", field_mappings.field_mappings)
+        row_logger.debug("可用字段: %s", list(fields.keys()))
         
-        # 映射基本字段
-        for key, field_id in field_mappings.items():
-            if field_id in fields:
-                field_value = fields[field_id]
-                
-                print(f"找到字段 '{key}' (ID: {field_id}) 值类型: {type(field_value)}")
-                
-                # 特殊处理选择类型字段
-                if isinstance(field_value, dict) and "text" in field_value:
-                    # 选择字段通常会包含 text 属性
-                    data[key] = field_value["text"]
-                    print(f"  处理选择字段: {field_value} -> {data[key]}")
-                elif isinstance(field_value, list) and len(field_value) > 0 and isinstance(field_value[0], dict):
-                    # 多选字段通常是字典列表
-                    names = [item.get("name", "") for item in field_value if "name" in item]
-                    data[key] = ", ".join(names) if names else ""
-                    print(f"  处理多选字段: {field_value} -> {data[key]}")
-                else:
-                    data[key] = field_value
+        # 映射基本字段，选择字段取 text、多选字段取各项名称
+        data = field_mappings(fields, Student())
         
         # 确保必需字段存在
         required_fields = ["application_choice", "academic_percentage"]
         missing_fields = [field for field in required_fields if field not in data or not data[field]]
         if missing_fields:
-            print(f"学生记录缺少必需字段: {', '.join(missing_fields)}")
+            row_logger.debug("学生记录缺少必需字段: %s", ', '.join(missing_fields))
             # 不直接返回None，而是将必需字段设置为默认值
             for field in missing_fields:
                 if field == "application_choice":
                     data[field] = "本科"  # 默认为本科
                 elif field == "academic_percentage":
                     data[field] = "60"    # 默认为60%
-                print(f"为缺失字段 {field} 设置默认值: {data[field]}")
+                row_logger.debug("为缺失字段 %s 设置默认值: %s", field, data[field])
         
         # 添加学生ID以便之后更新匹配结果
         data["student_id"] = item.get("item_id")
         data["table_id"] = STUDENT_TABLE_1_ID if table_type == 1 else STUDENT_TABLE_2_ID
         
         # 输出最终映射结果
-        print(f"最终映射结果: {data}")
+        row_logger.debug("最终映射结果: %s", data)
         return data
         
     except Exception as e:
-        print(f"映射学生字段时出错: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("映射学生字段时出错: %s", e)
         return None
 
-def get_university_data(huoban_api):
-    """从三个不同的大学表获取大学数据"""
+def get_university_data(huoban_api, prefetched=None):
+    """从三个不同的大学表获取大学数据，prefetched 为 TableFetchScheduler 预读的表格数据"""
     university_data = {
         "private": [],
         "public_graduate": [],
@@ -314,9 +551,8 @@ def get_university_data(huoban_api):
     
     # 获取私立大学数据
     private_table_id = UNIVERSITY_TABLES["private"]
-    private_field_mappings = get_field_mappings(huoban_api, private_table_id, university_field_mapping)
-    private_universities = huoban_api.get_table_items(private_table_id)
-    for uni in private_universities.get("items", []):
+    private_field_mappings = get_field_extractor(huoban_api, private_table_id, university_field_mapping)
+    for uni in _table_items(huoban_api, private_table_id, prefetched):
         uni_data = map_university_fields(uni, private_field_mappings)
         if uni_data:
             uni_data["type"] = "private"
@@ -324,9 +560,8 @@ def get_university_data(huoban_api):
     
     # 获取公立大学硕博数据
     grad_table_id = UNIVERSITY_TABLES["public_graduate"]
-    grad_field_mappings = get_field_mappings(huoban_api, grad_table_id, university_field_mapping)
-    grad_universities = huoban_api.get_table_items(grad_table_id)
-    for uni in grad_universities.get("items", []):
+    grad_field_mappings = get_field_extractor(huoban_api, grad_table_id, university_field_mapping)
+    for uni in _table_items(huoban_api, grad_table_id, prefetched):
         uni_data = map_university_fields(uni, grad_field_mappings)
         if uni_data:
             uni_data["type"] = "public_graduate"
@@ -334,9 +569,8 @@ def get_university_data(huoban_api):
     
     # 获取公立大学本科数据
     undergrad_table_id = UNIVERSITY_TABLES["public_undergrad"]
-    undergrad_field_mappings = get_field_mappings(huoban_api, undergrad_table_id, university_field_mapping)
-    undergrad_universities = huoban_api.get_table_items(undergrad_table_id)
-    for uni in undergrad_universities.get("items", []):
+    undergrad_field_mappings = get_field_extractor(huoban_api, undergrad_table_id, university_field_mapping)
+    for uni in _table_items(huoban_api, undergrad_table_id, prefetched):
         uni_data = map_university_fields(uni, undergrad_field_mappings)
         if uni_data:
             uni_data["type"] = "public_undergrad"
@@ -345,15 +579,13 @@ def get_university_data(huoban_api):
     return university_data
 
 def map_university_fields(item, field_mappings):
-    """从原始数据项映射大学字段"""
-    data = {}
-    fields = item.get("fields", {})
+    """从原始数据项映射大学字段，返回 University；field_mappings 为 FieldExtractor 或 {键: 字段ID}"""
+    if not isinstance(field_mappings, FieldExtractor):
+        field_mappings = FieldExtractor(field_mappings)
     
     try:
         # 映射基本字段
-        for key, field_id in field_mappings.items():
-            if field_id in fields:
-                data[key] = fields[field_id]
+        data = field_mappings(item.get("fields", {}), University())
         
         # 添加大学ID以便需要时引用
         data["university_id"] = item.get("item_id")
@@ -361,11 +593,11 @@ def map_university_fields(item, field_mappings):
         return data
         
     except Exception as e:
-        print(f"映射大学字段时出错: {e}")
+        logger.error("映射大学字段时出错: %s", e)
         return None
     
-def get_international_school_data(huoban_api):
-    """从国际学校表获取学校数据"""
+def get_international_school_data(huoban_api, prefetched=None):
+    """从国际学校表获取学校数据，prefetched 为 TableFetchScheduler 预读的表格数据"""
     schools = []
     
     # 为国际学校表定义字段映射
@@ -381,33 +613,30 @@ def get_international_school_data(huoban_api):
         # 根据表格后续可以添加更多字段
     }
     
-    # 获取国际学校表的字段ID映射
-    field_mappings = get_field_mappings(huoban_api, INTERNATIONAL_SCHOOL_TABLE_ID, school_field_mapping)
+    # 获取国际学校表的字段提取器
+    field_mappings = get_field_extractor(huoban_api, INTERNATIONAL_SCHOOL_TABLE_ID, school_field_mapping)
     
     # 获取国际学校数据
-    schools_response = huoban_api.get_table_items(INTERNATIONAL_SCHOOL_TABLE_ID)
-    for school in schools_response.get("items", []):
+    for school in _table_items(huoban_api, INTERNATIONAL_SCHOOL_TABLE_ID, prefetched):
         school_data = map_intl_school_fields(school, field_mappings)
         if school_data:  # 确保数据有效
             schools.append(school_data)
     
-    print(f"从国际学校表获取了 {len(schools)} 所学校")
+    logger.info("从国际学校表获取了 %d 所学校", len(schools))
     return schools
 
 def map_intl_school_fields(item, field_mappings):
-    """从原始数据项映射国际学校字段"""
-    data = {}
-    fields = item.get("fields", {})
+    """从原始数据项映射国际学校字段，返回 InternationalSchool；field_mappings 为 FieldExtractor 或 {键: 字段ID}"""
+    if not isinstance(field_mappings, FieldExtractor):
+        field_mappings = FieldExtractor(field_mappings)
     
     try:
         # 映射基本字段
-        for key, field_id in field_mappings.items():
-            if field_id in fields:
-                data[key] = fields[field_id]
+        data = field_mappings(item.get("fields", {}), InternationalSchool())
         
         # 确保学校名称存在
         if "name" not in data or not data["name"]:
-            print("国际学校记录缺少必要的学校名称")
+            row_logger.debug("国际学校记录缺少必要的学校名称")
             return None
         
         # 添加学校ID以便需要时引用
@@ -418,118 +647,125 @@ def map_intl_school_fields(item, field_mappings):
             try:
                 data["tuition_fees"] = float(data["tuition_fees"])
             except ValueError:
-                print(f"警告：学校 '{data.get('name')}' 的学费无法转换为数字")
+                metrics.inc("parse_failures_total", field="学费")
+                row_logger.debug("学校 '%s' 的学费无法转换为数字", data.get('name'))
         
         return data
         
     except Exception as e:
-        print(f"映射国际学校字段时出错: {e}")
+        logger.error("映射国际学校字段时出错: %s", e)
         return None
     
 def get_student_name(huoban_api, student_id, table_id):
-    """获取学生姓名"""
+    """获取单个学生的姓名 (批量补全请使用 fill_missing_student_names)"""
     try:
         # 获取学生记录详情
         student_item = huoban_api.get_item_details(student_id)
         if not student_item:
-            print(f"无法获取学生ID为 {student_id} 的详情")
+            logger.warning("无法获取学生ID为 %s 的详情", student_id)
             return None
         
-        # 获取表格字段配置
-        fields = huoban_api.get_field_configurations(table_id)
-        name_field = next((f for f in fields if f.get("name") == "学生姓名"), None)
-        
-        if not name_field:
-            print(f"表格 {table_id} 中没有找到学生姓名字段")
+        name_field_id = huoban_api.get_field_name_index(table_id).get("学生姓名")
+        if not name_field_id:
+            logger.warning("表格 %s 中没有找到学生姓名字段", table_id)
             return None
         
-        name_field_id = name_field.get("field_id")
-        if not name_field_id or name_field_id not in student_item.get("fields", {}):
-            print(f"学生记录中没有姓名字段 {name_field_id}")
+        if name_field_id not in student_item.get("fields", {}):
+            row_logger.debug("学生记录中没有姓名字段 %s", name_field_id)
             return None
         
         student_name = student_item["fields"][name_field_id]
-        print(f"成功获取学生姓名: {student_name}")
+        row_logger.debug("成功获取学生姓名: %s", student_name)
         return student_name
         
     except Exception as e:
-        print(f"获取学生姓名时出错: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("获取学生姓名时出错: %s", e)
         return None
 
-def get_all_existing_matches(huoban_api):
-    """获取匹配结果表中已有的所有匹配记录"""
+def item_ids_filter(item_ids):
+    """item/list 的过滤条件：只返回指定记录ID的记录"""
+    return {"and": [{"field": "item_id", "query": {"in": list(item_ids)}}]}
+
+def get_student_names(huoban_api, table_id, student_ids, batch_size=DEFAULT_PAGE_SIZE):
+    """按记录ID批量获取学生姓名，每 batch_size 个ID一次 item/list 请求，返回 {学生ID: 姓名}"""
+    names = {}
+    name_field_id = huoban_api.get_field_name_index(table_id).get("学生姓名")
+    if not name_field_id:
+        logger.warning("表格 %s 中没有找到学生姓名字段", table_id)
+        return names
+    
+    student_ids = list(student_ids)
+    try:
+        for start in range(0, len(student_ids), batch_size):
+            chunk = student_ids[start:start + batch_size]
+            for item in huoban_api.iter_table_items(table_id, page_size=batch_size,
+                                                    filter_conditions=item_ids_filter(chunk)):
+                student_name = item.get("fields", {}).get(name_field_id)
+                if student_name:
+                    names[item["item_id"]] = student_name
+    except Exception as e:
+        logger.exception("批量获取学生姓名时出错 (表格ID: %s): %s", table_id, e)
+    return names
+
+def fill_missing_student_names(huoban_api, students):
+    """
+    为列表数据中没有姓名的学生补全姓名：每个表格只批量请求一次，
+    仍无法获取的使用 "学生ID: x" 作为替代。
+    """
+    missing = defaultdict(list)
+    for student in students:
+        if not student.get("student_name"):
+            missing[student["table_id"]].append(student["student_id"])
+    
+    names = {}
+    for table_id, student_ids in missing.items():
+        logger.info("表格 %s 中 %d 名学生的列表数据没有姓名，批量获取", table_id, len(student_ids))
+        names.update(get_student_names(huoban_api, table_id, student_ids))
+    
+    for student in students:
+        if not student.get("student_name"):
+            student_name = names.get(student["student_id"])
+            if not student_name:
+                logger.warning("无法获取学生ID为 %s 的姓名", student['student_id'])
+                student_name = f"学生ID: {student['student_id']}"
+            student["student_name"] = student_name
+    return students
+
+def get_all_existing_matches(huoban_api, prefetched=None):
+    """
+    获取匹配结果表中已有的所有匹配记录，prefetched 为 TableFetchScheduler 预读的表格数据。
+    
+    返回 {学生姓名: {"item_id": 记录ID, "fields": 当前字段值}}
+    """
     try:
         # 获取字段映射
         field_mapping_names = {"student_name": "学生姓名"}
         field_mappings = get_field_mappings(huoban_api, MATCH_RESULT_TABLE_ID, field_mapping_names)
         
         if "student_name" not in field_mappings:
-            print("错误: 无法在匹配结果表中找到学生姓名字段")
+            logger.error("无法在匹配结果表中找到学生姓名字段")
             return {}
         
         student_name_field_id = field_mappings["student_name"]
         
-        # 获取所有匹配结果
-        results = huoban_api.get_table_items(MATCH_RESULT_TABLE_ID, limit=100)  # 设置一个较大的限制以获取所有记录
+        # 逐页获取所有匹配结果，保留当前字段值以便写入前比较
         existing_matches = {}
         
-        for item in results.get("items", []):
+        for item in _table_items(huoban_api, MATCH_RESULT_TABLE_ID, prefetched):
             if student_name_field_id in item.get("fields", {}):
                 student_name = item["fields"][student_name_field_id]
                 if student_name:  # 确保学生姓名不为空
-                    existing_matches[student_name] = item["item_id"]
+                    existing_matches[student_name] = {"item_id": item["item_id"], "fields": item["fields"]}
         
-        print(f"已从匹配结果表中获取 {len(existing_matches)} 条现有记录")
+        logger.info("已从匹配结果表中获取 %d 条现有记录", len(existing_matches))
         return existing_matches
     
     except Exception as e:
-        print(f"获取现有匹配记录时发生错误: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("获取现有匹配记录时发生错误: %s", e)
         return {}
 
-def update_match_result(huoban_api, result_entry, existing_matches):
-    """检查是否已存在匹配结果，如果存在则更新，否则创建新记录"""
-    # 提取匹配结果和学生信息
-    match_result = result_entry["match_result"]
-    student_id = result_entry["student_id"]
-    student_name = result_entry.get("student_name")  # 直接从传入的结果条目获取学生姓名
-    
-    print(f"\n=== 更新匹配结果 ===")
-    print(f"学生ID: {student_id}")
-    print(f"学生姓名: {student_name}")
-    print(f"匹配结果: {match_result}")
-    
-    # 如果没有提供学生姓名，尝试获取
-    if not student_name:
-        student_name = get_student_name(huoban_api, student_id, result_entry["student_table_id"])
-        print(f"通过API获取到的学生姓名: {student_name}")
-    
-    # 如果学生姓名仍为空，则使用学生ID作为标识符
-    if not student_name:
-        student_name = f"学生ID: {student_id}"
-        print(f"无法获取学生姓名，使用ID作为替代: {student_name}")
-    
-    # 修改为匹配实际表格的字段名
-    field_mapping_names = {
-        "student_name": "学生姓名",  # 对应学生姓名字段
-        "matched_schools": "配对学校名称"  # 对应配对学校名称字段
-    }
-    
-    # 获取结果表的字段配置
-    field_mappings = get_field_mappings(huoban_api, MATCH_RESULT_TABLE_ID, field_mapping_names)
-    print(f"字段映射结果: {field_mappings}")
-    
-    # 准备要保存的数据
-    fields = {}
-    
-    # 添加学生姓名
-    if "student_name" in field_mappings and student_name:
-        fields[field_mappings["student_name"]] = student_name
-    
-    # 提取匹配结果并合并到一个字段中
+def format_match_text(match_result):
+    """将匹配结果合并为写入"配对学校名称"字段的文本"""
     matched_schools = []
     
     # 如果有匹配大学，添加到学校列表
@@ -542,169 +778,393 @@ def update_match_result(huoban_api, result_entry, existing_matches):
             else:
                 matched_schools.append(f"大学匹配: {', '.join(universities)}")
     
+    # 按院校目录的入学要求和预算匹配到的大学
+    catalog_universities = match_result.get("catalog_universities")
+    if catalog_universities:
+        matched_schools.append(f"目录匹配大学: {', '.join(catalog_universities)}")
+    
     # 如果有匹配国际学校，添加到学校列表
     if "matched_international_schools" in match_result:
         schools = match_result["matched_international_schools"]
         if schools:  # 确保不是空列表
             matched_schools.append(f"国际学校匹配: {', '.join(schools)}")
     
+    # 按国际学校目录的学费和学术要求匹配到的学校
+    catalog_schools = match_result.get("catalog_international_schools")
+    if catalog_schools:
+        matched_schools.append(f"目录匹配国际学校: {', '.join(catalog_schools)}")
+    
     # 将所有匹配结果合并为一个字符串
     if matched_schools:
-        match_text = "\n".join(matched_schools)
-    else:
-        match_text = "未找到匹配结果"
+        return "\n".join(matched_schools)
+    return "未找到匹配结果"
+
+def build_match_result_fields(huoban_api, student_name, match_result):
+    """根据匹配结果表的字段配置，构造要写入的字段 {field_id: 值}"""
+    # 修改为匹配实际表格的字段名
+    field_mapping_names = {
+        "student_name": "学生姓名",  # 对应学生姓名字段
+        "matched_schools": "配对学校名称"  # 对应配对学校名称字段
+    }
+    
+    # 结果表的字段结构每次运行只构建一次，所有学生共用
+    schema = load_table_schema(huoban_api, MATCH_RESULT_TABLE_ID, field_mapping_names)
+    field_mappings = schema.mappings(field_mapping_names)
+    row_logger.debug("字段映射结果: %s", field_mappings)
+    
+    # 准备要保存的数据
+    fields = {}
+    
+    # 添加学生姓名
+    if "student_name" in field_mappings and student_name:
+        fields[field_mappings["student_name"]] = student_name
     
     # 添加匹配结果到配对学校名称字段
     if "matched_schools" in field_mappings:
-        fields[field_mappings["matched_schools"]] = match_text
+        fields[field_mappings["matched_schools"]] = format_match_text(match_result)
     
-    print(f"要保存的字段: {fields}")
+    row_logger.debug("要保存的字段: %s", fields)
     
     # 如果没有任何字段匹配，添加默认字段避免API错误
     if not fields:
-        print("警告: 没有任何字段匹配，添加学生姓名作为默认字段")
+        logger.warning("没有任何字段匹配，添加学生姓名作为默认字段")
         # 获取学生姓名字段ID
-        field_configs = huoban_api.get_field_configurations(MATCH_RESULT_TABLE_ID)
-        for field in field_configs:
-            if field.get("name") == "学生姓名":
-                fields[field.get("field_id")] = student_name or "未知学生"
-                break
+        name_field_id = schema.field_id("学生姓名")
+        if name_field_id is not None:
+            fields[name_field_id] = student_name or "未知学生"
+    
+    return fields
+
+# update_match_result 的返回状态
+WRITE_CREATED = "created"
+WRITE_UPDATED = "updated"
+WRITE_SKIPPED = "skipped"  # 结果表中的内容与要写入的相同
+WRITE_FAILED = "failed"
+
+def match_result_content_hash(fields):
+    """要写入的字段 {field_id: 值} 的内容哈希"""
+    payload = json.dumps(fields, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+def match_result_unchanged(existing_match, fields):
+    """现有记录中这些字段的值是否与要写入的完全相同"""
+    current = existing_match.get("fields", {})
+    return match_result_content_hash({key: current.get(key) for key in fields}) == match_result_content_hash(fields)
+
+def update_match_result(huoban_api, result_entry, existing_matches):
+    """
+    检查是否已存在匹配结果，如果存在则更新，否则创建新记录。
+    
+    现有记录内容与要写入的相同时不发送请求；返回 WRITE_CREATED/WRITE_UPDATED/WRITE_SKIPPED/WRITE_FAILED。
+    """
+    # 提取匹配结果和学生信息
+    match_result = result_entry["match_result"]
+    student_id = result_entry["student_id"]
+    student_name = result_entry.get("student_name")  # 直接从传入的结果条目获取学生姓名
+    
+    row_logger.debug("更新匹配结果: 学生ID=%s, 学生姓名=%s, 匹配结果=%s", student_id, student_name, match_result)
+    
+    # 如果没有提供学生姓名，尝试获取
+    if not student_name:
+        student_name = get_student_name(huoban_api, student_id, result_entry["student_table_id"])
+        row_logger.debug("通过API获取到的学生姓名: %s", student_name)
+    
+    # 如果学生姓名仍为空，则使用学生ID作为标识符
+    if not student_name:
+        student_name = f"学生ID: {student_id}"
+        row_logger.debug("无法获取学生姓名，使用ID作为替代: %s", student_name)
+    
+    fields = build_match_result_fields(huoban_api, student_name, match_result)
     
     # 从预先加载的匹配记录中查找是否已存在该学生
-    existing_item_id = None
-    if student_name in existing_matches:
-        existing_item_id = existing_matches[student_name]
-        print(f"在预加载数据中找到现有记录 (ID: {existing_item_id})")
+    existing_match = existing_matches.get(student_name)
+    if existing_match:
+        row_logger.debug("在预加载数据中找到现有记录 (ID: %s)", existing_match["item_id"])
+        if match_result_unchanged(existing_match, fields):
+            row_logger.debug("学生 %s 的匹配结果未变化，跳过写入", student_name)
+            return WRITE_SKIPPED
     
     try:
-        if existing_item_id:
+        if existing_match:
             # 如果存在，则更新记录
-            print(f"更新现有记录 {existing_item_id}")
-            result = huoban_api.update_item(existing_item_id, fields)
-            if result:
-                print(f"已更新学生 {student_name} 的匹配结果")
-        else:
-            # 如果不存在，则创建新记录
-            print(f"创建新记录")
-            result = huoban_api.create_item(MATCH_RESULT_TABLE_ID, fields)
-            if result:
-                print(f"已为学生 {student_name} 创建新的匹配结果")
-                # 将新创建的记录加入到现有匹配记录字典中
-                if "item_id" in result:
-                    existing_matches[student_name] = result["item_id"]
+            row_logger.debug("更新现有记录 %s", existing_match["item_id"])
+            result = huoban_api.update_item(existing_match["item_id"], fields)
+            if not result:
+                return WRITE_FAILED
+            row_logger.debug("已更新学生 %s 的匹配结果", student_name)
+            existing_match["fields"] = {**existing_match.get("fields", {}), **fields}
+            return WRITE_UPDATED
+        
+        # 如果不存在，则创建新记录
+        row_logger.debug("创建新记录")
+        result = huoban_api.create_item(MATCH_RESULT_TABLE_ID, fields)
+        if not result:
+            return WRITE_FAILED
+        row_logger.debug("已为学生 %s 创建新的匹配结果", student_name)
+        # 将新创建的记录加入到现有匹配记录字典中
+        if "item_id" in result:
+            existing_matches[student_name] = {"item_id": result["item_id"], "fields": dict(fields)}
+        return WRITE_CREATED
     
     except Exception as e:
-        print(f"更新或创建匹配结果时发生错误: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("更新或创建匹配结果时发生错误: %s", e)
+        return WRITE_FAILED
+
+class MatchResultWriter:
+    """
+    匹配结果的后写缓冲区 (write-behind)。
+    
+    submit() 只把结果放入缓冲区并立即返回，同一学生在刷新前的多次提交合并为最后一次；
+    缓冲区满 batch_size 名学生时整批交给最多 max_workers 个线程并发写入，匹配与写入因此同时进行。
+    伙伴云没有确认可用的批量写入接口，批内每条记录仍单独调用 update_match_result。
+    submit()/flush()/close() 应在同一个线程中调用。
+    
+    on_written(result_entry, 状态) 在调用线程中按提交顺序对每条完成的写入调用一次；
+    keep_statuses 为False时报告中不保留逐条状态，内存占用与写入总数无关。
+    """
 
-def match_all_students(huoban_api):
-    """为所有学生执行匹配"""
-    results = []
+    def __init__(self, huoban_api, existing_matches, max_workers=DEFAULT_WRITE_CONCURRENCY,
+                 batch_size=DEFAULT_WRITE_BATCH_SIZE, on_written=None, keep_statuses=True):
+        self.huoban_api = huoban_api
+        self.existing_matches = existing_matches
+        self.batch_size = batch_size
+        self.on_written = on_written
+        self.keep_statuses = keep_statuses
+        self.coalesced = 0
+        self._report = None
+        self._pending = {}  # {学生姓名: result_entry}
+        self._futures = deque()  # 按提交顺序排列的未处理写入
+        self._statuses = []
+        self._counts = Counter()
+        self._failed = []
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+        # 限制已提交但未完成的写入数量，写入跟不上时 submit() 阻塞，缓冲区不会无限增长
+        self._capacity = threading.BoundedSemaphore(max_workers * batch_size)
+        # 同一学生的写入串行执行，避免并发创建重复记录；锁按姓名哈希分组，数量固定
+        self._student_locks = [threading.Lock() for _ in range(STUDENT_LOCK_STRIPES)]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def submit(self, result_entry):
+        """放入缓冲区，等待批量写入"""
+        key = result_entry.get("student_name") or f"学生ID: {result_entry['student_id']}"
+        if key in self._pending:
+            self.coalesced += 1
+        self._pending[key] = result_entry
+        if len(self._pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """把缓冲区中的结果提交给写入线程"""
+        batch, self._pending = self._pending, {}
+        for key, result_entry in batch.items():
+            self._capacity.acquire()
+            self._futures.append(self._executor.submit(self._write, key, result_entry))
+        self._collect()
+
+    def _collect(self, wait_all=False):
+        """按提交顺序处理已完成的写入，wait_all 为True时等待全部完成"""
+        while self._futures and (wait_all or self._futures[0].done()):
+            result_entry, status = self._futures.popleft().result()
+            self._counts[status] += 1
+            if self.keep_statuses:
+                self._statuses.append((result_entry, status))
+            if status == WRITE_FAILED:
+                self._failed.append({"student_id": result_entry["student_id"],
+                                     "student_table_id": result_entry["student_table_id"],
+                                     "student_name": result_entry.get("student_name")})
+            if self.on_written is not None:
+                self.on_written(result_entry, status)
+
+    def _write(self, key, result_entry):
+        try:
+            with self._student_locks[hash(key) % len(self._student_locks)]:
+                return result_entry, update_match_result(self.huoban_api, result_entry, self.existing_matches)
+        finally:
+            self._capacity.release()
+
+    def close(self):
+        """
+        写入剩余结果并等待全部完成，返回写入报告：
+        {"statuses": [(result_entry, 状态)], "counts": {状态: 数量}, "failed": [写入失败的学生], "coalesced": 合并次数}
+        keep_statuses 为False时 statuses 为空列表。
+        """
+        if self._report is not None:
+            return self._report
+        self.flush()
+        self._executor.shutdown(wait=True)
+        self._collect(wait_all=True)
+        for item in self._failed:
+            logger.warning("学生 %s (ID: %s) 的匹配结果写入失败", item["student_name"], item["student_id"])
+        self._report = {
+            "statuses": self._statuses,
+            "counts": self._counts,
+            "failed": self._failed,
+            "coalesced": self.coalesced,
+        }
+        return self._report
+
+def build_result_entry(student, match_result):
+    """由学生信息和匹配结果构造结果条目"""
+    return {
+        "student_id": student["student_id"],
+        "student_table_id": student["table_id"],
+        "student_name": student.get("student_name"),  # 直接从学生数据中获取姓名
+        "match_result": match_result
+    }
+
+def match_student_entry(student, context, applicant=None):
+    """
+    对单个已映射的学生执行匹配，返回包含学生信息和匹配结果的结果条目。
+    
+    context 为院校目录 (MatchContext)，applicant 为已归一化的输入。
+    """
+    # 归一化匹配输入，每个学生只解析一次
+    if applicant is None:
+        applicant = normalize_applicant(**student)
     
-    # 获取学生数据
-    students = get_all_students(huoban_api)
-    print(f"共获取 {len(students)} 名学生记录")
+    # 调用匹配算法，院校目录按引用传入
+    match_result = match_applicant(applicant, context)
+    
+    return build_result_entry(student, match_result)
+
+def _track_updated_on(items, latest, table_id):
+    """逐条返回记录，同时把表格的最大 updated_on 记入 latest[table_id]"""
+    for item in items:
+        updated_on = item.get("updated_on") or ""
+        if updated_on > latest.get(table_id, ""):
+            latest[table_id] = updated_on
+        yield item
+
+def match_all_students(huoban_api, fetch_concurrency=DEFAULT_FETCH_CONCURRENCY, sync_state=None, match_workers=1,
+                       summary_only=False):
+    """
+    为所有学生执行匹配，fetch_concurrency 为启动时并发读取表格的线程数。
+    
+    流程由生成器串联 (读取学生表 → 映射字段 → 归一化 → 匹配 → 写入)，学生表逐页读取、边读边匹配，
+    各阶段之间只缓冲有限数量的学生。
+    
+    match_workers 大于1时由多个进程并行匹配 (见 parallel_matching)，结果按学生顺序逐个写入；
+    为None时使用全部CPU核。
+    
+    提供 sync_state (SyncState) 时为增量同步：学生表只读取上次水位线之后修改过的记录，
+    匹配输入与上次相同的学生跳过；返回值只包含本次重新匹配的学生。
+    
+    summary_only 为True时不保留逐个学生的结果，只返回汇总
+    {"students": 读取的学生数, "matched": 匹配数, "skipped": 输入未变化跳过数, "writes": {状态: 数量}, "failed": [...]}，
+    内存占用与学生数无关。
+    """
+    student_table_ids = (STUDENT_TABLE_1_ID, STUDENT_TABLE_2_ID)
+    # 每次运行各表格的字段配置最多因字段未命中重新获取一次
+    huoban_api.refreshed_schema_tables.clear()
+    
+    # 并发预读院校目录和匹配结果表，耗时约为最慢的一个表；学生表之后逐页读取
+    prefetched = TableFetchScheduler(huoban_api, max_workers=fetch_concurrency).fetch(
+        [table_id for table_id in SYNC_TABLE_IDS if table_id not in student_table_ids])
     
     # 首先获取所有现有匹配记录，以避免重复
-    existing_matches = get_all_existing_matches(huoban_api)
+    existing_matches = get_all_existing_matches(huoban_api, prefetched)
     
     # 获取大学数据，只需获取一次
-    university_data = get_university_data(huoban_api)
+    university_data = get_university_data(huoban_api, prefetched)
     
     # 获取国际学校数据，只需获取一次
-    international_schools = get_international_school_data(huoban_api)
+    international_schools = get_international_school_data(huoban_api, prefetched)
     
-    for student in students:
-        # 确保学生姓名已获取
-        if "student_name" not in student:
-            student_name = get_student_name(huoban_api, student["student_id"], student["table_id"])
-            if student_name:
-                student["student_name"] = student_name
-                print(f"已获取学生姓名: {student_name}")
-            else:
-                print(f"警告: 无法获取学生ID为 {student['student_id']} 的姓名")
-                student["student_name"] = f"学生ID: {student['student_id']}"
-    
-        # 创建用于匹配的参数字典
-        match_params = {
-            'application_choice': student.get('application_choice'),
-            'academic_percentage': student.get('academic_percentage'),
-            'gaokao_score': student.get('gaokao_score'),
-            'ielts_score': student.get('ielts_score'),
-            'toefl_score': student.get('toefl_score'),
-            'det_score': student.get('det_score'),
-            'language_pass': student.get('language_pass', False),
-            'has_high_school_cert': student.get('has_high_school_cert', False),
-            'has_international_school_experience': student.get('has_international_school_experience', False),
-            'budget_per_year': student.get('budget_per_year', 0),
-            'international_schools': international_schools  # 添加国际学校数据
-        }
-        
-        # 转换数值型数据
-        if 'academic_percentage' in match_params and match_params['academic_percentage']:
-            try:
-                # 处理百分比格式
-                percentage_str = str(match_params['academic_percentage']).replace('%', '')
-                match_params['academic_percentage'] = float(percentage_str)
-                print(f"转换后的值: academic_percentage={match_params['academic_percentage']}", end='')
-            except (ValueError, TypeError):
-                print(f"警告: 无法转换学术成绩 '{match_params['academic_percentage']}' 为数字")
-                
-        if 'gaokao_score' in match_params and match_params['gaokao_score']:
-            try:
-                match_params['gaokao_score'] = float(match_params['gaokao_score'])
-                print(f", gaokao_score={match_params['gaokao_score']}")
-            except (ValueError, TypeError):
-                print(f"警告: 无法转换高考成绩 '{match_params['gaokao_score']}' 为数字")
-        else:
-            print()
-            
-        for score_type in ['ielts_score', 'toefl_score', 'det_score']:
-            if score_type in match_params and match_params[score_type]:
-                try:
-                    match_params[score_type] = float(match_params[score_type])
-                except (ValueError, TypeError):
-                    print(f"警告: 无法转换 {score_type} '{match_params[score_type]}' 为数字")
-        print(f"转换后的值: ielts_score={match_params.get('ielts_score')}, toefl_score={match_params.get('toefl_score')}, det_score={match_params.get('det_score')}")
-        
-        # 根据申请类型选择合适的大学数据集
-        application_type = student.get('application_choice', '').lower()
-        
-        # 添加大学数据到匹配参数
-        if 'undergraduate' in application_type or 'bachelor' in application_type:
-            match_params['university_data'] = {
-                'private': university_data['private'],
-                'public': university_data['public_undergrad']
-            }
-        elif 'graduate' in application_type or 'master' in application_type or 'doctoral' in application_type or 'phd' in application_type:
-            match_params['university_data'] = {
-                'private': university_data['private'],
-                'public': university_data['public_graduate']
-            }
-        else:
-            # 如果申请类型不明确，使用所有大学数据
-            match_params['university_data'] = {
-                'private': university_data['private'],
-                'public': university_data['public_undergrad'] + university_data['public_graduate']
-            }
-        
-        # 调用匹配算法
-        match_result = match_student(**match_params)
-        
-        # 存储结果
-        result_entry = {
-            "student_id": student["student_id"],
-            "student_table_id": student["table_id"],
-            "student_name": student.get("student_name"),  # 直接从学生数据中获取姓名
-            "match_result": match_result
-        }
-        
-        # 使用新函数更新或创建匹配结果
-        update_match_result(huoban_api, result_entry, existing_matches)
-        
-        results.append(result_entry)
+    # 院校目录只构建一次，所有学生共用
+    context = MatchContext.from_catalog(university_data, international_schools)
+    del prefetched  # 原始记录已转换为院校目录，不再需要
+    
+    # 规则或院校目录变化后，未修改的学生也必须按新条件重新匹配
+    if sync_state is not None:
+        sync_state.reset_if_versions_changed(rules=get_match_rules().fingerprint, catalog=context.version)
+    
+    # 有水位线的学生表只读取修改过的记录
+    latest_updated_on = {}
+    table_items = {}
+    for table_id in student_table_ids:
+        watermark = sync_state.get_watermark(table_id) if sync_state is not None else None
+        filter_conditions = None
+        if watermark:
+            logger.info("表格 %s 只读取 %s 以来修改的记录", table_id, watermark)
+            filter_conditions = updated_since_filter(watermark)
+        table_items[table_id] = _track_updated_on(
+            huoban_api.iter_table_items(table_id, filter_conditions=filter_conditions), latest_updated_on, table_id)
+    
+    rules_version = get_match_rules().version
+    counts = Counter()
+    input_hashes = {}  # 已提交但尚未写入完成的学生的匹配输入哈希
+    failed_tables = set()
+    
+    def students_to_match():
+        """归一化输入，增量同步时跳过输入未变化的学生"""
+        for student in iter_students(huoban_api, table_items):
+            counts["students"] += 1
+            applicant = normalize_applicant(**student)
+            if sync_state is not None:
+                input_hash = matching_input_hash(applicant, student["student_name"], rules_version)
+                if sync_state.is_unchanged(student["table_id"], student["student_id"], input_hash):
+                    counts["skipped"] += 1
+                    continue
+                input_hashes[(student["table_id"], student["student_id"])] = input_hash
+            yield student, applicant
     
+    def on_written(result_entry, status):
+        key = (result_entry["student_table_id"], result_entry["student_id"])
+        input_hash = input_hashes.pop(key, None)
+        if status == WRITE_FAILED:
+            failed_tables.add(result_entry["student_table_id"])
+        elif sync_state is not None and input_hash is not None:
+            sync_state.record(*key, input_hash)
+    
+    # 匹配结果按学生顺序逐个返回，交给后写缓冲区，写入在后台线程中与匹配同时进行；
+    # 输入相同的学生直接使用缓存的结果
+    pairs, lookahead = tee(students_to_match())
+    match_results = parallel_map(match_applicant_cached, (applicant for _, applicant in lookahead),
+                                 context=context, max_workers=match_workers)
+    results = None if summary_only else []
+    with MatchResultWriter(huoban_api, existing_matches, on_written=on_written, keep_statuses=False) as writer:
+        for (student, _), match_result in zip(pairs, match_results):
+            result_entry = build_result_entry(student, match_result)
+            writer.submit(result_entry)
+            counts["matched"] += 1
+            if results is not None:
+                results.append(result_entry)
+    
+        write_report = writer.close()
+    
+    logger.info("共获取 %d 名学生记录，匹配 %d 名", counts["students"], counts["matched"])
+    cache_stats = match_result_cache.stats()
+    logger.info("匹配结果缓存: 命中 %d, 未命中 %d, 缓存 %d 种输入 (多进程匹配时只统计主进程)",
+                cache_stats["hits"], cache_stats["misses"], cache_stats["size"])
+    
+    write_counts = write_report["counts"]
+    for status, count in write_counts.items():
+        metrics.inc("match_results_total", count, status=status)
+    logger.info("匹配结果写入: 新建 %d, 更新 %d, 未变化跳过 %d, 失败 %d, 合并 %d",
+                write_counts[WRITE_CREATED], write_counts[WRITE_UPDATED],
+                write_counts[WRITE_SKIPPED], write_counts[WRITE_FAILED], write_report["coalesced"])
+    
+    if sync_state is not None:
+        # 有写入失败的表格不推进水位线，下次重新读取 (写入成功的学生会因哈希相同被跳过)
+        for table_id in student_table_ids:
+            if table_id not in failed_tables:
+                sync_state.advance_watermark(table_id, latest_updated_on.get(table_id, ""))
+        sync_state.save()
+        logger.info("增量同步: 重新匹配 %d 名学生，跳过 %d 名输入未变化的学生", counts["matched"], counts["skipped"])
+    
+    if summary_only:
+        return {
+            "students": counts["students"],
+            "matched": counts["matched"],
+            "skipped": counts["skipped"],
+            "writes": dict(write_counts),
+            "failed": write_report["failed"],
+        }
     return results
 
 def check_all_tables():
@@ -761,24 +1221,21 @@ def check_all_tables():
 def cleanup_duplicate_records(huoban_api):
     """清理匹配结果表中的重复记录"""
     try:
-        print("\n=== 清理匹配结果表中的重复记录 ===")
+        logger.info("=== 清理匹配结果表中的重复记录 ===")
         # 获取字段映射
         field_mapping_names = {"student_name": "学生姓名"}
         field_mappings = get_field_mappings(huoban_api, MATCH_RESULT_TABLE_ID, field_mapping_names)
         
         if "student_name" not in field_mappings:
-            print("错误: 无法在匹配结果表中找到学生姓名字段")
+            logger.error("无法在匹配结果表中找到学生姓名字段")
             return
         
         student_name_field_id = field_mappings["student_name"]
         
-        # 获取所有匹配结果
-        results = huoban_api.get_table_items(MATCH_RESULT_TABLE_ID, limit=100)
-        
-        # 收集按学生姓名分组的记录
+        # 逐页获取所有匹配结果，收集按学生姓名分组的记录
         student_records = {}
         
-        for item in results.get("items", []):
+        for item in huoban_api.iter_table_items(MATCH_RESULT_TABLE_ID):
             if student_name_field_id in item.get("fields", {}):
                 student_name = item["fields"][student_name_field_id]
                 if student_name:  # 确保学生姓名不为空
@@ -792,7 +1249,7 @@ def cleanup_duplicate_records(huoban_api):
         for student_name, records in student_records.items():
             if len(records) > 1:
                 duplicates_found = True
-                print(f"发现学生 '{student_name}' 有 {len(records)} 条重复记录")
+                logger.info("发现学生 '%s' 有 %d 条重复记录", student_name, len(records))
                 
                 # 按更新时间排序，保留最新的一条
                 sorted_records = sorted(records, key=lambda x: x.get("updated_on", ""), reverse=True)
@@ -800,50 +1257,53 @@ def cleanup_duplicate_records(huoban_api):
                 keep_record = sorted_records[0]
                 delete_records = sorted_records[1:]
                 
-                print(f"保留最新记录 (ID: {keep_record['item_id']}, 更新时间: {keep_record.get('updated_on')})")
+                logger.info("保留最新记录 (ID: %s, 更新时间: %s)", keep_record['item_id'], keep_record.get('updated_on'))
                 
                 # TODO: 目前API不支持删除操作，可以考虑将重复记录标记为"重复"
                 for record in delete_records:
-                    print(f"应删除重复记录 (ID: {record['item_id']}, 更新时间: {record.get('updated_on')})")
+                    logger.info("应删除重复记录 (ID: %s, 更新时间: %s)", record['item_id'], record.get('updated_on'))
                     # 如果API支持删除操作，可以在这里添加删除代码
         
         if not duplicates_found:
-            print("没有发现重复记录，无需清理")
+            logger.info("没有发现重复记录，无需清理")
         
     except Exception as e:
-        print(f"清理重复记录时发生错误: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("清理重复记录时发生错误: %s", e)
 
 def main():
-    # 初始化API客户端
-    huoban_api = HuobanyunAPI(APP_SECRET)
+    # 初始化API客户端，字段配置缓存在本地以便下次运行跳过 get_table_details
+    huoban_api = HuobanyunAPI(APP_SECRET, schema_cache=SchemaCache())
     
     try:
-        print("开始执行学生匹配流程...")
+        logger.info("开始执行学生匹配流程...")
         
-        # 执行匹配 (内部会获取学生数据)
-        match_results = match_all_students(huoban_api)
-        print(f"已完成 {len(match_results)} 名学生的匹配")
+        # 执行增量匹配 (内部会获取学生数据)，删除同步状态文件即可触发全量同步
+        # 只保留汇总，不在内存中累积每个学生的结果
+        summary = match_all_students(huoban_api, sync_state=SyncState(), summary_only=True)
+        logger.info("已完成 %d 名学生的匹配", summary["matched"])
         
         # 清理匹配结果表中的重复记录
         cleanup_duplicate_records(huoban_api)
         
-        print("匹配流程执行完成！")
-        return match_results
+        logger.info("匹配流程执行完成！")
+        return summary
         
     except Exception as e:
-        print(f"执行过程中发生错误: {e}")
-        import traceback
-        traceback.print_exc()  # 打印详细堆栈跟踪
+        logger.exception("执行过程中发生错误: %s", e)  # 记录详细堆栈跟踪
         return None
+    
+    finally:
+        huoban_api.close()
+        # 输出本次运行的计数指标 (各级别匹配人数、解析失败、API调用次数)
+        logger.info("运行指标:\n%s", metrics.to_prometheus())
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    
     # 添加调试输出
-    print(f"使用API基础URL: {API_BASE_URL}")
-    print(f"使用空间ID: {SPACE_ID}")
-    print(f"APP_SECRET 长度: {len(APP_SECRET)} 字符")
-    print(f"APP_SECRET 前5个字符: {APP_SECRET[:5]}...")
+    logger.info("使用API基础URL: %s", API_BASE_URL)
+    logger.info("使用空间ID: %s", SPACE_ID)
+    logger.info("APP_SECRET 长度: %d 字符", len(APP_SECRET))
     
     check_all_tables()  # 首先进行表格检查
     main()
@@ -0,0 +1,89 @@
+"""
+日志与指标。
+
+- 各模块使用 logging.getLogger(__name__) 输出流程级日志；
+  逐条记录(每个学生、每次写入)的日志使用 get_row_logger(__name__)，可通过
+  set_row_logging(False) 或环境变量 MATCH_ROW_LOGGING=0 一次性关闭。
+- metrics 为进程内计数器，snapshot() 返回字典，to_prometheus() 返回 Prometheus 文本格式。
+"""
+import logging
+import os
+import threading
+
+_row_loggers = {}
+_row_logging_enabled = os.environ.get("MATCH_ROW_LOGGING", "1") != "0"
+
+
+def get_row_logger(name):
+    """返回模块的逐条记录日志器 (<模块名>.rows)"""
+    logger = _row_loggers.get(name)
+    if logger is None:
+        logger = logging.getLogger(f"{name}.rows")
+        logger.disabled = not _row_logging_enabled
+        _row_loggers[name] = logger
+    return logger
+
+
+def set_row_logging(enabled):
+    """开启或关闭所有模块的逐条记录日志"""
+    global _row_logging_enabled
+    _row_logging_enabled = bool(enabled)
+    for logger in _row_loggers.values():
+        logger.disabled = not _row_logging_enabled
+
+
+def _escape_label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Metrics:
+    """线程安全的带标签计数器"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+
+    def inc(self, name, amount=1, **labels):
+        """计数器 name 在给定标签下增加 amount"""
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def get(self, name, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            return self._counters.get(key, 0)
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+
+    def snapshot(self):
+        """返回 {指标名: {"标签=值,...": 计数}} 形式的字典"""
+        with self._lock:
+            items = sorted(self._counters.items())
+        snapshot = {}
+        for (name, labels), value in items:
+            label_text = ",".join(f"{key}={label_value}" for key, label_value in labels)
+            snapshot.setdefault(name, {})[label_text] = value
+        return snapshot
+
+    def to_prometheus(self):
+        """返回 Prometheus 文本格式的指标"""
+        with self._lock:
+            items = sorted(self._counters.items())
+        lines = []
+        current = None
+        for (name, labels), value in items:
+            if name != current:
+                lines.append(f"# TYPE {name} counter")
+                current = name
+            if labels:
+                label_text = ",".join(f'{key}="{_escape_label(label_value)}"' for key, label_value in labels)
+                lines.append(f"{name}{{{label_text}}} {value}")
+            else:
+                lines.append(f"{name} {value}")
+        return "\n".join(lines) + ("\n" if lines else "")
+
+
+metrics = Metrics()
@@ -0,0 +1,372 @@
+"""
+匹配规则表。
+
+大学级别、私立大学升学路径和国际学校档位以数据形式声明 (Python 字典或 JSON 文件)，
+经 validate 校验后编译为 CompiledRules：每个维度的区间按起点排序，
+用 bisect 查找学生所在区间，匹配一个学生只需 O(log 级别数)。
+
+区间写法: {"gt": 80}、{"gte": 75, "lte": 80}、{"lt": 5.5} 等，省略的一端为无穷。
+"""
+import hashlib
+import json
+import math
+from bisect import bisect_right
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+
+# 默认规则，与历史上写死在 Match_Algo 中的条件一致；
+# 国际学校档位补上了原条件遗漏的预算 90000-100000 和学术成绩恰好为 50 的学生
+DEFAULT_RULES = {
+    "version": "default",
+    "university_tiers": [
+        {
+            "name": "顶尖公立大学",
+            "universities": ["新加坡国立大学", "新加坡南洋理工大学"],
+            "academic": {"gt": 80},
+            "gaokao": {"gt": 600},
+            "language": {"ielts": {"gte": 6.5, "lte": 9.0}, "toefl": {"gte": 79, "lte": 120}, "det": {"gte": 105}}
+        },
+        {
+            "name": "其他公立大学",
+            "universities": ["新加坡管理大学", "新加坡科技设计大学"],
+            "academic": {"gte": 75, "lte": 80},
+            "gaokao": {"gte": 520, "lte": 600},
+            "language": {"ielts": {"gte": 6.0, "lte": 9.0}, "toefl": {"gte": 60, "lte": 120}, "det": {"gte": 95}}
+        },
+        {
+            "name": "第三级别私立大学",
+            "universities": ["英国伯明翰大学", "澳大利亚皇家墨尔本理工大学", "爱尔兰都柏林大学"],
+            "academic": {"gte": 70, "lt": 75},
+            "gaokao": {"gte": 450, "lt": 520},
+            "requires_path": True
+        },
+        {
+            "name": "第四级别私立大学",
+            "universities": ["澳大利亚伍伦贡大学", "澳洲纽卡斯尔大学", "澳大利亚科廷大学", "新西兰梅西大学", "乐卓博大学"],
+            "academic": {"gte": 65, "lt": 70},
+            "gaokao": {"gte": 400, "lt": 450},
+            "requires_path": True
+        },
+        {
+            "name": "第五级别私立大学",
+            "universities": ["英国考文垂大学", "澳大利亚莫道克大学", "英国诺比森亚大学", "英国斯特灵大学"],
+            "academic": {"gte": 60, "lt": 65},
+            "gaokao": {"gte": 350, "lt": 400},
+            "requires_path": True
+        }
+    ],
+    "private_paths": [
+        {
+            "path": "进入语言班随后升入预科班",
+            "language": {"ielts": {"lt": 5.5}, "toefl": {"lt": 59}, "det": {"lt": 100}, "language_pass": False},
+            "has_high_school_cert": False
+        },
+        {
+            "path": "进入语言班随后升入国际大一",
+            "language": {"ielts": {"lt": 5.5}, "toefl": {"lt": 59}, "det": {"lt": 100}, "language_pass": False},
+            "has_high_school_cert": True
+        },
+        {
+            "path": "进入预科班",
+            "language": {"ielts": {"gte": 5.5, "lte": 5.5}, "toefl": {"gte": 46, "lt": 59},
+                         "det": {"gte": 85, "lt": 100}, "language_pass": True},
+            "has_high_school_cert": False
+        },
+        {
+            "path": "进入国际大一",
+            "language": {"ielts": {"gte": 6.0, "lte": 9.0}, "toefl": {"gte": 60, "lte": 120},
+                         "det": {"gte": 95}, "language_pass": True},
+            "has_high_school_cert": True
+        }
+    ],
+    "international_school_rules": [
+        {
+            "schools": ["UWC", "东陵信托国际学校", "美国国际学校", "德威国际学校", "北伦敦伦敦国际学校"],
+            "academic": {"gt": 70},
+            "budget": {"gte": 100000},
+            "experience_qualifies": True
+        },
+        {
+            "schools": ["斯坦福美国国际学校", "加拿大国际学校", "NPS国际学校", "澳洲国际学校", "布莱顿国际学校", "多佛国际学校"],
+            "academic": {"gte": 50},
+            "budget": {"gte": 50000, "lt": 100000}
+        },
+        {
+            "schools": ["伊顿国际学校", "米德尔顿国际学校", "茵维特国际学校", "海外家庭学校", "莱仕国际学校",
+                        "环印国际学校", "壹世界国际学校", "汉合国际学校"],
+            "academic": {"lte": 50},
+            "budget": {"lt": 50000}
+        }
+    ]
+}
+
+LANGUAGE_TESTS = ("ielts", "toefl", "det")
+
+
+@dataclass(frozen=True)
+class Interval:
+    """数值区间，两端可开可闭"""
+    low: float = -math.inf
+    high: float = math.inf
+    low_inclusive: bool = True
+    high_inclusive: bool = True
+
+    @property
+    def start_key(self):
+        # 闭区间起点排在同值开区间起点之前，查询键 (x, 0) 与之比较即可区分开闭
+        return (self.low, 0 if self.low_inclusive else 1)
+
+    @property
+    def end_key(self):
+        return (self.high, 1 if self.high_inclusive else 0)
+
+    def contains(self, value):
+        if value is None or value != value:
+            return False
+        return self.start_key <= (value, 0) < self.end_key
+
+
+@dataclass(frozen=True)
+class LanguageRule:
+    """语言条件：任一考试成绩落在对应区间内，或语言测试结果等于 language_pass 即满足"""
+    ielts: Optional[Interval] = None
+    toefl: Optional[Interval] = None
+    det: Optional[Interval] = None
+    language_pass: Optional[bool] = None
+
+    def matches(self, ielts_score, toefl_score, det_score, language_pass=False):
+        if self.ielts is not None and self.ielts.contains(ielts_score):
+            return True
+        if self.toefl is not None and self.toefl.contains(toefl_score):
+            return True
+        if self.det is not None and self.det.contains(det_score):
+            return True
+        return self.language_pass is not None and bool(language_pass) == self.language_pass
+
+
+@dataclass(frozen=True)
+class UniversityTier:
+    """大学级别：学术成绩或高考成绩落在区间内，且满足语言条件(如有)"""
+    name: str
+    universities: Tuple[str, ...]
+    academic: Optional[Interval] = None
+    gaokao: Optional[Interval] = None
+    language: Optional[LanguageRule] = None
+    requires_path: bool = False
+
+
+@dataclass(frozen=True)
+class PathRule:
+    """私立大学升学路径：满足语言条件且高中毕业证书情况一致"""
+    path: str
+    language: LanguageRule
+    has_high_school_cert: bool
+
+
+@dataclass(frozen=True)
+class SchoolRule:
+    """国际学校档位：预算落在区间内，且学术成绩满足区间(或有国际学校经验且 experience_qualifies)"""
+    schools: Tuple[str, ...]
+    budget: Interval
+    academic: Interval
+    experience_qualifies: bool = False
+
+
+@dataclass(frozen=True)
+class MatchRules:
+    version: str
+    university_tiers: Tuple[UniversityTier, ...]
+    private_paths: Tuple[PathRule, ...]
+    school_rules: Tuple[SchoolRule, ...]
+
+
+def _interval_from_dict(data, where):
+    """将 {"gt"/"gte"/"lt"/"lte": 数值} 转换为 Interval"""
+    if not isinstance(data, dict):
+        raise ValueError(f"{where}: 区间必须是字典，实际为 {data!r}")
+    unknown = set(data) - {"gt", "gte", "lt", "lte"}
+    if unknown:
+        raise ValueError(f"{where}: 未知的区间键 {sorted(unknown)}")
+    if "gt" in data and "gte" in data or "lt" in data and "lte" in data:
+        raise ValueError(f"{where}: 同一端不能同时指定开区间和闭区间")
+
+    low, low_inclusive = -math.inf, True
+    high, high_inclusive = math.inf, True
+    if "gt" in data:
+        low, low_inclusive = float(data["gt"]), False
+    elif "gte" in data:
+        low = float(data["gte"])
+    if "lt" in data:
+        high, high_inclusive = float(data["lt"]), False
+    elif "lte" in data:
+        high = float(data["lte"])
+
+    interval = Interval(low, high, low_inclusive, high_inclusive)
+    if not interval.start_key < interval.end_key:
+        raise ValueError(f"{where}: 区间为空 {data!r}")
+    return interval
+
+
+def _language_from_dict(data, where):
+    if not isinstance(data, dict):
+        raise ValueError(f"{where}: 语言条件必须是字典")
+    unknown = set(data) - set(LANGUAGE_TESTS) - {"language_pass"}
+    if unknown:
+        raise ValueError(f"{where}: 未知的语言条件键 {sorted(unknown)}")
+    intervals = {test: _interval_from_dict(data[test], f"{where}.{test}") for test in LANGUAGE_TESTS if test in data}
+    language_pass = data.get("language_pass")
+    if language_pass is not None and not isinstance(language_pass, bool):
+        raise ValueError(f"{where}.language_pass: 必须是布尔值")
+    return LanguageRule(language_pass=language_pass, **intervals)
+
+
+def _check_disjoint(intervals, where):
+    """同一维度上的区间必须互不重叠，才能用 bisect 唯一定位"""
+    ordered = sorted(intervals, key=lambda interval: interval.start_key)
+    for previous, current in zip(ordered, ordered[1:]):
+        if current.start_key < previous.end_key:
+            raise ValueError(f"{where}: 区间 {previous} 与 {current} 重叠")
+
+
+def validate(data):
+    """校验规则数据并转换为 MatchRules，数据有误时抛出 ValueError"""
+    if not isinstance(data, dict):
+        raise ValueError("规则数据必须是字典")
+
+    tiers = []
+    for i, tier in enumerate(data.get("university_tiers", [])):
+        where = f"university_tiers[{i}]"
+        if not tier.get("universities"):
+            raise ValueError(f"{where}: 缺少 universities")
+        if "academic" not in tier and "gaokao" not in tier:
+            raise ValueError(f"{where}: academic 与 gaokao 至少需要一个")
+        tiers.append(UniversityTier(
+            name=tier.get("name", where),
+            universities=tuple(tier["universities"]),
+            academic=_interval_from_dict(tier["academic"], f"{where}.academic") if "academic" in tier else None,
+            gaokao=_interval_from_dict(tier["gaokao"], f"{where}.gaokao") if "gaokao" in tier else None,
+            language=_language_from_dict(tier["language"], f"{where}.language") if "language" in tier else None,
+            requires_path=bool(tier.get("requires_path", False)),
+        ))
+    _check_disjoint([tier.academic for tier in tiers if tier.academic], "university_tiers.academic")
+    _check_disjoint([tier.gaokao for tier in tiers if tier.gaokao], "university_tiers.gaokao")
+
+    paths = []
+    for i, rule in enumerate(data.get("private_paths", [])):
+        where = f"private_paths[{i}]"
+        if not rule.get("path"):
+            raise ValueError(f"{where}: 缺少 path")
+        paths.append(PathRule(
+            path=rule["path"],
+            language=_language_from_dict(rule.get("language", {}), f"{where}.language"),
+            has_high_school_cert=bool(rule.get("has_high_school_cert", False)),
+        ))
+    if any(tier.requires_path for tier in tiers) and not paths:
+        raise ValueError("存在 requires_path 的大学级别，但未定义 private_paths")
+
+    school_rules = []
+    for i, rule in enumerate(data.get("international_school_rules", [])):
+        where = f"international_school_rules[{i}]"
+        if not rule.get("schools"):
+            raise ValueError(f"{where}: 缺少 schools")
+        school_rules.append(SchoolRule(
+            schools=tuple(rule["schools"]),
+            budget=_interval_from_dict(rule.get("budget", {}), f"{where}.budget"),
+            academic=_interval_from_dict(rule.get("academic", {}), f"{where}.academic"),
+            experience_qualifies=bool(rule.get("experience_qualifies", False)),
+        ))
+    _check_disjoint([rule.budget for rule in school_rules], "international_school_rules.budget")
+
+    return MatchRules(
+        version=str(data.get("version", "")),
+        university_tiers=tuple(tiers),
+        private_paths=tuple(paths),
+        school_rules=tuple(school_rules),
+    )
+
+
+def load_rules(path):
+    """从 JSON 文件加载并校验规则"""
+    with open(path, encoding="utf-8") as f:
+        return validate(json.load(f))
+
+
+class _IntervalIndex:
+    """一组互不重叠的区间，按起点排序后用 bisect 查找包含某值的区间"""
+
+    def __init__(self, entries):
+        entries = sorted(entries, key=lambda entry: entry[0].start_key)
+        self._starts = [interval.start_key for interval, _ in entries]
+        self._ends = [interval.end_key for interval, _ in entries]
+        self._values = [value for _, value in entries]
+
+    def lookup(self, value):
+        """返回包含 value 的区间对应的值，没有则返回 None"""
+        if value is None or value != value:
+            return None
+        key = (value, 0)
+        i = bisect_right(self._starts, key) - 1
+        if i >= 0 and key < self._ends[i]:
+            return self._values[i]
+        return None
+
+
+class CompiledRules:
+    """编译后的规则，供 Match_Algo 在每个学生上求值"""
+
+    def __init__(self, rules):
+        self.rules = rules
+        self.version = rules.version
+        # 规则内容的指纹，规则改动但 version 未更新时同样会变化
+        self.fingerprint = hashlib.sha1(repr(rules).encode("utf-8")).hexdigest()
+        self.university_tiers = rules.university_tiers
+        self.private_paths = rules.private_paths
+        self.school_rules = rules.school_rules
+
+        self._tier_by_academic = _IntervalIndex(
+            [(tier.academic, i) for i, tier in enumerate(rules.university_tiers) if tier.academic])
+        self._tier_by_gaokao = _IntervalIndex(
+            [(tier.gaokao, i) for i, tier in enumerate(rules.university_tiers) if tier.gaokao])
+        self._school_by_budget = _IntervalIndex(
+            [(rule.budget, i) for i, rule in enumerate(rules.school_rules)])
+
+    def match_tier(self, academic_percentage, gaokao_score, ielts_score, toefl_score, det_score):
+        """返回学生匹配的大学级别下标，未匹配返回 -1"""
+        by_academic = self._tier_by_academic.lookup(academic_percentage)
+        by_gaokao = self._tier_by_gaokao.lookup(gaokao_score)
+        # 每个维度至多命中一个级别，按级别顺序检查语言条件
+        for i in sorted({by_academic, by_gaokao} - {None}):
+            language = self.university_tiers[i].language
+            if language is None or language.matches(ielts_score, toefl_score, det_score):
+                return i
+        return -1
+
+    def match_path(self, ielts_score, toefl_score, det_score, language_pass, has_high_school_cert):
+        """返回私立大学升学路径下标，未匹配返回 -1"""
+        has_high_school_cert = bool(has_high_school_cert)
+        for i, rule in enumerate(self.private_paths):
+            if (rule.has_high_school_cert == has_high_school_cert
+                    and rule.language.matches(ielts_score, toefl_score, det_score, language_pass)):
+                return i
+        return -1
+
+    def match_school_rule(self, academic_percentage, has_international_school_experience, budget_per_year):
+        """返回国际学校档位下标，未匹配返回 -1"""
+        i = self._school_by_budget.lookup(budget_per_year)
+        if i is None:
+            return -1
+        rule = self.school_rules[i]
+        if rule.academic.contains(academic_percentage) or (
+                rule.experience_qualifies and has_international_school_experience):
+            return i
+        return -1
+
+
+def compile_rules(rules):
+    """将规则字典或 MatchRules 编译为 CompiledRules"""
+    if isinstance(rules, CompiledRules):
+        return rules
+    if not isinstance(rules, MatchRules):
+        rules = validate(rules)
+    return CompiledRules(rules)
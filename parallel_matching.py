@@ -0,0 +1,72 @@
+"""
+多进程匹配。
+
+匹配是纯CPU计算，parallel_map 把输入按 chunk_size 分块交给 ProcessPoolExecutor：
+院校目录等共享数据 (context) 和当前匹配规则只在每个工作进程启动时通过 initializer 发送一次，
+每块只需序列化输入和结果；结果按输入顺序逐个返回，可以边算边写。
+输入可以是生成器，同时提交的块数有上限，输入和未取走的结果都不会整体留在内存中。
+
+工作进程中的 metrics 计数不会汇总到主进程。
+"""
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import chain, islice
+
+from Match_Algo import get_match_rules, set_match_rules
+
+DEFAULT_CHUNK_SIZE = 500  # 每个任务包含的学生数，用于摊薄进程间序列化开销
+PENDING_CHUNKS_PER_WORKER = 2  # 每个工作进程最多排队的块数
+MIN_PARALLEL_ITEMS = 2000  # 输入少于此数时在当前进程中计算，启动进程池不划算
+
+_worker_func = None
+_worker_context = None
+
+
+def _init_worker(func, context, rules):
+    global _worker_func, _worker_context
+    _worker_func = func
+    _worker_context = context
+    set_match_rules(rules)
+
+
+def _run_chunk(chunk):
+    return [_worker_func(item, _worker_context) for item in chunk]
+
+
+def _chunks(items, chunk_size):
+    items = iter(items)
+    while True:
+        chunk = list(islice(items, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def parallel_map(func, items, context=None, max_workers=None, chunk_size=DEFAULT_CHUNK_SIZE,
+                 min_parallel_items=MIN_PARALLEL_ITEMS):
+    """
+    对每个输入调用 func(item, context)，按输入顺序逐个返回结果 (生成器)。
+
+    func 必须是模块级函数 (可被 pickle)；max_workers 默认为CPU核数。
+    只有一个工作进程或输入少于 min_parallel_items 时直接在当前进程中计算。
+    items 按需读取，最多同时有 max_workers * PENDING_CHUNKS_PER_WORKER 块在计算或等待取走。
+    """
+    items = iter(items)
+    max_workers = max_workers or os.cpu_count() or 1
+    head = [] if max_workers <= 1 else list(islice(items, min_parallel_items))
+    if max_workers <= 1 or len(head) < min_parallel_items:
+        for item in chain(head, items):
+            yield func(item, context)
+        return
+
+    chunks = _chunks(chain(head, items), chunk_size)
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker,
+                             initargs=(func, context, get_match_rules().rules)) as executor:
+        pending = deque(executor.submit(_run_chunk, chunk)
+                        for chunk in islice(chunks, max_workers * PENDING_CHUNKS_PER_WORKER))
+        while pending:
+            results = pending.popleft().result()
+            for chunk in islice(chunks, 1):
+                pending.append(executor.submit(_run_chunk, chunk))
+            yield from results
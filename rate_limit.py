@@ -0,0 +1,111 @@
+"""
+客户端限流与重试策略。
+
+TokenBucket 由同一个API客户端的所有请求共享 (线程安全)，reserve() 只计算需要等待的时间，
+同步客户端用 time.sleep、异步客户端用 asyncio.sleep 等待。
+RetryPolicy 计算带抖动的指数退避时间，服务端给出 Retry-After 时以其为准 (同样不超过 max_delay)。
+创建记录等非幂等请求重发可能产生重复记录，只在服务端明确拒绝、未处理请求时重试 (见 can_resend)。
+"""
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+# 可重试的HTTP状态码：限流和网关/服务暂时不可用
+RETRYABLE_STATUS_CODES = frozenset({429, 500, 502, 503, 504})
+
+# 业务错误信息中出现这些关键字时视为限流，可重试
+RETRYABLE_MESSAGE_KEYWORDS = ("频繁", "限流", "rate limit", "too many")
+
+
+class TokenBucket:
+    """令牌桶：平均每秒 rate 个请求，允许突发 capacity 个；rate 为None时不限流"""
+
+    def __init__(self, rate, capacity=None, clock=time.monotonic):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1, rate or 1)
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._tokens = float(self.capacity)
+        self._updated = clock()
+        self._paused_until = 0.0
+
+    def reserve(self):
+        """取走一个令牌，返回调用方需要等待的秒数 (令牌可预支，等待时间按欠账计算)"""
+        with self._lock:
+            now = self._clock()
+            pause = max(0.0, self._paused_until - now)
+            if not self.rate:
+                return pause
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+            return max(wait, pause)
+
+    def acquire(self):
+        """阻塞直到获得一个令牌"""
+        delay = self.reserve()
+        if delay > 0:
+            time.sleep(delay)
+
+    def pause(self, seconds):
+        """服务端要求退避时，让共享此令牌桶的所有请求至少等待 seconds 秒"""
+        with self._lock:
+            self._paused_until = max(self._paused_until, self._clock() + seconds)
+
+
+def parse_retry_after(value):
+    """解析 Retry-After 响应头 (秒数或HTTP日期)，无法解析时返回None"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+
+class RetryPolicy:
+    """最多尝试 max_attempts 次，第 n 次重试前等待 [0, min(max_delay, base_delay * 2^(n-1))] 内的随机时间"""
+
+    def __init__(self, max_attempts=5, base_delay=0.5, max_delay=30.0, retryable_status_codes=RETRYABLE_STATUS_CODES,
+                 retryable_business_codes=frozenset(), retryable_message_keywords=RETRYABLE_MESSAGE_KEYWORDS):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.retryable_status_codes = frozenset(retryable_status_codes)
+        self.retryable_business_codes = frozenset(retryable_business_codes)
+        self.retryable_message_keywords = tuple(retryable_message_keywords)
+
+    def is_retryable(self, status_code=None, business_code=None, message=""):
+        """判断一次失败的响应是否值得重试"""
+        if status_code is not None and status_code != 200:
+            return status_code in self.retryable_status_codes
+        if business_code in self.retryable_business_codes:
+            return True
+        message = (message or "").lower()
+        return any(keyword in message for keyword in self.retryable_message_keywords)
+
+    def can_resend(self, status_code, retry_after=None, business_code=None, message=""):
+        """
+        非幂等请求失败后能否重发：429、带 Retry-After 的 503 以及业务层限流 (HTTP 200 且业务错误可重试)
+        表示服务端拒绝了该请求、没有处理；500/502/504 和连接异常时请求可能已经生效。
+        """
+        if status_code == 200:
+            return self.is_retryable(business_code=business_code, message=message)
+        return status_code == 429 or (status_code == 503 and retry_after is not None)
+
+    def delay(self, attempt, retry_after=None):
+        """第 attempt 次重试前的等待秒数"""
+        if retry_after is not None:
+            # 异常或过大的 Retry-After 不能让共享令牌桶的所有请求长时间停顿
+            return min(retry_after, self.max_delay)
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
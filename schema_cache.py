@@ -0,0 +1,102 @@
+"""
+表格字段配置的持久化缓存。
+
+每个表格的字段配置和由其得到的 字段名称→字段ID 映射保存在缓存目录下的 JSON 文件中，
+在 TTL 内的热启动可以跳过 get_table_details 请求；字段查找未命中时由调用方调用 invalidate 重新获取。
+"""
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# 缓存目录，可通过环境变量 HUOBANYUN_CACHE_DIR 指定
+DEFAULT_CACHE_DIR = os.environ.get("HUOBANYUN_CACHE_DIR",
+                                   os.path.join(os.path.expanduser("~"), ".cache", "huobanyun_match"))
+DEFAULT_SCHEMA_TTL = 24 * 3600  # 字段配置缓存有效期，单位:秒
+
+
+def write_json_atomic(path, data):
+    """先写临时文件再替换，避免中断时留下半个文件；写入失败只记录警告"""
+    directory = os.path.dirname(path) or "."
+    tmp_path = None
+    try:
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix="." + os.path.basename(path) + ".")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        logger.warning("写入缓存文件 %s 失败: %s", path, e)
+        if tmp_path and os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def build_field_name_index(field_configs):
+    """由字段配置构造 {字段名称: 字段ID}，同名字段保留第一个"""
+    index = {}
+    for field in field_configs:
+        index.setdefault(field.get("name", ""), field.get("field_id", ""))
+    return index
+
+
+class SchemaCache:
+    """按表格ID保存字段配置的 JSON 文件缓存 (线程安全，原子写入)"""
+
+    def __init__(self, path=None, ttl=DEFAULT_SCHEMA_TTL, clock=time.time):
+        self.path = path or os.path.join(DEFAULT_CACHE_DIR, "schema_cache.json")
+        self.ttl = ttl
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._entries = self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                entries = json.load(f)
+            return entries if isinstance(entries, dict) else {}
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            logger.warning("字段配置缓存 %s 无法读取，将重新获取: %s", self.path, e)
+            return {}
+
+    def _save(self):
+        write_json_atomic(self.path, self._entries)
+
+    def _fresh_entry(self, table_id):
+        entry = self._entries.get(table_id)
+        if entry is None or self._clock() - entry.get("fetched_at", 0) > self.ttl:
+            return None
+        return entry
+
+    def get(self, table_id):
+        """返回未过期的字段配置，没有则返回None"""
+        with self._lock:
+            entry = self._fresh_entry(table_id)
+            return entry["fields"] if entry else None
+
+    def get_name_index(self, table_id):
+        """返回未过期的 {字段名称: 字段ID}，没有则返回None"""
+        with self._lock:
+            entry = self._fresh_entry(table_id)
+            return entry["name_index"] if entry else None
+
+    def put(self, table_id, fields):
+        """保存表格的字段配置及名称映射"""
+        with self._lock:
+            self._entries[table_id] = {
+                "fetched_at": self._clock(),
+                "fields": fields,
+                "name_index": build_field_name_index(fields),
+            }
+            self._save()
+
+    def invalidate(self, table_id):
+        """删除表格的缓存，下次访问时重新获取"""
+        with self._lock:
+            if self._entries.pop(table_id, None) is not None:
+                self._save()
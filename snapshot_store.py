@@ -0,0 +1,329 @@
+"""
+伙伴云表格的本地列式快照。
+
+每个表格保存为一组 NumPy .npy 文件 (每列一个文件，按 item_id 对齐)，读取时以 mmap 方式打开，
+不需要把整张表反序列化到内存；分析脚本和重新评分任务可以直接从快照读取，不再访问API。
+
+目录结构:
+    <root>/<表格ID>/meta.json        字段配置、列说明、记录数和水位线 (最大 updated_on)
+    <root>/<表格ID>/<版本>/*.npy     item_id、updated_on 和每个字段一列
+
+列的类型:
+- "int": 所有值都是 int64 范围内整数的字段，保存为 int64 (超过 2**53 的整数也不丢精度)；
+  有缺失值时另存一列布尔掩码 missing_<字段ID>.npy
+- "float": 其他所有值都是数字的字段，保存为 float64，缺失值为 NaN
+- "json": 其他字段，每个值保存为 JSON 文本 (缺失为空字符串)
+伙伴云常把数字字段的值返回为文本 ("85")，字段类型为 number 的 "json" 列另外保存一列解析后的 float64。
+
+values() 的读取方式:
+- 以 mmap 零拷贝返回: "float" 列、没有缺失值的 "int" 列、字段类型为 number 的 "json" 列 (解析后的 float64 列)
+- 每次读取时在 Python 中解码: 其他 "json" 列 (逐个 json.loads)；
+  有缺失值的 "int" 列转换为 float64 副本，缺失值为 NaN，与 match_students_batch 的输入约定一致
+items() 逐条还原记录，所有列都会解码。
+
+refresh() 只读取 updated_on 不早于水位线的记录并按 item_id 合并，写入新版本目录后再替换 meta.json。
+列按需加载，已打开旧版本的读取者之后还会读取旧版本目录，因此写入时保留上一个版本，只删除更早的版本：
+持有的 SnapshotTable 在下一次写入之前都可以继续读取，再之后需要重新 load()。
+增量刷新无法发现已删除的记录，需要时以 full=True 全量重建。
+
+用法:
+    python snapshot_store.py [--full] [表格ID ...]
+"""
+import argparse
+import json
+import logging
+import os
+import shutil
+import sys
+
+import numpy as np
+
+from huobanyun_match_integration import (
+    APP_SECRET, STUDENT_FIELD_MAPPING_NAMES, SYNC_TABLE_IDS, HuobanyunAPI, updated_since_filter,
+)
+from schema_cache import DEFAULT_CACHE_DIR, SchemaCache, write_json_atomic
+from table_schema import TableSchema, flatten_field_value
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SNAPSHOT_DIR = os.path.join(DEFAULT_CACHE_DIR, "snapshots")
+
+
+_INT64_MIN, _INT64_MAX = -2 ** 63, 2 ** 63 - 1
+
+
+def _column_kind(values):
+    """根据字段的所有非缺失值决定列类型"""
+    present = [value for value in values if value is not None]
+    if present and all(isinstance(value, (int, float)) and not isinstance(value, bool) for value in present):
+        if all(isinstance(value, int) and _INT64_MIN <= value <= _INT64_MAX for value in present):
+            return "int"
+        if not any(isinstance(value, int) and abs(value) > 2 ** 53 for value in present):
+            return "float"
+    return "json"
+
+
+def _encode_column(values, kind):
+    if kind == "json":
+        return np.array(["" if value is None else json.dumps(value, ensure_ascii=False) for value in values],
+                        dtype=str)
+    if kind == "int":
+        return np.array([0 if value is None else value for value in values], dtype=np.int64)
+    return np.array([np.nan if value is None else value for value in values], dtype=np.float64)
+
+
+def _parse_number(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def _decode_value(value, kind, missing=False):
+    """列中的一个值还原为原始值，缺失时返回None"""
+    if kind == "json":
+        return json.loads(value) if value else None
+    if kind == "int":
+        return None if missing else int(value)
+    return None if np.isnan(value) else float(value)
+
+
+class SnapshotTable:
+    """一个表格的只读快照，列以 mmap 方式按需加载"""
+
+    def __init__(self, directory, meta):
+        self.directory = directory
+        self.table_id = meta["table_id"]
+        self.fields = meta["fields"]  # 字段配置，与 get_field_configurations 的返回值相同
+        self.columns = meta["columns"]  # {字段ID: 列类型}
+        self.numeric_columns = set(meta.get("numeric_columns", []))  # 另存了解析后数值列的字段ID
+        self.masked_columns = set(meta.get("masked_columns", []))  # 有缺失值的 "int" 列的字段ID
+        self.watermark = meta.get("watermark")
+        self.version = meta["version"]
+        self._version_dir = os.path.join(directory, self.version)
+        self._count = meta["count"]
+        self._arrays = {}
+
+    def __len__(self):
+        return self._count
+
+    def _load(self, name):
+        array = self._arrays.get(name)
+        if array is None:
+            array = np.load(os.path.join(self._version_dir, f"{name}.npy"), mmap_mode="r")
+            self._arrays[name] = array
+        return array
+
+    @property
+    def item_ids(self):
+        return self._load("item_id")
+
+    @property
+    def updated_on(self):
+        return self._load("updated_on")
+
+    def schema(self):
+        return TableSchema(self.table_id, self.fields)
+
+    def column(self, field_id):
+        """字段的原始列 (mmap 数组)；"int" 列为 int64 (缺失处为0，见 missing())，"float" 列为 float64，其他为 JSON 文本"""
+        if field_id not in self.columns:
+            raise KeyError(f"快照中没有字段 {field_id} (表格ID: {self.table_id})")
+        return self._load(f"field_{field_id}")
+
+    def missing(self, field_id):
+        """数字列的缺失掩码 (布尔数组)，没有缺失值时返回None"""
+        if self.columns.get(field_id) not in ("int", "float"):
+            return None
+        array = self.column(field_id)
+        if array.dtype.kind == "f":
+            # "float" 列，以及旧版本快照中以 float64 保存的 "int" 列
+            return np.isnan(array)
+        if field_id in self.masked_columns:
+            return self._load(f"missing_{field_id}")
+        return None
+
+    def values(self, field_id, flatten=True):
+        """
+        字段的值，可直接作为 match_students_batch 的一列：
+        "float" 列和没有缺失值的 "int" 列原样返回 mmap 数组 (零拷贝)；有缺失值的 "int" 列返回 float64 副本 (缺失为NaN)；
+        其他列返回值列表，flatten 为True时展开选择字段。
+        """
+        array = self.column(field_id)
+        kind = self.columns[field_id]
+        if kind == "int" and field_id in self.masked_columns:
+            values = array.astype(np.float64)
+            values[self.missing(field_id)] = np.nan
+            return values
+        if kind != "json":
+            return array
+        if field_id in self.numeric_columns:
+            return self._load(f"number_{field_id}")
+        values = [json.loads(value) if value else None for value in array]
+        return [flatten_field_value(value) for value in values] if flatten else values
+
+    def items(self):
+        """逐条还原为 item/list 返回的记录结构 {"item_id", "updated_on", "fields"}"""
+        columns = [(field_id, kind, self.column(field_id), self.missing(field_id) if kind == "int" else None)
+                   for field_id, kind in self.columns.items()]
+        item_ids = self.item_ids
+        updated_on = self.updated_on
+        for row in range(self._count):
+            fields = {}
+            for field_id, kind, array, missing in columns:
+                value = _decode_value(array[row], kind, missing is not None and missing[row])
+                if value is not None:
+                    fields[field_id] = value
+            yield {"item_id": str(item_ids[row]), "updated_on": str(updated_on[row]) or None, "fields": fields}
+
+    def column_dict(self, field_mapping_names, flatten=True):
+        """按 {键: 字段名称} 取出各列，返回 {键: 列}；快照中没有的字段不包含在内"""
+        field_ids = self.schema().mappings(field_mapping_names)
+        return {key: self.values(field_id, flatten) for key, field_id in field_ids.items()
+                if field_id in self.columns}
+
+
+class SnapshotStore:
+    """按表格保存快照的目录"""
+
+    def __init__(self, root=None):
+        self.root = root or DEFAULT_SNAPSHOT_DIR
+
+    def _table_dir(self, table_id):
+        return os.path.join(self.root, str(table_id))
+
+    def load(self, table_id):
+        """打开表格的快照，没有快照或快照无法读取时返回None"""
+        directory = self._table_dir(table_id)
+        try:
+            with open(os.path.join(directory, "meta.json"), encoding="utf-8") as f:
+                meta = json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning("表格 %s 的快照无法读取，将全量重建: %s", table_id, e)
+            return None
+        return SnapshotTable(directory, meta)
+
+    def write(self, table_id, fields, items):
+        """把字段配置和记录写成一个新版本的快照，返回打开后的 SnapshotTable；上一个版本保留到下一次写入"""
+        directory = self._table_dir(table_id)
+        previous = self.load(table_id)
+        version = f"v{int(previous.version[1:]) + 1}" if previous else "v1"
+        version_dir = os.path.join(directory, version)
+        os.makedirs(version_dir, exist_ok=True)
+
+        # 字段配置中的字段在前，记录中出现但配置里没有的字段在后
+        field_ids = [field["field_id"] for field in fields if field.get("field_id")]
+        seen = set(field_ids)
+        for item in items:
+            for field_id in item.get("fields", {}):
+                if field_id not in seen:
+                    seen.add(field_id)
+                    field_ids.append(field_id)
+
+        columns = {}
+        numeric_columns = []
+        masked_columns = []
+        field_types = {field.get("field_id"): field.get("type") for field in fields}
+        np.save(os.path.join(version_dir, "item_id.npy"),
+                np.array([str(item["item_id"]) for item in items], dtype=str))
+        np.save(os.path.join(version_dir, "updated_on.npy"),
+                np.array([item.get("updated_on") or "" for item in items], dtype=str))
+        for field_id in field_ids:
+            values = [item.get("fields", {}).get(field_id) for item in items]
+            kind = _column_kind(values)
+            np.save(os.path.join(version_dir, f"field_{field_id}.npy"), _encode_column(values, kind))
+            columns[field_id] = kind
+            if kind == "int" and any(value is None for value in values):
+                np.save(os.path.join(version_dir, f"missing_{field_id}.npy"),
+                        np.array([value is None for value in values], dtype=bool))
+                masked_columns.append(field_id)
+            if kind == "json" and field_types.get(field_id) == "number":
+                np.save(os.path.join(version_dir, f"number_{field_id}.npy"),
+                        np.array([_parse_number(value) for value in values], dtype=np.float64))
+                numeric_columns.append(field_id)
+
+        watermark = max((item.get("updated_on") or "" for item in items), default="") or None
+        # meta.json 替换后新版本才生效，之后再删除旧版本
+        write_json_atomic(os.path.join(directory, "meta.json"), {
+            "table_id": table_id, "version": version, "fields": fields, "columns": columns,
+            "numeric_columns": numeric_columns, "masked_columns": masked_columns, "count": len(items),
+            "watermark": watermark,
+        })
+        snapshot = self.load(table_id)
+        if snapshot is None or snapshot.version != version:
+            # meta.json 未能替换，保留旧版本
+            shutil.rmtree(version_dir, ignore_errors=True)
+            return snapshot
+        self._remove_old_versions(directory, keep={version, previous.version if previous else None})
+        return snapshot
+
+    @staticmethod
+    def _remove_old_versions(directory, keep):
+        """删除 keep 之外的版本目录 (当前版本和上一个版本仍可能有读取者)"""
+        for name in os.listdir(directory):
+            path = os.path.join(directory, name)
+            if name not in keep and name.startswith("v") and name[1:].isdigit() and os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors=True)
+
+    def refresh(self, huoban_api, table_id, full=False):
+        """
+        从伙伴云更新表格的快照，返回 SnapshotTable。
+        已有快照时只读取水位线之后修改过的记录并按 item_id 合并；full 为True或没有快照时全量读取。
+        """
+        current = None if full else self.load(table_id)
+        fields = huoban_api.get_field_configurations(table_id)
+        if current is None or not current.watermark:
+            items = list(huoban_api.iter_table_items(table_id))
+            logger.info("表格 %s 全量快照: %d 条记录", table_id, len(items))
+            return self.write(table_id, fields, items)
+
+        # 过滤条件包含水位线本身，水位线上未再修改的记录会被重复返回
+        known = dict(zip(current.item_ids.tolist(), current.updated_on.tolist()))
+        changed = [item for item in huoban_api.iter_table_items(
+                       table_id, filter_conditions=updated_since_filter(current.watermark))
+                   if known.get(str(item["item_id"])) != item.get("updated_on")]
+        if not changed and fields == current.fields:
+            logger.info("表格 %s 的快照已是最新 (%d 条记录)", table_id, len(current))
+            return current
+
+        rows = {item["item_id"]: item for item in current.items()}
+        for item in changed:
+            rows[str(item["item_id"])] = item
+        logger.info("表格 %s 增量快照: 更新 %d 条，共 %d 条记录", table_id, len(changed), len(rows))
+        return self.write(table_id, fields, list(rows.values()))
+
+    def refresh_all(self, huoban_api, table_ids=SYNC_TABLE_IDS, full=False):
+        """更新多个表格的快照，返回 {表格ID: SnapshotTable}"""
+        return {table_id: self.refresh(huoban_api, table_id, full) for table_id in table_ids}
+
+
+def student_columns(snapshot):
+    """
+    从学生表快照取出 match_students_batch 需要的列 (以及 student_name)，
+    返回 (item_ids, columns)。
+    """
+    return snapshot.item_ids, snapshot.column_dict(STUDENT_FIELD_MAPPING_NAMES)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="更新伙伴云表格的本地快照")
+    parser.add_argument("table_ids", nargs="*", help="要更新的表格ID，默认为匹配流程用到的全部表格")
+    parser.add_argument("--full", action="store_true", help="全量重建快照")
+    parser.add_argument("--root", default=DEFAULT_SNAPSHOT_DIR, help="快照目录")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    store = SnapshotStore(args.root)
+    huoban_api = HuobanyunAPI(APP_SECRET, schema_cache=SchemaCache())
+    try:
+        snapshots = store.refresh_all(huoban_api, args.table_ids or SYNC_TABLE_IDS, args.full)
+    finally:
+        huoban_api.close()
+    for table_id, snapshot in snapshots.items():
+        sys.stdout.write(f"{table_id}\t{len(snapshot)}\t{snapshot.watermark or ''}\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+增量同步的状态 (水位线)。
+
+每个学生表记录已处理过的最大 updated_on，下次只读取此后修改过的记录；
+每个学生记录其匹配输入的哈希，输入未变化的记录 (例如只改了备注) 不重新匹配和写入。
+同时记录上次同步使用的匹配规则和院校目录版本；两者任一变化时未修改的学生也需要重新匹配，
+reset_if_versions_changed() 清空水位线和输入哈希，本次执行全量同步。
+"""
+import hashlib
+import json
+import logging
+import os
+from dataclasses import asdict
+
+from schema_cache import DEFAULT_CACHE_DIR, write_json_atomic
+
+logger = logging.getLogger(__name__)
+
+
+def matching_input_hash(applicant, *extra):
+    """计算学生匹配输入 (NormalizedApplicant 及写入结果所需的其他值，如学生姓名、规则版本) 的哈希"""
+    payload = json.dumps([asdict(applicant), extra], sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+class SyncState:
+    """保存在 JSON 文件中的增量同步状态，调用 save() 后才落盘"""
+
+    def __init__(self, path=None):
+        self.path = path or os.path.join(DEFAULT_CACHE_DIR, "sync_state.json")
+        self.watermarks = {}  # {表格ID: 最大 updated_on}
+        self.input_hashes = {}  # {表格ID: {学生ID: 匹配输入哈希}}
+        self.versions = {}  # 上次同步使用的 {"rules": 规则指纹, "catalog": 院校目录版本}
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            logger.warning("同步状态文件 %s 无法读取，将执行全量同步: %s", self.path, e)
+            return
+        self.watermarks = data.get("watermarks", {})
+        self.input_hashes = data.get("input_hashes", {})
+        self.versions = data.get("versions", {})
+
+    def save(self):
+        write_json_atomic(self.path, {"watermarks": self.watermarks, "input_hashes": self.input_hashes,
+                                      "versions": self.versions})
+
+    def reset_if_versions_changed(self, **versions):
+        """
+        versions 与上次同步不同时清空水位线和输入哈希并记录新版本，返回True (需要全量同步)。
+        没有记录过版本的状态文件同样视为变化。
+        """
+        if versions == self.versions:
+            return False
+        logger.info("匹配规则或院校目录已变化 (%s -> %s)，执行全量同步", self.versions, versions)
+        self.watermarks = {}
+        self.input_hashes = {}
+        self.versions = dict(versions)
+        return True
+
+    def get_watermark(self, table_id):
+        return self.watermarks.get(table_id)
+
+    def advance_watermark(self, table_id, updated_on):
+        """水位线只前进不后退 (updated_on 为 "YYYY-MM-DD HH:MM:SS" 格式，可直接按字符串比较)"""
+        if updated_on and updated_on > self.watermarks.get(table_id, ""):
+            self.watermarks[table_id] = updated_on
+
+    def is_unchanged(self, table_id, student_id, input_hash):
+        return self.input_hashes.get(table_id, {}).get(str(student_id)) == input_hash
+
+    def record(self, table_id, student_id, input_hash):
+        self.input_hashes.setdefault(table_id, {})[str(student_id)] = input_hash
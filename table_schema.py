@@ -0,0 +1,67 @@
+"""
+表格字段结构与编译后的字段提取器。
+
+TableSchema 由一个表格的字段配置构建一次，保存 字段名称→字段ID 和 字段ID→字段类型；
+FieldExtractor 把 {键: 字段ID} 映射预先编译为 (键, 字段ID, 转换函数) 列表，
+对每条记录只遍历一次需要的字段。
+"""
+from schema_cache import build_field_name_index
+
+# 值本身就是标量的字段类型，提取时无需按值的结构转换
+SCALAR_FIELD_TYPES = frozenset({"text", "number", "date", "datetime"})
+
+
+def flatten_field_value(value):
+    """选择字段取 text，多选字段 (字典列表) 取各项 name 以逗号连接，其他值原样返回"""
+    if isinstance(value, dict) and "text" in value:
+        return value["text"]
+    if isinstance(value, list) and len(value) > 0 and isinstance(value[0], dict):
+        names = [option.get("name", "") for option in value if "name" in option]
+        return ", ".join(names) if names else ""
+    return value
+
+
+class FieldExtractor:
+    """把原始记录的 fields 按 {键: 字段ID} 一次性提取为 {键: 值}；flatten 为True时展开选择字段"""
+
+    def __init__(self, field_mappings, field_types=None, flatten=False):
+        self.field_mappings = dict(field_mappings)
+        field_types = field_types or {}
+        self._steps = tuple(
+            (key, field_id,
+             flatten_field_value if flatten and field_types.get(field_id) not in SCALAR_FIELD_TYPES else None)
+            for key, field_id in self.field_mappings.items()
+        )
+
+    def __call__(self, fields, into=None):
+        """提取到新字典，或提供 into 时写入该对象 (如 records 中的记录) 并返回它"""
+        data = {} if into is None else into
+        for key, field_id, convert in self._steps:
+            if field_id in fields:
+                value = fields[field_id]
+                data[key] = convert(value) if convert is not None else value
+        return data
+
+
+class TableSchema:
+    """一个表格的字段结构"""
+
+    def __init__(self, table_id, field_configs):
+        self.table_id = table_id
+        self.field_ids = build_field_name_index(field_configs)  # {字段名称: 字段ID}
+        self.field_types = {field.get("field_id", ""): field.get("type") for field in field_configs}
+
+    def field_id(self, name):
+        return self.field_ids.get(name)
+
+    def missing(self, field_mapping_names):
+        """表格中不存在的字段名称"""
+        return [name for name in field_mapping_names.values() if name not in self.field_ids]
+
+    def mappings(self, field_mapping_names):
+        """{键: 字段名称} 转换为 {键: 字段ID}，表格中不存在的字段被忽略"""
+        return {key: self.field_ids[name] for key, name in field_mapping_names.items() if name in self.field_ids}
+
+    def extractor(self, field_mapping_names, flatten=False):
+        """为 {键: 字段名称} 编译字段提取器"""
+        return FieldExtractor(self.mappings(field_mapping_names), self.field_types, flatten)
@@ -1,5 +1,16 @@
+import copy
+import itertools
 import unittest
-from Match_Algo import match_student, match_universities, match_international_schools
+from Match_Algo import (match_student, match_universities, match_international_schools, match_students_batch,
+                        normalize_applicant, NormalizedApplicant, MatchContext, match_applicant, _parse_number_text,
+                        MatchResultCache, set_match_rules)
+from instrumentation import metrics
+from match_rules import DEFAULT_RULES
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
 
 class TestMatchingAlgorithm(unittest.TestCase):
     
@@ -100,7 +111,15 @@ class TestMatchingAlgorithm(unittest.TestCase):
         self.assertEqual(result.get("matched_international_schools"), 
                          ["斯坦福美国国际学校", "加拿大国际学校", "NPS国际学校", 
                           "澳洲国际学校", "布莱顿国际学校", "多佛国际学校"])
-    
+
+    def test_international_school_without_budget(self):
+        """A blank budget matches the rule table like a budget of 0"""
+        low_budget = match_international_schools(academic_percentage=40, budget_per_year=0)
+        self.assertEqual(len(low_budget), 8)
+        self.assertEqual(match_international_schools(academic_percentage=40), low_budget)
+        self.assertEqual(match_student(application_choice="国际学校", academic_percentage=40)
+                         ["matched_international_schools"], low_budget)
+
     def test_toefl_det_matching(self):
         """Test matching based on TOEFL and DET scores"""
         result = match_student(
@@ -115,5 +134,197 @@ class TestMatchingAlgorithm(unittest.TestCase):
         )
         self.assertEqual(result.get("matched_universities"), ["新加坡国立大学", "新加坡南洋理工大学"])
 
+
+class TestNormalizedApplicant(unittest.TestCase):
+    
+    def test_raw_strings_parsed_once(self):
+        """Raw Huobanyun strings are normalized into typed fields"""
+        applicant = normalize_applicant(application_choice="申请私立大学本科", academic_percentage="72%",
+                                        gaokao_score="470", ielts_score="5.0", toefl_score="105.0",
+                                        det_score=None, language_pass=0, has_high_school_cert=1,
+                                        budget_per_year="80000", student_id="ignored")
+        self.assertEqual(applicant, NormalizedApplicant(
+            application_choice="申请私立大学本科", academic_percentage=72.0, gaokao_score=470,
+            ielts_score=5.0, toefl_score=105, det_score=None, language_pass=False,
+            has_high_school_cert=True, budget_per_year=80000.0))
+    
+    def test_unparseable_values_use_defaults(self):
+        applicant = normalize_applicant(academic_percentage="N/A", gaokao_score="无", ielts_score=["7"])
+        self.assertEqual(applicant.academic_percentage, 0)
+        self.assertIsNone(applicant.gaokao_score)
+        self.assertIsNone(applicant.ielts_score)
+    
+    def test_parser_cache_hits_for_repeated_strings(self):
+        _parse_number_text.cache_clear()
+        for _ in range(3):
+            normalize_applicant(academic_percentage="85%", ielts_score="6.5")
+        self.assertEqual(_parse_number_text.cache_info().misses, 2)
+    
+    def test_matching_accepts_record(self):
+        """Passing the record gives the same result as raw keyword arguments"""
+        raw = dict(application_choice="申请私立大学本科", academic_percentage="67", gaokao_score=430,
+                   ielts_score="6.5", language_pass=True, has_high_school_cert=True)
+        self.assertEqual(match_student(normalize_applicant(**raw)), match_student(**raw))
+
+
+@unittest.skipIf(np is None, "numpy 未安装")
+class TestBatchMatching(unittest.TestCase):
+    
+    def _grid_columns(self):
+        """Build a column grid covering every tier boundary and path branch"""
+        grid = list(itertools.product(
+            [None, 59.5, "60%", 64.9, 65, 70, "74.9", 75, 80, 80.5, "abc"],
+            [None, 349, 350, 400, "450", 519, 520, 600, 601],
+            [None, 5.0, 5.5, "6.0", 6.5],
+            [None, 45, 46, 59, 60, 79],
+            [None, 84, 95, 100, 105],
+            [False, True],
+            [False, True],
+        ))
+        names = ["academic_percentage", "gaokao_score", "ielts_score", "toefl_score",
+                 "det_score", "language_pass", "has_high_school_cert"]
+        columns = {name: [row[i] for row in grid] for i, name in enumerate(names)}
+        columns["application_choice"] = ["申请私立大学本科"] * len(grid)
+        return columns
+    
+    def test_batch_matches_row_by_row(self):
+        """Batch results must equal match_student called on each row"""
+        columns = self._grid_columns()
+        batch = match_students_batch(columns)
+        for i, result in enumerate(batch):
+            row = {name: values[i] for name, values in columns.items()}
+            self.assertEqual(result, match_student(**row), row)
+    
+    def test_batch_numpy_columns(self):
+        """NumPy arrays with NaN for missing scores behave like None"""
+        columns = {
+            "academic_percentage": np.array([85.0, 72.0, 50.0]),
+            "gaokao_score": np.array([np.nan, 470.0, np.nan]),
+            "ielts_score": np.array([7.0, 5.0, np.nan]),
+            "language_pass": np.array([True, False, False]),
+            "has_high_school_cert": np.array([True, True, False]),
+        }
+        results = match_students_batch(columns)
+        self.assertEqual(results[0]["matched_universities"], ["新加坡国立大学", "新加坡南洋理工大学"])
+        self.assertEqual(results[1]["path_to_university"], "进入语言班随后升入国际大一")
+        self.assertEqual(results[2], {"matched_universities": []})
+    
+    def test_batch_international_school_rows(self):
+        """International school rows fall back to match_international_schools"""
+        columns = {
+            "application_choice": ["国际学校", "申请私立大学本科"],
+            "academic_percentage": [65, 85],
+            "ielts_score": [None, 7.0],
+            "budget_per_year": [70000, 0],
+        }
+        results = match_students_batch(columns)
+        self.assertEqual(results[0], match_student(application_choice="国际学校", academic_percentage=65,
+                                                   budget_per_year=70000))
+        self.assertEqual(results[1]["matched_universities"], ["新加坡国立大学", "新加坡南洋理工大学"])
+
+class TestMatchContext(unittest.TestCase):
+
+    def setUp(self):
+        self.university_data = {
+            "private": [{"name": "私立A"}],
+            "public_undergrad": [{"name": "公立本科B"}],
+            "public_graduate": [{"name": "公立硕博C"}],
+        }
+        self.context = MatchContext.from_catalog(self.university_data, [{"name": "UWC"}])
+
+    def test_views_are_precomputed_once(self):
+        all_view = self.context.university_view(None)
+        self.assertIs(all_view, self.context.university_view("其他"))
+        self.assertEqual([u["name"] for u in all_view["public"]], ["公立本科B", "公立硕博C"])
+        self.assertEqual(self.context.university_view("Bachelor")["public"], ({"name": "公立本科B"},))
+        self.assertEqual(self.context.university_view("PhD")["public"], ({"name": "公立硕博C"},))
+        self.assertEqual(self.context.university_view("申请私立大学本科")["public"], ({"name": "公立本科B"},))
+        self.assertEqual(self.context.university_view("申请硕士")["public"], ({"name": "公立硕博C"},))
+
+    def test_version_tracks_catalog_content(self):
+        same = MatchContext.from_catalog(self.university_data, [{"name": "UWC"}])
+        changed = MatchContext.from_catalog(self.university_data, [{"name": "UWC"}, {"name": "新学校"}])
+        self.assertEqual(same.version, self.context.version)
+        self.assertNotEqual(changed.version, self.context.version)
+
+    def test_match_applicant_matches_match_student(self):
+        kwargs = dict(application_choice="申请私立大学本科", academic_percentage=85, ielts_score=7.0)
+        result = match_applicant(normalize_applicant(**kwargs), self.context)
+        catalog_universities = result.pop("catalog_universities")
+        self.assertEqual(result, match_student(**kwargs))
+        self.assertEqual(catalog_universities, ["私立A", "公立本科B"])
+
+    def test_catalog_universities_use_admission_requirements(self):
+        context = MatchContext.from_catalog({
+            "private": [{"name": "私立A", "admission_requirements": "雅思6.5，学术成绩80%", "tuition_fees": "45000"}],
+            "public_undergrad": [{"name": "公立本科B", "admission_requirements": "学术成绩90%"}],
+            "public_graduate": [],
+        }, [])
+        result = match_applicant(normalize_applicant(
+            application_choice="申请私立大学本科", academic_percentage=85, ielts_score=7.0), context)
+        self.assertEqual(result["catalog_universities"], ["私立A"])
+        self.assertNotIn("catalog_universities", match_applicant(normalize_applicant(
+            application_choice="申请私立大学本科", academic_percentage=85), MatchContext()))
+
+    def test_catalog_international_schools(self):
+        context = MatchContext.from_catalog({}, [
+            {"name": "UWC", "admission_requirements": "学术成绩90%以上", "tuition_fees": 350000.0},
+            {"name": "加拿大国际学校", "admission_requirements": "学术成绩75%以上", "tuition_fees": 250000.0},
+        ])
+        result = match_applicant(normalize_applicant(application_choice="国际学校", academic_percentage=80,
+                                                     budget_per_year=300000), context)
+        self.assertEqual(result["catalog_international_schools"], ["加拿大国际学校"])
+        self.assertEqual(result["matched_international_schools"],
+                         match_student(application_choice="国际学校", academic_percentage=80,
+                                       budget_per_year=300000)["matched_international_schools"])
+
+
+class TestMatchResultCache(unittest.TestCase):
+
+    def setUp(self):
+        self.cache = MatchResultCache(maxsize=2)
+        self.applicant = normalize_applicant(application_choice="申请私立大学本科", academic_percentage=85,
+                                             ielts_score=7.0)
+
+    def tearDown(self):
+        set_match_rules(DEFAULT_RULES)
+
+    def test_hits_return_copies(self):
+        first = self.cache.match(self.applicant)
+        first["matched_universities"].append("改动")
+        second = self.cache.match(normalize_applicant(application_choice="申请私立大学本科",
+                                                      academic_percentage="85%", ielts_score="7.0"))
+        self.assertEqual(second, match_applicant(self.applicant))
+        self.assertEqual(self.cache.stats(), {"hits": 1, "misses": 1, "size": 1})
+
+    def test_catalog_version_is_part_of_key_and_size_is_bounded(self):
+        context = MatchContext.from_catalog({"private": [{"name": "私立A"}]}, [])
+        self.assertNotIn("catalog_universities", self.cache.match(self.applicant))
+        self.assertEqual(self.cache.match(self.applicant, context)["catalog_universities"], ["私立A"])
+        self.cache.match(normalize_applicant(application_choice="国际学校", academic_percentage=70))
+        self.assertEqual(len(self.cache), 2)
+        self.assertEqual(self.cache.misses, 3)
+
+    def test_hits_count_tier_metrics(self):
+        metrics.reset()
+        self.cache.match(self.applicant)
+        self.cache.match(self.applicant)
+        self.cache.match(normalize_applicant(application_choice="国际学校", academic_percentage=70,
+                                             budget_per_year=300000))
+        self.cache.match(normalize_applicant(application_choice="国际学校", academic_percentage=70,
+                                             budget_per_year=300000))
+        self.assertEqual(metrics.get("students_matched_total", kind="university", tier="顶尖公立大学"), 2)
+        self.assertEqual(sum(metrics.snapshot()["students_matched_total"].values()), 4)
+        self.assertEqual(metrics.get("match_cache_total", result="hit"), 2)
+
+    def test_rule_change_invalidates(self):
+        self.cache.match(self.applicant)
+        rules = copy.deepcopy(DEFAULT_RULES)
+        rules["university_tiers"][0]["universities"] = ["测试大学"]
+        set_match_rules(rules)
+        self.assertEqual(self.cache.match(self.applicant)["matched_universities"], ["测试大学"])
+        self.assertEqual(self.cache.hits, 0)
+
+
 if __name__ == '__main__':
     unittest.main()
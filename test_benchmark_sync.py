@@ -0,0 +1,35 @@
+import json
+import unittest
+from unittest import mock
+
+from benchmark_sync import percentiles, run_benchmark
+
+
+class TestBenchmark(unittest.TestCase):
+
+    def test_percentiles(self):
+        stats = percentiles([i / 1e6 for i in range(1, 101)])
+        self.assertEqual(stats["p50"], 51.0)
+        self.assertEqual(stats["p99"], 99.0)
+        self.assertEqual(stats["max"], 100.0)
+        self.assertEqual(percentiles([]), {})
+
+    def test_report_is_json_serializable(self):
+        report = run_benchmark(students=50, pipeline_students=20)
+        json.dumps(report)
+        self.assertEqual(report["stages"]["match_student"]["count"], 50)
+        self.assertEqual(report["stages"]["map_student_fields"]["count"], 50)
+        pipeline = report["stages"]["match_all_students"]
+        self.assertEqual(pipeline["count"], 25)
+        self.assertEqual(set(pipeline["write_latency_us"]), {"p50", "p90", "p99", "max", "mean"})
+        self.assertTrue(pipeline["read_latency_us"])
+
+
+    def test_pipeline_only_skips_map_stage(self):
+        with mock.patch("benchmark_sync.bench_map") as bench_map:
+            report = run_benchmark(students=50, pipeline_students=10, stages=("pipeline",))
+        bench_map.assert_not_called()
+        self.assertEqual(list(report["stages"]), ["match_all_students"])
+
+if __name__ == '__main__':
+    unittest.main()
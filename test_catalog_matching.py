@@ -0,0 +1,129 @@
+import itertools
+import random
+import time
+import unittest
+
+from catalog_matching import (
+    AdmissionRequirements, SchoolCatalogIndex, UniversityCatalogIndex, parse_admission_requirements, parse_tuition,
+)
+from Match_Algo import normalize_applicant
+
+
+class TestParsing(unittest.TestCase):
+
+    def test_admission_requirements(self):
+        self.assertEqual(parse_admission_requirements("雅思6.5，高考成绩不低于520分，学术成绩80%"),
+                         AdmissionRequirements(min_percentage=80, min_gaokao=520, min_ielts=6.5))
+        self.assertEqual(parse_admission_requirements("TOEFL 90 或 Duolingo 115"),
+                         AdmissionRequirements(min_toefl=90, min_det=115))
+        self.assertEqual(parse_admission_requirements("高考成绩不低于一本线"), AdmissionRequirements())
+        self.assertEqual(parse_admission_requirements(None), AdmissionRequirements())
+
+    def test_tuition(self):
+        self.assertEqual(parse_tuition("45000"), 45000)
+        self.assertEqual(parse_tuition("SGD 45,000/年"), 45000)
+        self.assertEqual(parse_tuition("4.5万"), 45000)
+        self.assertEqual(parse_tuition(30000), 30000)
+        self.assertIsNone(parse_tuition("面议"))
+        self.assertIsNone(parse_tuition(None))
+
+
+class TestUniversityCatalogIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.index = UniversityCatalogIndex([
+            {"name": "A", "admission_requirements": "学术成绩90%，雅思7.0", "tuition_fees": "60000"},
+            {"name": "B", "admission_requirements": "学术成绩80%，雅思6.5或托福90", "tuition_fees": "40000"},
+            {"name": "C", "admission_requirements": "学术成绩70%", "tuition_fees": "20000"},
+            {"name": "D", "admission_requirements": "高考500分"},
+            {"name": "C", "admission_requirements": "学术成绩70%", "tuition_fees": "20000"},
+            {"name": ""},
+        ])
+
+    def query(self, **kwargs):
+        return self.index.query(normalize_applicant(application_choice="申请私立大学本科", **kwargs))
+
+    def test_academic_and_language_requirements(self):
+        self.assertEqual(len(self.index), 5)
+        self.assertEqual(self.query(academic_percentage=95, ielts_score=7.0, gaokao_score=520), ["A", "B", "C", "D"])
+        self.assertEqual(self.query(academic_percentage=85, toefl_score=95), ["B", "C"])
+        self.assertEqual(self.query(academic_percentage=85, ielts_score=6.0), ["C"])
+        self.assertEqual(self.query(academic_percentage=60), [])
+
+    def test_gaokao_qualifies_on_its_own(self):
+        index = UniversityCatalogIndex([
+            {"name": "NUS", "admission_requirements": "学术成绩80%或高考600分以上，雅思6.5"},
+            {"name": "只看高考", "admission_requirements": "高考550分"},
+        ])
+        query = lambda **kwargs: index.query(normalize_applicant(application_choice="申请私立大学本科", **kwargs))
+        self.assertEqual(query(academic_percentage=60, gaokao_score=650, ielts_score=7.0), ["NUS", "只看高考"])
+        self.assertEqual(query(academic_percentage=85, ielts_score=7.0), ["NUS"])
+        self.assertEqual(query(academic_percentage=60, gaokao_score=560, ielts_score=7.0), ["只看高考"])
+        self.assertEqual(query(academic_percentage=95, ielts_score=7.0), ["NUS"])
+
+    def test_budget_keeps_unknown_tuition(self):
+        self.assertEqual(self.query(academic_percentage=95, ielts_score=7.0, gaokao_score=520,
+                                    budget_per_year=40000), ["B", "C", "D"])
+        self.assertEqual(self.query(academic_percentage=95, ielts_score=7.0, budget_per_year=10000), [])
+        self.assertEqual(self.query(academic_percentage=95, ielts_score=7.0, budget_per_year=0), [])
+
+    def test_query_is_fast_on_large_catalog(self):
+        rng = random.Random(0)
+        index = UniversityCatalogIndex([
+            {"name": f"大学{i}", "admission_requirements": f"学术成绩{rng.randint(50, 95)}%，雅思{rng.choice((5.5, 6.0, 6.5))}",
+             "tuition_fees": str(rng.randint(10, 80) * 1000)}
+            for i in range(500)
+        ])
+        applicant = normalize_applicant(application_choice="申请私立大学本科", academic_percentage=75,
+                                        ielts_score=6.0, budget_per_year=50000)
+        started = time.perf_counter()
+        for _ in range(100):
+            index.query(applicant)
+        self.assertLess((time.perf_counter() - started) / 100, 0.005)
+
+
+class TestSchoolCatalogIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.index = SchoolCatalogIndex([
+            {"name": "UWC", "admission_requirements": "学术成绩90%以上", "tuition_fees": 350000.0},
+            {"name": "加拿大国际学校", "admission_requirements": "学术成绩75%以上", "tuition_fees": 250000.0},
+            {"name": "澳洲国际学校", "admission_requirements": "学术成绩75%以上", "tuition_fees": 95000.0},
+            {"name": "海外家庭学校", "tuition_fees": 60000.0},
+            {"name": "新学校", "admission_requirements": "学术成绩50%"},
+        ])
+
+    def query(self, **kwargs):
+        return self.index.query(normalize_applicant(application_choice="国际学校", **kwargs))
+
+    def test_budget_and_academic_band(self):
+        self.assertEqual(self.query(academic_percentage=95, budget_per_year=400000),
+                         ["UWC", "加拿大国际学校", "澳洲国际学校", "海外家庭学校", "新学校"])
+        # 预算在两个固定档位之间、成绩恰好等于要求时也有结果
+        self.assertEqual(self.query(academic_percentage=75, budget_per_year=95000),
+                         ["澳洲国际学校", "海外家庭学校", "新学校"])
+        self.assertEqual(self.query(academic_percentage=50, budget_per_year=50000), ["新学校"])
+
+    def test_matches_filter_and_sort(self):
+        rng = random.Random(0)
+        schools = [{"name": f"学校{i}", "admission_requirements": f"学术成绩{rng.choice((0, 50, 60, 75, 90))}%",
+                    "tuition_fees": rng.choice((None, 45000.0, 95000.0, 150000.0, 300000.0))} for i in range(200)]
+        index = SchoolCatalogIndex(schools)
+        for academic, budget in itertools.product((40, 60, 75, 95), (None, 0, 50000, 150000, 1000000)):
+            applicant = normalize_applicant(application_choice="国际学校", academic_percentage=academic,
+                                            budget_per_year=budget)
+            entries = [(school["name"], school["tuition_fees"],
+                        parse_admission_requirements(school["admission_requirements"]).min_percentage or 0.0)
+                       for school in schools]
+            expected = sorted((entry for entry in entries if entry[2] <= academic and (
+                                   entry[1] is None or budget is None or entry[1] <= budget)),
+                              key=lambda entry: (entry[1] is None, -entry[2], -(entry[1] or 0), entry[0]))
+            self.assertEqual(index.query(applicant), [entry[0] for entry in expected])
+
+    def test_zero_budget_is_a_budget(self):
+        self.assertEqual(self.query(academic_percentage=95, budget_per_year=0), ["新学校"])
+        self.assertEqual(self.query(academic_percentage=95, budget_per_year="未填写"),
+                         ["UWC", "加拿大国际学校", "澳洲国际学校", "海外家庭学校", "新学校"])
+
+if __name__ == '__main__':
+    unittest.main()
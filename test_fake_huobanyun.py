@@ -0,0 +1,188 @@
+import copy
+import os
+import random
+import tempfile
+import unittest
+
+from fake_huobanyun import MAX_LIMIT, FakeHuobanyun, install, synthetic_student
+from huobanyun_match_integration import (
+    INTERNATIONAL_SCHOOL_TABLE_ID, MATCH_RESULT_TABLE_ID, STUDENT_TABLE_1_ID, STUDENT_TABLE_2_ID, HuobanyunAPI, HuobanyunAPIError,
+    TableFetchScheduler, match_all_students, updated_since_filter,
+)
+from Match_Algo import get_match_rules, normalize_applicant, set_match_rules
+from match_rules import DEFAULT_RULES
+from rate_limit import RetryPolicy
+from sync_state import SyncState
+
+
+class TestSyntheticStudents(unittest.TestCase):
+
+    def test_distributions_cover_every_band(self):
+        rng = random.Random(0)
+        rules = get_match_rules()
+        school_rules, budgets = set(), []
+        for index in range(3000):
+            values = synthetic_student(index, rng)
+            applicant = normalize_applicant(academic_percentage=values["学术成绩"],
+                                            budget_per_year=values.get("年度预算"),
+                                            has_international_school_experience=values["有国际学校经验"])
+            school_rules.add(rules.match_school_rule(applicant.academic_percentage,
+                                                     applicant.has_international_school_experience,
+                                                     applicant.budget_per_year))
+            budgets.append(applicant.budget_per_year)
+        self.assertEqual(school_rules, {-1, 0, 1, 2})
+        self.assertIn(None, budgets)
+        # 预算落在目录学费 (4.5万到35万) 两侧
+        known = [budget for budget in budgets if budget is not None]
+        self.assertLess(min(known), 45000)
+        self.assertGreater(max(known), 350000)
+
+
+class OfflineTestCase(unittest.TestCase):
+    """HuobanyunAPI 的请求全部由进程内的 FakeHuobanyun 处理"""
+
+    def setUp(self):
+        self.api = HuobanyunAPI("secret", rate_limit=None, retry_policy=RetryPolicy(max_attempts=3, base_delay=0))
+        self.server = install(self.api)
+
+    def tearDown(self):
+        self.api.close()
+
+
+class TestFakeEndpoints(OfflineTestCase):
+
+    def test_tables_and_pagination(self):
+        table_ids = [table["table_id"] for table in self.api.get_table_list()["tables"]]
+        self.assertIn(MATCH_RESULT_TABLE_ID, table_ids)
+        self.server.add_synthetic_students(45)
+        items = list(self.api.iter_table_items(STUDENT_TABLE_1_ID, page_size=10))
+        self.assertEqual(len(items), 48)
+        self.assertEqual(len({item["item_id"] for item in items}), 48)
+        self.assertEqual(self.server.requests["item/list"], 5)
+
+    def test_pages_capped_by_server_are_not_the_end(self):
+        self.server.add_synthetic_students(1200)
+        page_size = MAX_LIMIT * 2
+        items = list(self.api.iter_table_items(STUDENT_TABLE_1_ID, page_size=page_size))
+        self.assertEqual(len({item["item_id"] for item in items}), 1203)
+        fetched = TableFetchScheduler(self.api, page_size=page_size).fetch([STUDENT_TABLE_1_ID],
+                                                                           with_field_configurations=False)
+        self.assertEqual([item["item_id"] for item in fetched[STUDENT_TABLE_1_ID]],
+                         [item["item_id"] for item in items])
+
+    def test_filters_and_writes(self):
+        created = self.api.create_item(MATCH_RESULT_TABLE_ID, {"x": "张三"})
+        self.api.update_item(created["item_id"], {"x": "李四"})
+        self.assertEqual(self.api.get_item_details(created["item_id"])["fields"], {"x": "李四"})
+        modified = list(self.api.iter_table_items(STUDENT_TABLE_2_ID,
+                                                  filter_conditions=updated_since_filter("2024-03-02 10:15:00")))
+        self.assertEqual([item["item_id"] for item in modified], ["2300000000102"])
+
+    def test_injected_errors(self):
+        self.server.fail_next(429, count=2, retry_after=0)
+        self.assertTrue(self.api.get_table_list()["tables"])
+        self.server.fail_next(503, count=3)
+        with self.assertRaises(HuobanyunAPIError):
+            self.api.get_table_list()
+        with self.assertRaises(HuobanyunAPIError) as context:
+            self.api.get_item_details("404")
+        self.assertEqual(context.exception.code, 1002)
+
+    def test_create_is_only_retried_when_not_processed(self):
+        self.server.fail_next(500)
+        with self.assertRaises(HuobanyunAPIError):
+            self.api.create_item(MATCH_RESULT_TABLE_ID, {"x": "张三"})
+        self.assertEqual(self.server.requests["item"], 1)
+        self.server.fail_next(503)
+        with self.assertRaises(HuobanyunAPIError):
+            self.api.create_item(MATCH_RESULT_TABLE_ID, {"x": "张三"})
+        self.assertEqual(self.server.requests["item"], 2)
+
+        self.server.fail_next(503, retry_after=0)
+        self.assertTrue(self.api.create_item(MATCH_RESULT_TABLE_ID, {"x": "张三"}))
+        self.server.fail_next(429, retry_after=0)
+        self.assertTrue(self.api.create_item(MATCH_RESULT_TABLE_ID, {"x": "张三"}))
+        self.assertEqual(self.server.requests["item"], 6)
+
+    def test_throttled_create_is_resent(self):
+        self.server.throttle_next()
+        self.assertTrue(self.api.create_item(MATCH_RESULT_TABLE_ID, {"x": "张三"}))
+        self.assertEqual(self.server.requests["item"], 2)
+        self.assertEqual(len(self.server.items[MATCH_RESULT_TABLE_ID]), 1)
+
+
+class TestOfflineSync(OfflineTestCase):
+
+    def test_full_sync_then_no_op_rerun(self):
+        self.server.add_synthetic_students(30, table_id=STUDENT_TABLE_2_ID)
+        results = match_all_students(self.api, fetch_concurrency=3)
+        self.assertEqual(len(results), 35)
+        self.assertEqual(len(self.server.items[MATCH_RESULT_TABLE_ID]), 35)
+        by_name = {entry["student_name"]: entry["match_result"] for entry in results}
+        self.assertEqual(by_name["张三"]["matched_universities"], ["新加坡国立大学", "新加坡南洋理工大学"])
+        self.assertIn("学生ID: 2300000000003", by_name)
+
+        writes = self.server.requests["item"] + self.server.requests["item/{id}"]
+        match_all_students(self.api, fetch_concurrency=3)
+        self.assertEqual(self.server.requests["item"] + self.server.requests["item/{id}"], writes)
+
+    def test_summary_only_streams_students(self):
+        self.server.add_synthetic_students(250, table_id=STUDENT_TABLE_2_ID)
+        summary = match_all_students(self.api, summary_only=True)
+        self.assertEqual(summary["students"], 255)
+        self.assertEqual(summary["matched"], 255)
+        self.assertEqual(sum(summary["writes"].values()), 255)
+        self.assertEqual(summary["failed"], [])
+        self.assertEqual(len(self.server.items[MATCH_RESULT_TABLE_ID]), 255)
+
+    def test_incremental_sync_picks_up_edits(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            state_path = os.path.join(tmp, "sync_state.json")
+            self.assertEqual(len(match_all_students(self.api, sync_state=SyncState(state_path))), 5)
+
+            student = self.server.items[STUDENT_TABLE_1_ID][1]
+            academic_field_id = next(field["field_id"] for field in self.server.tables[STUDENT_TABLE_1_ID]["fields"]
+                                     if field["name"] == "学术成绩")
+            self.api.update_item(student["item_id"], {academic_field_id: "95"})
+
+            results = match_all_students(self.api, sync_state=SyncState(state_path))
+            self.assertEqual([entry["student_name"] for entry in results], ["李四"])
+
+    def test_rule_change_triggers_full_rematch(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            state_path = os.path.join(tmp, "sync_state.json")
+            match_all_students(self.api, sync_state=SyncState(state_path))
+            self.assertEqual(match_all_students(self.api, sync_state=SyncState(state_path)), [])
+
+            rules = copy.deepcopy(DEFAULT_RULES)
+            rules["version"] = "v2"
+            rules["university_tiers"][0]["universities"] = ["测试大学"]
+            set_match_rules(rules)
+            self.addCleanup(set_match_rules, DEFAULT_RULES)
+            results = match_all_students(self.api, sync_state=SyncState(state_path))
+            self.assertEqual(len(results), 5)
+            by_name = {entry["student_name"]: entry["match_result"] for entry in results}
+            self.assertEqual(by_name["张三"]["matched_universities"], ["测试大学"])
+            self.assertEqual(match_all_students(self.api, sync_state=SyncState(state_path)), [])
+
+    def test_catalog_change_triggers_full_rematch(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            state_path = os.path.join(tmp, "sync_state.json")
+            match_all_students(self.api, sync_state=SyncState(state_path))
+            table_id = INTERNATIONAL_SCHOOL_TABLE_ID
+            name_field = self.server.tables[table_id]["fields"][0]["field_id"]
+            self.server.add_item(table_id, {name_field: "新国际学校"})
+            self.assertEqual(len(match_all_students(self.api, sync_state=SyncState(state_path))), 5)
+
+
+class TestLatency(unittest.TestCase):
+
+    def test_latency_is_applied(self):
+        server = FakeHuobanyun(latency=0.01).load_fixtures()
+        status, _, _ = server.handle("POST", "/table/list", {})
+        self.assertEqual(status, 200)
+        self.assertEqual(server.requests["table/list"], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,105 @@
+import unittest
+from urllib.parse import urlparse
+
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from fake_huobanyun import MAX_LIMIT, FakeHuobanyun
+from huobanyun_async import AsyncHuobanyunAPI, match_all_students_async
+from huobanyun_match_integration import (
+    API_BASE_URL, MATCH_RESULT_TABLE_ID, STUDENT_TABLE_1_ID, STUDENT_TABLE_2_ID, HuobanyunAPIError,
+)
+from rate_limit import RetryPolicy
+
+BASE_PATH = urlparse(API_BASE_URL).path
+
+
+def fake_app(server):
+    """把请求交给 FakeHuobanyun 处理的 aiohttp 应用，路径与 API_BASE_URL 相同"""
+    async def handle(request):
+        body = await request.text()
+        payload = await request.json() if body else {}
+        status, content, headers = server.handle(request.method, request.path[len(BASE_PATH):], payload)
+        return web.Response(status=status, text=content, headers=headers, content_type="application/json")
+
+    app = web.Application()
+    app.router.add_route("*", BASE_PATH + "/{path:.*}", handle)
+    return app
+
+
+class AsyncOfflineTestCase(unittest.IsolatedAsyncioTestCase):
+    """AsyncHuobanyunAPI 的请求发往本地 aiohttp 服务，由 FakeHuobanyun 处理"""
+
+    async def asyncSetUp(self):
+        self.server = FakeHuobanyun().load_fixtures()
+        self.http = TestServer(fake_app(self.server))
+        await self.http.start_server()
+        self.api = AsyncHuobanyunAPI("secret", rate_limit=None, retry_policy=RetryPolicy(max_attempts=3, base_delay=0),
+                                     base_url=str(self.http.make_url(BASE_PATH)))
+
+    async def asyncTearDown(self):
+        await self.api.close()
+        await self.http.close()
+
+
+class TestAsyncEndpoints(AsyncOfflineTestCase):
+
+    async def test_tables_and_pagination(self):
+        table_ids = [table["table_id"] for table in (await self.api.get_table_list())["tables"]]
+        self.assertIn(MATCH_RESULT_TABLE_ID, table_ids)
+        self.server.add_synthetic_students(45)
+        items = [item async for item in self.api.iter_table_items(STUDENT_TABLE_1_ID, page_size=10)]
+        self.assertEqual(len({item["item_id"] for item in items}), 48)
+        fetched = await self.api.fetch_table_items(STUDENT_TABLE_1_ID, page_size=10)
+        self.assertEqual([item["item_id"] for item in fetched], [item["item_id"] for item in items])
+
+    async def test_pages_capped_by_server_are_not_the_end(self):
+        self.server.add_synthetic_students(1200)
+        page_size = MAX_LIMIT * 2
+        items = [item async for item in self.api.iter_table_items(STUDENT_TABLE_1_ID, page_size=page_size)]
+        self.assertEqual(len({item["item_id"] for item in items}), 1203)
+        fetched = await self.api.fetch_table_items(STUDENT_TABLE_1_ID, page_size=page_size)
+        self.assertEqual([item["item_id"] for item in fetched], [item["item_id"] for item in items])
+
+    async def test_writes_and_errors(self):
+        created = await self.api.create_item(MATCH_RESULT_TABLE_ID, {"x": "张三"})
+        await self.api.update_item(created["item_id"], {"x": "李四"})
+        self.assertEqual((await self.api.get_item_details(created["item_id"]))["fields"], {"x": "李四"})
+
+        self.server.fail_next(429, count=2, retry_after=0)
+        self.assertTrue((await self.api.get_table_list())["tables"])
+        # 业务层限流的创建请求没有被处理，可以重发
+        self.server.throttle_next()
+        self.assertTrue(await self.api.create_item(MATCH_RESULT_TABLE_ID, {"x": "王五"}))
+        self.assertEqual(self.server.requests["item"], 3)
+        with self.assertRaises(HuobanyunAPIError) as context:
+            await self.api.get_item_details("404")
+        self.assertEqual(context.exception.code, 1002)
+
+
+class TestAsyncSync(AsyncOfflineTestCase):
+
+    async def test_full_sync_then_no_op_rerun(self):
+        self.server.add_synthetic_students(30, table_id=STUDENT_TABLE_2_ID)
+        results = await match_all_students_async(self.api, write_concurrency=4)
+        self.assertEqual(len(results), 35)
+        self.assertEqual(len(self.server.items[MATCH_RESULT_TABLE_ID]), 35)
+        by_name = {entry["student_name"]: entry["match_result"] for entry in results}
+        self.assertEqual(by_name["张三"]["matched_universities"], ["新加坡国立大学", "新加坡南洋理工大学"])
+        self.assertIn("学生ID: 2300000000003", by_name)
+
+        writes = self.server.requests["item"] + self.server.requests["item/{id}"]
+        await match_all_students_async(self.api)
+        self.assertEqual(self.server.requests["item"] + self.server.requests["item/{id}"], writes)
+
+    async def test_summary_only(self):
+        self.server.add_synthetic_students(250, table_id=STUDENT_TABLE_2_ID)
+        summary = await match_all_students_async(self.api, write_concurrency=2, summary_only=True)
+        self.assertEqual(summary["students"], 255)
+        self.assertEqual(sum(summary["writes"].values()), 255)
+        self.assertEqual(summary["failed"], [])
+        self.assertEqual(len(self.server.items[MATCH_RESULT_TABLE_ID]), 255)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,47 @@
+import logging
+import unittest
+
+from instrumentation import Metrics, get_row_logger, metrics, set_row_logging
+from Match_Algo import match_student
+
+
+class TestMetrics(unittest.TestCase):
+
+    def test_snapshot_and_prometheus_text(self):
+        counters = Metrics()
+        counters.inc("api_requests_total", method="POST", endpoint="item/list")
+        counters.inc("api_requests_total", 2, method="POST", endpoint="item/list")
+        counters.inc("parse_failures_total", field="雅思成绩")
+        self.assertEqual(counters.snapshot(), {
+            "api_requests_total": {"endpoint=item/list,method=POST": 3},
+            "parse_failures_total": {"field=雅思成绩": 1},
+        })
+        self.assertIn('api_requests_total{endpoint="item/list",method="POST"} 3', counters.to_prometheus())
+
+    def test_matching_counts_students_per_tier(self):
+        metrics.reset()
+        match_student(application_choice="申请私立大学本科", academic_percentage=85, ielts_score=7.0)
+        match_student(application_choice="申请私立大学本科", academic_percentage="abc")
+        self.assertEqual(metrics.get("students_matched_total", kind="university", tier="顶尖公立大学"), 1)
+        self.assertEqual(metrics.get("students_matched_total", kind="university", tier="未匹配"), 1)
+        self.assertEqual(metrics.get("parse_failures_total", field="学术成绩"), 1)
+
+
+class TestRowLogging(unittest.TestCase):
+
+    def tearDown(self):
+        set_row_logging(True)
+
+    def test_switch_disables_row_output(self):
+        row_logger = get_row_logger("Match_Algo")
+        with self.assertLogs("Match_Algo.rows", level=logging.DEBUG):
+            match_student(application_choice="申请私立大学本科", academic_percentage=85)
+
+        set_row_logging(False)
+        self.assertTrue(row_logger.disabled)
+        with self.assertNoLogs("Match_Algo.rows", level=logging.DEBUG):
+            match_student(application_choice="申请私立大学本科", academic_percentage=85)
+
+
+if __name__ == '__main__':
+    unittest.main()
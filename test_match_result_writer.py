@@ -0,0 +1,57 @@
+import unittest
+from unittest import mock
+
+from huobanyun_match_integration import (
+    STUDENT_LOCK_STRIPES, WRITE_CREATED, WRITE_FAILED, WRITE_UPDATED, HuobanyunAPI, MatchResultWriter,
+)
+from test_sync_state import FakeTables
+
+
+def result_entry(student_id, name, universities):
+    return {"student_id": student_id, "student_table_id": "t1", "student_name": name,
+            "match_result": {"matched_universities": universities}}
+
+
+class TestMatchResultWriter(unittest.TestCase):
+
+    def setUp(self):
+        self.tables = FakeTables()
+        self.api = HuobanyunAPI("secret", rate_limit=None)
+        self.api.api_request = mock.Mock(side_effect=self.tables)
+
+    def tearDown(self):
+        self.api.close()
+
+    def test_coalesces_pending_writes_per_student(self):
+        existing_matches = {"李四": {"item_id": 7, "fields": {}}}
+        writer = MatchResultWriter(self.api, existing_matches, max_workers=2, batch_size=10)
+        writer.submit(result_entry(1, "张三", ["A大学"]))
+        writer.submit(result_entry(1, "张三", ["B大学"]))
+        writer.submit(result_entry(2, "李四", ["C大学"]))
+        report = writer.close()
+
+        self.assertEqual(report["coalesced"], 1)
+        self.assertEqual(report["counts"], {WRITE_CREATED: 1, WRITE_UPDATED: 1})
+        self.assertEqual(self.tables.writes, 2)
+        self.assertEqual(self.tables.written_results["张三"], "大学匹配: B大学")
+        self.assertIs(writer.close(), report)
+
+    def test_reports_failed_items(self):
+        with mock.patch("huobanyun_match_integration.update_match_result", return_value=WRITE_FAILED):
+            with MatchResultWriter(self.api, {}, max_workers=2, batch_size=1) as writer:
+                for student_id in range(3):
+                    writer.submit(result_entry(student_id, f"学生{student_id}", []))
+                report = writer.close()
+        self.assertEqual(sorted(item["student_id"] for item in report["failed"]), [0, 1, 2])
+
+
+    def test_lock_count_does_not_grow_with_students(self):
+        with MatchResultWriter(self.api, {}, max_workers=4, batch_size=10) as writer:
+            for student_id in range(200):
+                writer.submit(result_entry(student_id, f"学生{student_id}", ["A大学"]))
+            report = writer.close()
+        self.assertEqual(report["counts"], {WRITE_CREATED: 200})
+        self.assertEqual(len(writer._student_locks), STUDENT_LOCK_STRIPES)
+
+if __name__ == '__main__':
+    unittest.main()
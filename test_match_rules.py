@@ -0,0 +1,74 @@
+import copy
+import json
+import os
+import tempfile
+import unittest
+
+import Match_Algo
+from match_rules import DEFAULT_RULES, compile_rules, load_rules, validate
+
+
+class TestMatchRules(unittest.TestCase):
+
+    def setUp(self):
+        self.rules = copy.deepcopy(DEFAULT_RULES)
+
+    def tearDown(self):
+        Match_Algo.set_match_rules(DEFAULT_RULES)
+
+    def test_interval_boundaries(self):
+        """Open and closed interval ends are resolved by the bisect lookup"""
+        compiled = compile_rules(self.rules)
+        self.assertEqual(compiled.match_tier(80, None, 7.0, None, None), 1)
+        self.assertEqual(compiled.match_tier(80.01, None, 7.0, None, None), 0)
+        self.assertEqual(compiled.match_tier(75, None, None, None, None), -1)
+        self.assertEqual(compiled.match_tier(74.99, None, None, None, None), 2)
+        self.assertEqual(compiled.match_tier(None, 350, None, None, None), 4)
+        self.assertEqual(compiled.match_tier(59.99, 349, None, None, None), -1)
+
+    def test_school_bands_have_no_gaps(self):
+        """Budgets between the bands and academic exactly 50 still land in a school band"""
+        compiled = compile_rules(self.rules)
+        self.assertEqual(compiled.match_school_rule(65, False, 95000), 1)
+        self.assertEqual(compiled.match_school_rule(50, False, 70000), 1)
+        self.assertEqual(compiled.match_school_rule(50, False, 30000), 2)
+        self.assertEqual(compiled.match_school_rule(75, False, 100000), 0)
+
+    def test_language_falls_through_to_gaokao_tier(self):
+        """A student failing tier 0 language can still match tier 1 through gaokao"""
+        compiled = compile_rules(self.rules)
+        self.assertEqual(compiled.match_tier(85, 550, 6.0, None, None), 1)
+
+    def test_overlapping_tiers_rejected(self):
+        self.rules["university_tiers"][1]["academic"] = {"gte": 75, "lte": 85}
+        with self.assertRaises(ValueError):
+            validate(self.rules)
+
+    def test_empty_interval_rejected(self):
+        self.rules["university_tiers"][0]["gaokao"] = {"gt": 600, "lt": 600}
+        with self.assertRaises(ValueError):
+            validate(self.rules)
+
+    def test_unknown_interval_key_rejected(self):
+        self.rules["university_tiers"][0]["academic"] = {"above": 80}
+        with self.assertRaises(ValueError):
+            validate(self.rules)
+
+    def test_rules_loaded_from_file(self):
+        """Thresholds changed in a JSON file take effect without code changes"""
+        self.rules["version"] = "2026-intake"
+        self.rules["university_tiers"][0]["academic"] = {"gt": 90}
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "rules.json")
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(self.rules, f, ensure_ascii=False)
+            Match_Algo.set_match_rules(load_rules(path))
+
+        self.assertEqual(Match_Algo.get_match_rules().version, "2026-intake")
+        result = Match_Algo.match_student(application_choice="申请私立大学本科", academic_percentage=85,
+                                          ielts_score=7.0, language_pass=True, has_high_school_cert=True)
+        self.assertEqual(result["matched_universities"], [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,64 @@
+import copy
+import random
+import unittest
+
+from fake_huobanyun import synthetic_student
+from Match_Algo import MatchContext, match_applicant, normalize_applicant, set_match_rules
+from match_rules import DEFAULT_RULES
+from parallel_matching import parallel_map
+
+CATALOG = MatchContext()
+
+
+def applicants(count):
+    rng = random.Random(1)
+    students = []
+    for index in range(count):
+        values = synthetic_student(index, rng)
+        students.append(normalize_applicant(
+            application_choice=values["申请类型"]["text"], academic_percentage=values["学术成绩"],
+            ielts_score=values.get("雅思成绩"), gaokao_score=values.get("高考成绩"),
+            has_international_school_experience=values["有国际学校经验"], budget_per_year=values.get("年度预算")))
+    return students
+
+
+class TestParallelMap(unittest.TestCase):
+
+    def tearDown(self):
+        set_match_rules(DEFAULT_RULES)
+
+    def test_results_in_input_order(self):
+        inputs = applicants(120)
+        expected = [match_applicant(applicant, CATALOG) for applicant in inputs]
+        results = list(parallel_map(match_applicant, inputs, CATALOG, max_workers=2, chunk_size=7,
+                                    min_parallel_items=0))
+        self.assertEqual(results, expected)
+
+    def test_generator_input_is_consumed_lazily(self):
+        inputs = applicants(60)
+        consumed = []
+
+        def source():
+            for applicant in inputs:
+                consumed.append(applicant)
+                yield applicant
+
+        results = parallel_map(match_applicant, source(), CATALOG, max_workers=2, chunk_size=5,
+                               min_parallel_items=0)
+        self.assertEqual(next(results), match_applicant(inputs[0], CATALOG))
+        self.assertLess(len(consumed), len(inputs))
+        self.assertEqual(len(list(results)), 59)
+
+    def test_workers_use_current_rules(self):
+        rules = copy.deepcopy(DEFAULT_RULES)
+        rules["version"] = "test"
+        rules["university_tiers"][0]["universities"] = ["测试大学"]
+        set_match_rules(rules)
+        applicant = normalize_applicant(application_choice="申请私立大学本科", academic_percentage=85, ielts_score=7.0)
+        results = list(parallel_map(match_applicant, [applicant] * 4, CATALOG, max_workers=2, chunk_size=1,
+                                    min_parallel_items=0))
+        self.assertEqual([result["matched_universities"] for result in results], [["测试大学"]] * 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
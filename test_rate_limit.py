@@ -0,0 +1,112 @@
+import unittest
+from unittest import mock
+
+from huobanyun_match_integration import API_BASE_URL, HuobanyunAPI, HuobanyunAPIError
+from rate_limit import RetryPolicy, TokenBucket, parse_retry_after
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def fake_response(status_code, body=None, headers=None):
+    response = mock.Mock()
+    response.status_code = status_code
+    response.headers = headers or {}
+    response.json.return_value = body or {}
+    response.text = str(body)
+    return response
+
+
+class TestTokenBucket(unittest.TestCase):
+
+    def test_burst_then_rate(self):
+        clock = FakeClock()
+        bucket = TokenBucket(rate=2, capacity=2, clock=clock)
+        self.assertEqual(bucket.reserve(), 0)
+        self.assertEqual(bucket.reserve(), 0)
+        self.assertAlmostEqual(bucket.reserve(), 0.5)
+        self.assertAlmostEqual(bucket.reserve(), 1.0)
+        clock.now = 10
+        self.assertEqual(bucket.reserve(), 0)
+
+    def test_pause_applies_to_all_callers(self):
+        clock = FakeClock()
+        bucket = TokenBucket(rate=None, clock=clock)
+        bucket.pause(3)
+        self.assertEqual(bucket.reserve(), 3)
+        clock.now = 5
+        self.assertEqual(bucket.reserve(), 0)
+
+
+class TestRetryPolicy(unittest.TestCase):
+
+    def test_retryable_classification(self):
+        policy = RetryPolicy(retryable_business_codes={1001})
+        self.assertTrue(policy.is_retryable(status_code=429))
+        self.assertTrue(policy.is_retryable(status_code=503))
+        self.assertFalse(policy.is_retryable(status_code=400))
+        self.assertTrue(policy.is_retryable(business_code=1001))
+        self.assertTrue(policy.is_retryable(business_code=9, message="请求过于频繁"))
+        self.assertFalse(policy.is_retryable(business_code=9, message="字段不存在"))
+
+    def test_non_idempotent_resend(self):
+        policy = RetryPolicy()
+        self.assertTrue(policy.can_resend(429))
+        self.assertTrue(policy.can_resend(503, retry_after=1.0))
+        for status_code in (500, 502, 503, 504, None):
+            self.assertFalse(policy.can_resend(status_code))
+        self.assertTrue(policy.can_resend(200, business_code=429, message="请求过于频繁"))
+        self.assertFalse(policy.can_resend(200, business_code=1002, message="资源不存在"))
+
+    def test_backoff_bounds_and_retry_after(self):
+        policy = RetryPolicy(base_delay=1, max_delay=4)
+        for attempt in range(1, 6):
+            self.assertLessEqual(policy.delay(attempt), min(4, 2 ** (attempt - 1)))
+        self.assertEqual(policy.delay(3, retry_after=3), 3)
+        # Retry-After 同样不超过 max_delay
+        self.assertEqual(policy.delay(3, retry_after=3600), 4)
+
+    def test_parse_retry_after(self):
+        self.assertEqual(parse_retry_after("2"), 2.0)
+        self.assertIsNone(parse_retry_after(None))
+        self.assertEqual(parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT"), 0.0)
+
+
+class TestApiRequestRetry(unittest.TestCase):
+
+    def setUp(self):
+        self.api = HuobanyunAPI("secret", rate_limit=None, retry_policy=RetryPolicy(max_attempts=3, base_delay=0))
+        self.url = f"{API_BASE_URL}/item/list"
+
+    @mock.patch("huobanyun_match_integration.time.sleep")
+    def test_retries_throttled_request(self, sleep):
+        self.api.session.post = mock.Mock(side_effect=[
+            fake_response(429, headers={"Retry-After": "1"}),
+            fake_response(200, {"code": 0, "data": {"items": []}}),
+        ])
+        self.assertEqual(self.api.api_request("POST", self.url, {}), {"items": []})
+        self.assertEqual(self.api.session.post.call_count, 2)
+        sleep.assert_any_call(1.0)
+
+    @mock.patch("huobanyun_match_integration.time.sleep")
+    def test_gives_up_after_max_attempts(self, sleep):
+        self.api.session.post = mock.Mock(return_value=fake_response(503))
+        with self.assertRaises(HuobanyunAPIError):
+            self.api.api_request("POST", self.url, {})
+        self.assertEqual(self.api.session.post.call_count, 3)
+
+    def test_client_errors_not_retried(self):
+        self.api.session.post = mock.Mock(return_value=fake_response(400))
+        with self.assertRaises(HuobanyunAPIError) as context:
+            self.api.api_request("POST", self.url, {})
+        self.assertEqual(context.exception.status_code, 400)
+        self.assertEqual(self.api.session.post.call_count, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,43 @@
+import pickle
+import sys
+import unittest
+
+from huobanyun_match_integration import map_intl_school_fields
+from records import InternationalSchool, Student, University
+from Match_Algo import MatchContext, normalize_applicant
+
+
+class TestRecords(unittest.TestCase):
+
+    def test_behaves_like_dict(self):
+        student = Student(student_id="1", academic_percentage="85", ielts_score=None)
+        self.assertEqual(student, {"student_id": "1", "academic_percentage": "85", "ielts_score": None})
+        self.assertEqual(student.get("budget_per_year", 0), 0)
+        self.assertNotIn("budget_per_year", student)
+        self.assertEqual(normalize_applicant(**student), normalize_applicant(academic_percentage="85"))
+        with self.assertRaises(KeyError):
+            student["student_name"]
+
+        student["student_name"] = "张三"
+        student["备注"] = "未声明的键"
+        self.assertEqual(list(student), ["student_id", "student_name", "academic_percentage", "ielts_score", "备注"])
+        del student["备注"]
+        self.assertEqual(len(student), 4)
+
+    def test_no_instance_dict(self):
+        university = University(name="新加坡国立大学", tuition_fees="45000")
+        self.assertFalse(hasattr(university, "__dict__"))
+        self.assertLess(sys.getsizeof(university), sys.getsizeof(dict(university)))
+        self.assertEqual(pickle.loads(pickle.dumps(university)), university)
+
+    def test_mapping_builds_records_and_catalog_version(self):
+        school = map_intl_school_fields({"item_id": 7, "fields": {"a": "某国际学校", "b": "120000"}},
+                                        {"name": "a", "tuition_fees": "b"})
+        self.assertIsInstance(school, InternationalSchool)
+        self.assertEqual(school, {"name": "某国际学校", "tuition_fees": 120000.0, "school_id": 7})
+        self.assertEqual(MatchContext.from_catalog({}, [school]).version,
+                         MatchContext.from_catalog({}, [dict(school)]).version)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,80 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from huobanyun_match_integration import HuobanyunAPI, get_field_mappings
+from schema_cache import SchemaCache
+from test_rate_limit import FakeClock
+
+FIELDS = [{"name": "学生姓名", "field_id": "101"}, {"name": "学术成绩", "field_id": "102"}]
+
+
+class TestSchemaCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "schema_cache.json")
+        self.clock = FakeClock()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_persists_across_instances_until_ttl(self):
+        SchemaCache(self.path, ttl=60, clock=self.clock).put("t1", FIELDS)
+        cache = SchemaCache(self.path, ttl=60, clock=self.clock)
+        self.assertEqual(cache.get("t1"), FIELDS)
+        self.assertEqual(cache.get_name_index("t1"), {"学生姓名": "101", "学术成绩": "102"})
+        self.clock.now = 61
+        self.assertIsNone(cache.get("t1"))
+
+    def test_invalidate_and_corrupt_file(self):
+        cache = SchemaCache(self.path, clock=self.clock)
+        cache.put("t1", FIELDS)
+        cache.invalidate("t1")
+        self.assertIsNone(SchemaCache(self.path, clock=self.clock).get("t1"))
+        with open(self.path, "w") as f:
+            f.write("{not json")
+        self.assertIsNone(SchemaCache(self.path, clock=self.clock).get("t1"))
+
+
+class TestFieldMappingsWithCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cache = SchemaCache(os.path.join(self.tmp.name, "schema_cache.json"))
+        self.api = HuobanyunAPI("secret", rate_limit=None, schema_cache=self.cache)
+        self.api.get_table_details = mock.Mock(return_value={"table": {"fields": FIELDS}})
+
+    def tearDown(self):
+        self.api.close()
+        self.tmp.cleanup()
+
+    def test_warm_start_skips_table_details(self):
+        self.cache.put("t1", FIELDS)
+        mappings = get_field_mappings(self.api, "t1", {"name": "学生姓名", "academic": "学术成绩"})
+        self.assertEqual(mappings, {"name": "101", "academic": "102"})
+        self.api.get_table_details.assert_not_called()
+
+    def test_missing_field_refreshes_stale_cache_once(self):
+        self.cache.put("t1", FIELDS[:1])
+        names = {"name": "学生姓名", "academic": "学术成绩", "other": "不存在的字段"}
+        self.assertEqual(get_field_mappings(self.api, "t1", names), {"name": "101", "academic": "102"})
+        get_field_mappings(self.api, "t1", names)
+        self.assertEqual(self.api.get_table_details.call_count, 1)
+        self.assertEqual(self.cache.get("t1"), FIELDS)
+
+    def test_refresh_is_tracked_per_client_and_run(self):
+        self.cache.put("t1", FIELDS)
+        names = {"name": "学生姓名", "other": "不存在的字段"}
+        get_field_mappings(self.api, "t1", names)
+        get_field_mappings(self.api, "t1", names)
+        self.assertEqual(self.api.get_table_details.call_count, 1)
+        # 下一次运行 (match_all_students 清空记录) 可以再重新获取一次
+        self.api.refreshed_schema_tables.clear()
+        get_field_mappings(self.api, "t1", names)
+        self.assertEqual(self.api.get_table_details.call_count, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,87 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from fake_huobanyun import install
+from huobanyun_match_integration import STUDENT_TABLE_1_ID, STUDENT_TABLE_2_ID, HuobanyunAPI
+from Match_Algo import match_student, match_students_batch
+from rate_limit import RetryPolicy
+from snapshot_store import SnapshotStore, student_columns
+
+
+class TestSnapshotStore(unittest.TestCase):
+
+    def setUp(self):
+        self.api = HuobanyunAPI("secret", rate_limit=None, retry_policy=RetryPolicy(max_attempts=3, base_delay=0))
+        self.server = install(self.api)
+        self.tmp = tempfile.TemporaryDirectory()
+        self.store = SnapshotStore(self.tmp.name)
+
+    def tearDown(self):
+        self.api.close()
+        self.tmp.cleanup()
+
+    def test_items_round_trip(self):
+        snapshot = self.store.refresh(self.api, STUDENT_TABLE_1_ID)
+        expected = [{"item_id": item["item_id"], "updated_on": item["updated_on"], "fields": item["fields"]}
+                    for item in self.server.items[STUDENT_TABLE_1_ID]]
+        self.assertEqual(list(snapshot.items()), expected)
+        self.assertEqual(snapshot.watermark, "2024-03-01 09:10:00")
+        self.assertIsInstance(snapshot.item_ids, np.memmap)
+
+    def test_incremental_refresh_merges_changed_items(self):
+        self.store.refresh(self.api, STUDENT_TABLE_2_ID)
+        listed = self.server.requests["item/list"]
+        self.assertEqual(self.store.refresh(self.api, STUDENT_TABLE_2_ID).version, "v1")
+
+        student = self.server.items[STUDENT_TABLE_2_ID][0]
+        name_field = self.api.get_field_name_index(STUDENT_TABLE_2_ID)["学生姓名"]
+        self.api.update_item(student["item_id"], {name_field: "改名"})
+        self.server.add_synthetic_students(3, table_id=STUDENT_TABLE_2_ID)
+
+        snapshot = self.store.refresh(self.api, STUDENT_TABLE_2_ID)
+        self.assertEqual(snapshot.version, "v2")
+        self.assertEqual(len(snapshot), 5)
+        self.assertEqual(self.server.requests["item/list"] - listed, 2)
+        names = snapshot.column_dict({"student_name": "学生姓名"})["student_name"]
+        self.assertEqual(names[0], "改名")
+        self.assertEqual(list(snapshot.item_ids), [item["item_id"] for item in self.server.items[STUDENT_TABLE_2_ID]])
+
+    def test_previous_version_stays_readable(self):
+        old = self.store.refresh(self.api, STUDENT_TABLE_2_ID, full=True)
+        self.store.refresh(self.api, STUDENT_TABLE_2_ID, full=True)
+        # 旧版本的列在写入之后才第一次加载
+        self.assertEqual(len(list(old.items())), len(old))
+
+        self.store.refresh(self.api, STUDENT_TABLE_2_ID, full=True)
+        directory = self.store._table_dir(STUDENT_TABLE_2_ID)
+        self.assertEqual(sorted(name for name in os.listdir(directory) if name != "meta.json"), ["v2", "v3"])
+
+    def test_int_columns_are_int64(self):
+        big = 2 ** 53 + 1
+        fields = [{"field_id": "1", "name": "编号"}, {"field_id": "2", "name": "名次"}]
+        items = [{"item_id": "a", "fields": {"1": big, "2": 3}}, {"item_id": "b", "fields": {"1": 7}}]
+        snapshot = self.store.write("t1", fields, items)
+        self.assertEqual(snapshot.columns, {"1": "int", "2": "int"})
+        self.assertEqual(snapshot.values("1").dtype, np.int64)
+        self.assertIsInstance(snapshot.values("1"), np.memmap)
+        self.assertEqual(int(snapshot.values("1")[0]), big)
+        # 有缺失值的整数列读取为 float64，缺失为NaN
+        self.assertTrue(np.isnan(snapshot.values("2")[1]))
+        self.assertEqual([item["fields"] for item in snapshot.items()], [item["fields"] for item in items])
+
+    def test_student_columns_feed_batch_matching(self):
+        self.server.add_synthetic_students(50)
+        snapshot = self.store.refresh(self.api, STUDENT_TABLE_1_ID)
+        item_ids, columns = student_columns(snapshot)
+        self.assertEqual(columns["academic_percentage"].dtype, np.float64)
+        results = match_students_batch({key: value for key, value in columns.items() if key != "student_name"})
+        self.assertEqual(len(results), len(item_ids))
+        self.assertEqual(results[0], match_student(application_choice="申请私立大学本科", academic_percentage="85",
+                                                   ielts_score="7.0", has_high_school_cert=True))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,141 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from huobanyun_match_integration import (
+    API_BASE_URL, MATCH_RESULT_TABLE_ID, STUDENT_TABLE_1_ID, WRITE_FAILED, HuobanyunAPI,
+    fill_missing_student_names, match_all_students,
+)
+from sync_state import SyncState
+
+STUDENT_FIELDS = [{"name": "学生姓名", "field_id": "s1"}, {"name": "申请类型", "field_id": "s2"},
+                  {"name": "学术成绩", "field_id": "s3"}]
+RESULT_FIELDS = [{"name": "学生姓名", "field_id": "r1"}, {"name": "配对学校名称", "field_id": "r2"}]
+
+
+def student_item(item_id, name, academic, updated_on):
+    return {"item_id": item_id, "updated_on": updated_on,
+            "fields": {"s1": name, "s2": "申请私立大学本科", "s3": academic}}
+
+
+class FakeTables:
+    """按URL路由 api_request，记录 item/list 的过滤条件和写入次数"""
+
+    def __init__(self):
+        self.items = {STUDENT_TABLE_1_ID: [student_item(1, "张三", "85", "2024-01-01 10:00:00"),
+                                           student_item(2, "李四", "65", "2024-01-01 11:00:00")]}
+        self.filters = []
+        self.writes = 0
+        self.methods = []
+        self.written_results = {}
+
+    def __call__(self, method, url, payload=None, **kwargs):
+        path = url[len(API_BASE_URL) + 1:]
+        if path == "item/list":
+            table_id = payload["table_id"]
+            items = self.items.get(table_id, [])
+            if "filter" in payload:
+                self.filters.append(payload["filter"])
+                condition = payload["filter"]["and"][0]
+                if condition["field"] == "item_id":
+                    items = [item for item in items if item["item_id"] in condition["query"]["in"]]
+                else:
+                    items = [item for item in items if item["updated_on"] >= condition["query"]["gte"]]
+            offset = payload.get("offset") or 0
+            return {"items": items[offset:], "total": len(items)}
+        if path.startswith("table/"):
+            table_id = path.split("/")[1]
+            fields = RESULT_FIELDS if table_id == MATCH_RESULT_TABLE_ID else STUDENT_FIELDS
+            return {"table": {"fields": fields}}
+        self.writes += 1
+        self.methods.append(method)
+        self.written_results[payload["fields"]["r1"]] = payload["fields"]["r2"]
+        return {"item": {"item_id": 1000 + self.writes}}
+
+
+class TestIncrementalSync(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "sync_state.json")
+        self.tables = FakeTables()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def run_sync(self):
+        api = HuobanyunAPI("secret", rate_limit=None)
+        api.api_request = mock.Mock(side_effect=self.tables)
+        try:
+            return match_all_students(api, fetch_concurrency=2, sync_state=SyncState(self.path))
+        finally:
+            api.close()
+
+    def test_second_run_only_rematches_changed_students(self):
+        self.assertEqual(len(self.run_sync()), 2)
+        self.assertEqual(SyncState(self.path).get_watermark(STUDENT_TABLE_1_ID), "2024-01-01 11:00:00")
+
+        # 一条记录只改了修改时间 (输入不变)，另一条修改了成绩
+        self.tables.items[STUDENT_TABLE_1_ID] = [student_item(1, "张三", "85", "2024-01-02 09:00:00"),
+                                                 student_item(2, "李四", "75", "2024-01-02 10:00:00")]
+        writes_before = self.tables.writes
+        results = self.run_sync()
+
+        self.assertEqual([entry["student_id"] for entry in results], [2])
+        self.assertEqual(self.tables.writes - writes_before, 1)
+        self.assertIn({"and": [{"field": "updated_on", "query": {"gte": "2024-01-01 11:00:00"}}]},
+                      self.tables.filters)
+        self.assertEqual(SyncState(self.path).get_watermark(STUDENT_TABLE_1_ID), "2024-01-02 10:00:00")
+
+    def test_failed_write_keeps_watermark(self):
+        self.run_sync()
+        self.tables.items[STUDENT_TABLE_1_ID][1] = student_item(2, "李四", "75", "2024-01-02 10:00:00")
+        with mock.patch("huobanyun_match_integration.update_match_result", return_value=WRITE_FAILED):
+            self.assertEqual(len(self.run_sync()), 1)
+        self.assertEqual(SyncState(self.path).get_watermark(STUDENT_TABLE_1_ID), "2024-01-01 11:00:00")
+
+
+class TestSkipUnchangedResults(unittest.TestCase):
+
+    def test_full_rerun_skips_identical_results(self):
+        tables = FakeTables()
+        api = HuobanyunAPI("secret", rate_limit=None)
+        api.api_request = mock.Mock(side_effect=tables)
+        try:
+            match_all_students(api, fetch_concurrency=2)
+            self.assertEqual(tables.writes, 2)
+
+            # 结果表中已有相同内容，全量重跑不再写入
+            tables.items[MATCH_RESULT_TABLE_ID] = [
+                {"item_id": 1000 + index, "fields": {"r1": name, "r2": text}}
+                for index, (name, text) in enumerate(tables.written_results.items())
+            ]
+            tables.items[STUDENT_TABLE_1_ID][1]["fields"]["s3"] = "95"
+            match_all_students(api, fetch_concurrency=2)
+            self.assertEqual(tables.writes, 3)
+            self.assertEqual(tables.methods[-1], "PUT")
+        finally:
+            api.close()
+
+
+class TestFillMissingStudentNames(unittest.TestCase):
+
+    def test_names_resolved_with_one_batched_request(self):
+        tables = FakeTables()
+        api = HuobanyunAPI("secret", rate_limit=None)
+        api.api_request = mock.Mock(side_effect=tables)
+        students = [{"student_id": 1, "table_id": STUDENT_TABLE_1_ID},
+                    {"student_id": 2, "table_id": STUDENT_TABLE_1_ID, "student_name": ""},
+                    {"student_id": 3, "table_id": STUDENT_TABLE_1_ID, "student_name": "王五"},
+                    {"student_id": 9, "table_id": STUDENT_TABLE_1_ID}]
+        try:
+            fill_missing_student_names(api, students)
+        finally:
+            api.close()
+        self.assertEqual([student["student_name"] for student in students], ["张三", "李四", "王五", "学生ID: 9"])
+        self.assertEqual(tables.filters, [{"and": [{"field": "item_id", "query": {"in": [1, 2, 9]}}]}])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,48 @@
+import unittest
+
+from huobanyun_match_integration import STUDENT_FIELD_MAPPING_NAMES, map_intl_school_fields, map_student_fields
+from table_schema import TableSchema, flatten_field_value
+
+FIELDS = [
+    {"name": "学生姓名", "field_id": "1", "type": "text"},
+    {"name": "申请类型", "field_id": "2", "type": "category"},
+    {"name": "学术成绩", "field_id": "3", "type": "number"},
+    {"name": "有国际学校经验", "field_id": "4", "type": "category"},
+    {"name": "雅思成绩", "field_id": "5"},
+]
+
+
+class TestTableSchema(unittest.TestCase):
+
+    def setUp(self):
+        self.schema = TableSchema("t1", FIELDS)
+
+    def test_mappings_and_missing(self):
+        names = {"name": "学生姓名", "academic": "学术成绩", "budget": "年度预算"}
+        self.assertEqual(self.schema.mappings(names), {"name": "1", "academic": "3"})
+        self.assertEqual(self.schema.missing(names), ["年度预算"])
+        self.assertEqual(self.schema.field_types["2"], "category")
+
+    def test_extractor_flattens_option_fields(self):
+        extract = self.schema.extractor(STUDENT_FIELD_MAPPING_NAMES, flatten=True)
+        record = extract({"1": "张三", "2": {"id": 1, "text": "申请私立大学本科"}, "3": "85",
+                          "4": [{"name": "是"}, {"name": "两年"}], "5": 7.0, "99": "无关字段"})
+        self.assertEqual(record, {"student_name": "张三", "application_choice": "申请私立大学本科",
+                                  "academic_percentage": "85", "has_international_school_experience": "是, 两年",
+                                  "ielts_score": 7.0})
+        self.assertEqual(flatten_field_value([{"id": 1}]), "")
+
+    def test_map_functions_accept_extractor_or_mapping_dict(self):
+        item = {"item_id": 42, "fields": {"1": "张三", "2": {"text": "申请私立大学本科"}, "3": "85"}}
+        extract = self.schema.extractor(STUDENT_FIELD_MAPPING_NAMES, flatten=True)
+        from_dict = map_student_fields(item, self.schema.mappings(STUDENT_FIELD_MAPPING_NAMES), table_type=1)
+        self.assertEqual(map_student_fields(item, extract, table_type=1), from_dict)
+        self.assertEqual(from_dict["application_choice"], "申请私立大学本科")
+
+        school = map_intl_school_fields({"item_id": 7, "fields": {"a": "某国际学校", "b": "120000"}},
+                                        {"name": "a", "tuition_fees": "b"})
+        self.assertEqual(school, {"name": "某国际学校", "tuition_fees": 120000.0, "school_id": 7})
+
+
+if __name__ == '__main__':
+    unittest.main()